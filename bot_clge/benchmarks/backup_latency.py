@@ -0,0 +1,92 @@
+"""Задержка чтения отметок во время онлайн-копирования базы.
+
+База добивается до нужного размера сообщениями, затем замеряется
+чтение без копирования, во время копирования порциями (как в боте)
+и во время копирования за один шаг. Для базы в несколько ГБ:
+    python -m benchmarks.backup_latency --size-mb 4096
+
+Запуск из каталога bot_clge:
+    python -m benchmarks.backup_latency
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from database import SQLiteDatabase
+from database.backup import BackupManager
+from benchmarks.common import percentiles
+from benchmarks.read_latency import seed
+
+
+async def pad(db: SQLiteDatabase, size_mb: int):
+    """Добить базу сообщениями по ~4 КБ до size_mb"""
+    rows_per_batch = 25_000
+    while os.path.getsize(db.db_path) < size_mb * 2 ** 20:
+        async with db.transaction() as conn:
+            await conn.execute("""
+                WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+                INSERT INTO messages (from_user_id, to_user_id, message_text, timestamp)
+                SELECT 0, 1, hex(randomblob(2000)), 1704103200 FROM n
+            """, (rows_per_batch,))
+        async with db.transaction() as conn:
+            await conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+async def reads_until(db: SQLiteDatabase, students: int, done: asyncio.Future) -> list:
+    latencies = []
+    while not done.done():
+        started = time.perf_counter()
+        await db.get_grades_by_student(random.randint(1, students))
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.001)
+    return latencies
+
+
+async def during_backup(db: SQLiteDatabase, backups: BackupManager, students: int):
+    started = time.perf_counter()
+    task = backups.start()
+    latencies = await reads_until(db, students, task)
+    await task
+    return latencies, time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--pages", type=int, default=256)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SQLiteDatabase(os.path.join(tmp, "bench.db"), single_flight_methods=[])
+        await db.init_db()
+        await seed(db, args.students, 50_000)
+        await pad(db, args.size_mb)
+        size = os.path.getsize(db.db_path) / 2 ** 20
+
+        idle_done = asyncio.get_running_loop().create_future()
+        asyncio.get_running_loop().call_later(2, idle_done.set_result, None)
+        idle = await reads_until(db, args.students, idle_done)
+
+        stepped, stepped_time = await during_backup(db, BackupManager(db, keep=1, pages=args.pages), args.students)
+        single, single_time = await during_backup(db, BackupManager(db, keep=1, pages=-1), args.students)
+
+        await db.close()
+
+    print(f"База: {size:.0f} МБ")
+    print(f"{'сценарий':<26} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (мс)")
+    for name, values in (
+        ("без копирования", idle),
+        (f"копия по {args.pages} стр.", stepped),
+        ("копия за один шаг", single),
+    ):
+        p = percentiles(values)
+        print(f"{name:<26} {p[50]:>8.2f} {p[95]:>8.2f} {p[99]:>8.2f} {p[100]:>8.2f}")
+    print(f"\nДлительность копирования: порциями {stepped_time:.1f} с, за один шаг {single_time:.1f} с")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
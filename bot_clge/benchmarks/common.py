@@ -0,0 +1,12 @@
+from typing import Dict, Iterable
+
+
+def percentiles(values: Iterable[float], points=(50, 95, 99, 100)) -> Dict[int, float]:
+    """Перцентили выборки (100 — максимум)"""
+    ordered = sorted(values)
+    if not ordered:
+        return {point: 0.0 for point in points}
+    return {
+        point: ordered[min(len(ordered) - 1, int(len(ordered) * point / 100))]
+        for point in points
+    }
@@ -0,0 +1,119 @@
+"""Состояния FSM за недели работы: MemoryStorage против CompactMemoryStorage.
+
+Имитация по виртуальным часам: каждый апдейт случайного пользователя
+читает состояние (как FSMContextMiddleware на каждый апдейт), часть
+апдейтов начинает сценарий добавления урока, большинство сценариев
+доводится до конца (state.clear()), остальные бросаются. Каждый день
+приходят новые пользователи, а часть прежних перестаёт писать. После каждой
+недели печатаются число записей и память хранилища (tracemalloc), в
+конце — среднее время обработки апдейта хранилищем.
+
+Запуск из каталога bot_clge:
+    python -m benchmarks.fsm_storage
+"""
+import argparse
+import asyncio
+import gc
+import random
+import time
+import tracemalloc
+
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from fsm import CompactMemoryStorage
+from handlers.teacher import TeacherStates
+
+BOT_ID = 42
+DAY = 24 * 3600
+
+
+class Clock:
+    """Виртуальное время имитации"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def soak(storage: BaseStorage, clock: Clock, args) -> tuple:
+    """Прогнать имитацию; по строке (записей, КБ) на каждую неделю и время на апдейт"""
+    rng = random.Random(args.seed)
+    step = DAY / args.updates_per_day
+    weeks = []
+    baseline = tracemalloc.get_traced_memory()[0]
+    elapsed = 0.0
+    for week in range(args.weeks):
+        for update in range(args.updates_per_day * 7):
+            clock.now += step
+            # Активные пользователи — окно, сдвигающееся на new_users в день
+            day = week * 7 + update // args.updates_per_day
+            user_id = day * args.new_users + rng.randrange(args.users)
+            key = StorageKey(bot_id=BOT_ID, chat_id=user_id, user_id=user_id)
+            roll = rng.random()
+            started = time.perf_counter()
+            state = await storage.get_state(key)
+            if state is not None and roll < args.finish:
+                await storage.set_state(key, None)
+                await storage.set_data(key, {})
+            elif state is None and roll < args.start:
+                await storage.set_state(key, TeacherStates.waiting_for_subject_name)
+                await storage.update_data(key, {
+                    'group_id': rng.randrange(1, 200), 'day_of_week': rng.randrange(1, 7),
+                    'lesson_number': rng.randrange(1, 9)
+                })
+            elapsed += time.perf_counter() - started
+        if isinstance(storage, CompactMemoryStorage):
+            storage.sweep()
+            entries = len(storage)
+        else:
+            entries = len(storage.storage)
+        gc.collect()
+        weeks.append((entries, (tracemalloc.get_traced_memory()[0] - baseline) / 1024))
+    updates = args.updates_per_day * 7 * args.weeks
+    return weeks, elapsed / updates * 1_000_000
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weeks", type=int, default=8)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--new-users", type=int, default=500, help="новых пользователей в день")
+    parser.add_argument("--updates-per-day", type=int, default=10_000)
+    # Доля апдейтов, начинающих сценарий, и доля завершающих начатый
+    parser.add_argument("--start", type=float, default=0.05)
+    parser.add_argument("--finish", type=float, default=0.6)
+    parser.add_argument("--ttl-hours", type=float, default=24)
+    parser.add_argument("--max-entries", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(
+        f"Активных пользователей {args.users}, новых в день {args.new_users}, апдейтов в день {args.updates_per_day}, "
+        f"TTL {args.ttl_hours:g} ч, не больше {args.max_entries} записей\n"
+    )
+    results = {}
+    for name in ("MemoryStorage", "CompactMemoryStorage"):
+        clock = Clock()
+        if name == "MemoryStorage":
+            storage = MemoryStorage()
+        else:
+            storage = CompactMemoryStorage(ttl=args.ttl_hours * 3600, max_entries=args.max_entries, clock=clock)
+        tracemalloc.start()
+        results[name] = await soak(storage, clock, args)
+        tracemalloc.stop()
+        if isinstance(storage, CompactMemoryStorage):
+            print(f"CompactMemoryStorage: {storage.metrics()}\n")
+
+    memory_weeks, memory_us = results["MemoryStorage"]
+    compact_weeks, compact_us = results["CompactMemoryStorage"]
+    print(f"{'неделя':>6} {'Memory: записей':>16} {'КБ':>9} {'Compact: записей':>17} {'КБ':>9}")
+    for week, (memory, compact) in enumerate(zip(memory_weeks, compact_weeks), 1):
+        print(f"{week:>6} {memory[0]:>16} {memory[1]:>9.0f} {compact[0]:>17} {compact[1]:>9.0f}")
+    print(f"\nмкс на апдейт: MemoryStorage {memory_us:.2f}, CompactMemoryStorage {compact_us:.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
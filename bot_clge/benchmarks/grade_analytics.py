@@ -0,0 +1,118 @@
+"""Время построения сводки отметок группы при миллионах отметок в базе.
+
+Сравниваются агрегирующие запросы в SQL (get_group_grade_stats без кэша),
+повторное открытие сводки из кэша и подсчёт в Python: выгрузка отметок
+каждого студента группы через get_grades_by_student и обход словарями.
+
+Запуск из каталога bot_clge:
+    python -m benchmarks.grade_analytics
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from database import SQLiteDatabase
+from database.analytics import FAILING_BELOW
+from benchmarks.common import percentiles
+
+SUBJECTS = ("Математика", "Физика", "История", "Информатика", "Английский", "Химия")
+TEACHER_ID = 0
+# 2026-01-01 00:00 UTC
+YEAR_START = 1767225600
+
+
+async def seed(db: SQLiteDatabase, groups: int, group_size: int, grades: int):
+    async with db.transaction() as conn:
+        await conn.execute("INSERT INTO users (user_id, username, full_name, role) VALUES (0, 't', 'Teacher', 'teacher')")
+        await conn.executemany(
+            "INSERT INTO groups (group_id, group_name) VALUES (?, ?)",
+            [(g, f"Группа {g}") for g in range(1, groups + 1)]
+        )
+        await conn.executemany(
+            "INSERT INTO users (user_id, username, full_name, role, group_id) VALUES (?, ?, ?, 'student', ?)",
+            [(i, f"s{i}", f"Student {i}", (i - 1) // group_size + 1) for i in range(1, groups * group_size + 1)]
+        )
+    students = groups * group_size
+    batch = 100_000
+    for start in range(0, grades, batch):
+        async with db.transaction() as conn:
+            await conn.executemany(
+                "INSERT INTO grades (student_id, teacher_id, subject, grade, date) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        random.randint(1, students), TEACHER_ID, random.choice(SUBJECTS),
+                        random.choice((2, 3, 3, 4, 4, 4, 5, 5)),
+                        YEAR_START + random.randrange(365 * 86400)
+                    )
+                    for _ in range(min(batch, grades - start))
+                ]
+            )
+
+
+async def naive_stats(db: SQLiteDatabase, group_id: int):
+    """Все отметки каждого студента группы и подсчёт словарями"""
+    by_subject = defaultdict(list)
+    by_student = defaultdict(list)
+    by_month = defaultdict(list)
+    for student in await db.get_users_by_group(group_id):
+        if student.role != 'student':
+            continue
+        for grade in await db.get_grades_by_student(student.user_id):
+            by_subject[grade.subject].append(grade.grade)
+            by_student[(student.user_id, grade.subject)].append(grade.grade)
+            by_month[datetime.fromtimestamp(grade.date).strftime("%Y-%m")].append(grade.grade)
+    subjects = {subject: sum(values) / len(values) for subject, values in by_subject.items()}
+    failing = [key for key, values in by_student.items() if sum(values) / len(values) < FAILING_BELOW]
+    trend = {month: sum(values) / len(values) for month, values in sorted(by_month.items())}
+    return subjects, failing, trend
+
+
+async def cold_stats(db: SQLiteDatabase, group_id: int):
+    db.grade_stats.clear()
+    return await db.get_group_grade_stats(group_id)
+
+
+async def measure(call, repeats: int) -> list:
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await call()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groups", type=int, default=40)
+    parser.add_argument("--group-size", type=int, default=30)
+    parser.add_argument("--grades", type=int, default=2_000_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SQLiteDatabase(os.path.join(tmp, "bench.db"))
+        await db.init_db()
+        await seed(db, args.groups, args.group_size, args.grades)
+        group_id = 1
+
+        results = [
+            ("SQL-агрегаты", await measure(lambda: cold_stats(db, group_id), args.repeats)),
+            ("из кэша", await measure(lambda: db.get_group_grade_stats(group_id), args.repeats * 50)),
+            ("подсчёт в Python", await measure(lambda: naive_stats(db, group_id), args.repeats)),
+        ]
+        await db.close()
+
+    print(f"Отметок: {args.grades}, студентов в группе: {args.group_size}")
+    print(f"{'сценарий':<20} {'p50':>8} {'p95':>8} {'p99':>8}  (мс)")
+    for name, values in results:
+        p = percentiles(values)
+        print(f"{name:<20} {p[50]:>8.2f} {p[95]:>8.2f} {p[99]:>8.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""Массовые операции над группами: один план против запроса на каждого студента.
+
+Перевод всех групп на следующий курс (пробный прогон и выполнение) и
+слияние групп: apply_group_plan одной транзакцией против переноса
+студентов по одному через update_user_group — так, как это делает
+администратор кнопками «➕ Добавить в группу».
+
+Запуск из каталога bot_clge:
+    python -m benchmarks.group_ops
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from database import SQLiteDatabase
+from database.groups import GroupPlan, promotion_plan
+
+# У каждой группы свой учитель: учитель ведёт в слоте урок только у одной группы
+TEACHER_BASE = 1_000_000
+LESSONS = [(day, lesson) for day in range(1, 7) for lesson in range(1, 6)]
+
+
+async def seed(db: SQLiteDatabase, groups_per_course: int, group_size: int):
+    names = [f"ИС-{course}{n}" for course in range(1, 5) for n in range(1, groups_per_course + 1)]
+    async with db.transaction() as conn:
+        await conn.executemany(
+            "INSERT INTO groups (group_id, group_name) VALUES (?, ?)",
+            [(g, name) for g, name in enumerate(names, 1)]
+        )
+        await conn.executemany(
+            "INSERT INTO users (user_id, username, full_name, role) VALUES (?, ?, ?, 'teacher')",
+            [(TEACHER_BASE + g, f"t{g}", f"Teacher {g}") for g in range(1, len(names) + 1)]
+        )
+        await conn.executemany(
+            "INSERT INTO users (user_id, username, full_name, role, group_id) VALUES (?, ?, ?, 'student', ?)",
+            [(i, f"s{i}", f"Student {i}", (i - 1) // group_size + 1) for i in range(1, len(names) * group_size + 1)]
+        )
+        await conn.executemany(
+            "INSERT INTO schedule (group_id, day_of_week, lesson_number, subject, teacher_id) VALUES (?, ?, ?, ?, ?)",
+            [
+                (g, day, lesson, "Математика", TEACHER_BASE + g)
+                for g in range(1, len(names) + 1) for day, lesson in LESSONS
+            ]
+        )
+    return len(names)
+
+
+async def timed(coro) -> tuple:
+    """Время выполнения в миллисекундах и результат"""
+    started = time.perf_counter()
+    result = await coro
+    return (time.perf_counter() - started) * 1000, result
+
+
+async def merge_one_by_one(db: SQLiteDatabase, source: int, target: int) -> int:
+    students = await db.get_users_by_group(source)
+    for student in students:
+        await db.update_user_group(student.user_id, target)
+    await db.delete_group(source)
+    return len(students)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groups-per-course", type=int, default=25)
+    parser.add_argument("--group-size", type=int, default=30)
+    parser.add_argument("--pairs", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SQLiteDatabase(os.path.join(tmp, "bench.db"))
+        await db.init_db()
+        groups = await seed(db, args.groups_per_course, args.group_size)
+        await db.load_snapshot()
+        print(f"Групп {groups}, студентов {groups * args.group_size}, уроков {groups * len(LESSONS)}\n")
+        print(f"{'операция':<38} {'строк':>7} {'мс':>9}")
+
+        plan = promotion_plan(db.snapshot.groups)
+        elapsed, report = await timed(db.apply_group_plan(plan, dry_run=True))
+        rows = report.groups_renamed + report.groups_archived + report.users_detached
+        print(f"{'перевод на курс, пробный прогон':<38} {rows:>7} {elapsed:>9.1f}")
+        elapsed, report = await timed(db.apply_group_plan(plan))
+        print(f"{'перевод на курс':<38} {rows:>7} {elapsed:>9.1f}")
+
+        # Одинаковое число пар групп сливается по студенту и одним планом
+        active = [group.group_id for group in db.snapshot.groups]
+        pairs = min(args.pairs, len(active) // 4)
+        one_by_one, by_plan = active[:pairs * 2], active[pairs * 2:pairs * 4]
+        started = time.perf_counter()
+        moved = 0
+        for source, target in zip(one_by_one[::2], one_by_one[1::2]):
+            moved += await merge_one_by_one(db, source, target)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"{f'слияние {pairs} пар групп по студенту':<38} {moved:>7} {elapsed:>9.1f}")
+        merges = dict(zip(by_plan[::2], by_plan[1::2]))
+        elapsed, report = await timed(db.apply_group_plan(GroupPlan(merges=merges), dry_run=True))
+        print(f"{f'слияние {pairs} пар, пробный прогон':<38} {report.users_moved:>7} {elapsed:>9.1f}")
+        elapsed, report = await timed(db.apply_group_plan(GroupPlan(merges=merges)))
+        print(f"{f'слияние {pairs} пар групп планом':<38} {report.users_moved:>7} {elapsed:>9.1f}")
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+"""Время открытия входящих учителя с большой историей переписки.
+
+Сравниваются счётчики message_threads и постраничная выборка от ключа
+с прежним подходом: подсчёт диалогов по всей таблице messages и
+страницы через OFFSET.
+
+Запуск из каталога bot_clge:
+    python -m benchmarks.inbox
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import date
+
+from database import SQLiteDatabase
+from database.periods import day_start
+from benchmarks.common import percentiles
+
+TEACHER_ID = 0
+PAGE = 10
+SEPTEMBER = day_start(date(2026, 9, 1))
+OCTOBER = day_start(date(2026, 10, 1))
+
+
+async def seed(db: SQLiteDatabase, students: int, teacher_messages: int, other_messages: int):
+    async with db.transaction() as conn:
+        await conn.execute("INSERT INTO users (user_id, username, full_name, role) VALUES (0, 't', 'Teacher', 'teacher')")
+        await conn.executemany(
+            "INSERT INTO users (user_id, username, full_name, role) VALUES (?, ?, ?, 'student')",
+            [(i, f"s{i}", f"Student {i}") for i in range(1, students + 1)]
+        )
+    # Переписка других пользователей: таблица большая, но к учителю не относится
+    async with db.transaction() as conn:
+        await conn.executemany(
+            "INSERT INTO messages (from_user_id, to_user_id, message_text, timestamp) VALUES (?, ?, 'x', ?)",
+            [
+                (random.randint(1, students), random.randint(1, students), SEPTEMBER + i % 28 * 86400 + 36000)
+                for i in range(other_messages)
+            ]
+        )
+    for i in range(teacher_messages):
+        student = random.randint(1, students)
+        sender, recipient = (student, TEACHER_ID) if i % 2 else (TEACHER_ID, student)
+        await db.add_message(sender, recipient, f"Сообщение {i}", OCTOBER + i % 28 * 86400 + i % 24 * 3600)
+
+
+async def naive_open(db: SQLiteDatabase):
+    """Список диалогов и непрочитанные по всей истории сообщений"""
+    async with db._read() as conn:
+        async with conn.execute("""
+            SELECT other, COUNT(*), MAX(timestamp) FROM (
+                SELECT to_user_id AS other, timestamp FROM messages WHERE from_user_id = ?
+                UNION ALL
+                SELECT from_user_id, timestamp FROM messages WHERE to_user_id = ?
+            ) GROUP BY other ORDER BY MAX(timestamp) DESC LIMIT 50
+        """, (TEACHER_ID, TEACHER_ID)) as cursor:
+            return await cursor.fetchall()
+
+
+async def naive_page(db: SQLiteDatabase, student: int, page: int):
+    async with db._read() as conn:
+        async with conn.execute("""
+            SELECT * FROM messages
+            WHERE (from_user_id = ? AND to_user_id = ?) OR (from_user_id = ? AND to_user_id = ?)
+            ORDER BY timestamp DESC, message_id DESC
+            LIMIT ? OFFSET ?
+        """, (TEACHER_ID, student, student, TEACHER_ID, PAGE, page * PAGE)) as cursor:
+            return await cursor.fetchall()
+
+
+async def threads_open(db: SQLiteDatabase):
+    await db.get_unread_count(TEACHER_ID)
+    return await db.get_threads(TEACHER_ID)
+
+
+async def keyset_scroll(db: SQLiteDatabase, student: int, pages: int):
+    before = None
+    for _ in range(pages):
+        page = await db.get_conversation(TEACHER_ID, student, before_id=before, limit=PAGE)
+        if not page:
+            break
+        before = page[-1].message_id
+
+
+async def offset_scroll(db: SQLiteDatabase, student: int, pages: int):
+    for page in range(pages):
+        if not await naive_page(db, student, page):
+            break
+
+
+async def measure(call, repeats: int) -> list:
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await call()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=5)
+    parser.add_argument("--teacher-messages", type=int, default=5000)
+    parser.add_argument("--other-messages", type=int, default=200_000)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SQLiteDatabase(os.path.join(tmp, "bench.db"))
+        await db.init_db()
+        await seed(db, args.students, args.teacher_messages, args.other_messages)
+        student = 1
+
+        results = [
+            ("открыть входящие: диалоги", await measure(lambda: threads_open(db), args.repeats)),
+            ("открыть входящие: GROUP BY", await measure(lambda: naive_open(db), args.repeats)),
+            ("вся переписка: от ключа", await measure(lambda: keyset_scroll(db, student, 100), args.repeats // 10)),
+            ("вся переписка: OFFSET", await measure(lambda: offset_scroll(db, student, 100), args.repeats // 10)),
+        ]
+        await db.close()
+
+    print(f"Сообщений учителя: {args.teacher_messages}, всего в таблице: {args.teacher_messages + args.other_messages}")
+    print(f"{'сценарий':<30} {'p50':>8} {'p95':>8} {'p99':>8}  (мс)")
+    for name, values in results:
+        p = percentiles(values)
+        print(f"{name:<30} {p[50]:>8.2f} {p[95]:>8.2f} {p[99]:>8.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+"""Время маршрутизации нажатия кнопки меню в зависимости от размера меню.
+
+Сравниваются цепочка фильтров F.text == "..." (как было раньше) и
+MenuDispatcher (поиск в словаре). В обоих вариантах пользователь
+загружается из БД один раз, как в настоящих обработчиках.
+
+Запуск из каталога bot_clge:
+    python -m benchmarks.menu_dispatch
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher, Router, F
+from aiogram.types import Update, Message, Chat, User
+
+from database import Database, SQLiteDatabase
+from middleware import DatabaseMiddleware
+from handlers.menu import MenuDispatcher
+from benchmarks.common import percentiles
+
+USER_ID = 1
+
+
+def make_update(update_id: int, text: str) -> Update:
+    user = User(id=USER_ID, is_bot=False, first_name="Bench")
+    return Update(update_id=update_id, message=Message(
+        message_id=update_id,
+        date=datetime.now(),
+        chat=Chat(id=USER_ID, type="private"),
+        from_user=user,
+        text=text,
+    ))
+
+
+def linear_dispatcher(db: Database, buttons: list) -> Dispatcher:
+    """Прежняя схема: обработчик на каждую кнопку с фильтром по тексту"""
+    dp = Dispatcher()
+    dp.message.middleware(DatabaseMiddleware(db))
+    router = Router()
+    for text in buttons:
+        async def handler(message: Message, db: Database):
+            user = await db.get_user(message.from_user.id)
+            return user.role
+        router.message.register(handler, F.text == text)
+    dp.include_router(router)
+    return dp
+
+
+def menu_dispatcher(db: Database, buttons: list) -> Dispatcher:
+    dp = Dispatcher()
+    dp.message.middleware(DatabaseMiddleware(db))
+    menu = MenuDispatcher({"student": tuple(buttons)}, name="bench")
+    for text in buttons:
+        async def handler(message: Message, user):
+            return user.role
+        menu.button("student", text)(handler)
+    dp.include_router(menu.router)
+    return dp
+
+
+async def measure(dp: Dispatcher, bot: Bot, text: str, updates: int) -> list:
+    latencies = []
+    for update_id in range(updates):
+        update = make_update(update_id, text)
+        started = time.perf_counter()
+        await dp.feed_update(bot, update)
+        latencies.append((time.perf_counter() - started) * 1_000_000)
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000)
+    args = parser.parse_args()
+
+    bot = Bot(token="42:BENCHMARK")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SQLiteDatabase(os.path.join(tmp, "bench.db"))
+        await db.init_db()
+        await db.add_user(USER_ID, "bench", "Bench", role="student")
+
+        print(f"{'кнопок':>7} {'F.text ==, мкс':>16} {'MenuDispatcher, мкс':>20}  (p50, последняя кнопка)")
+        for size in (5, 20, 100, 500):
+            buttons = [f"Кнопка {i}" for i in range(size)]
+            linear = percentiles(await measure(linear_dispatcher(db, buttons), bot, buttons[-1], args.updates))
+            table = percentiles(await measure(menu_dispatcher(db, buttons), bot, buttons[-1], args.updates))
+            print(f"{size:>7} {linear[50]:>16.1f} {table[50]:>20.1f}")
+
+        await db.close()
+    await bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
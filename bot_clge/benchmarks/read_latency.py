@@ -0,0 +1,113 @@
+"""Задержка чтения отметок студента при параллельной длинной записи.
+
+Три сценария: без записи; импорт, который держит пишущее соединение, но не
+выполняет SQL (только ожидание между порциями); настоящий импорт. Второй
+сценарий показывает, что чтение не ждёт пишущее соединение и фиксацию
+транзакции: задержка та же, что без записи. В третьем чтение медленнее,
+но максимум остаётся много меньше длительности транзакции. Рост p99 в нём —
+конкуренция за процессор: поток пишущего соединения держит GIL, пока
+executemany связывает параметры каждой строки, а цикл событий готовит
+следующую порцию, поэтому поток читателя и сам цикл событий ждут своей
+очереди (видно по задержке цикла событий). Абсолютные значения зависят от
+машины: на медленной p99 доходил до 85 мс при 5 мс без записи.
+
+Запуск из каталога bot_clge:
+    python -m benchmarks.read_latency
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from database import SQLiteDatabase
+from benchmarks.common import percentiles
+
+
+async def seed(db: SQLiteDatabase, students: int, grades: int):
+    async with db.transaction() as conn:
+        await conn.executemany(
+            "INSERT INTO users (user_id, username, full_name, role) VALUES (?, ?, ?, 'student')",
+            [(i, f"s{i}", f"Student {i}") for i in range(1, students + 1)]
+        )
+        await conn.execute("INSERT INTO users (user_id, username, full_name, role) VALUES (0, 't', 'Teacher', 'teacher')")
+        await conn.executemany(
+            "INSERT INTO grades (student_id, teacher_id, subject, grade, date) VALUES (?, 0, 'Math', ?, 1704103200)",
+            [(random.randint(1, students), random.randint(2, 5)) for _ in range(grades)]
+        )
+
+
+async def measure_reads(db: SQLiteDatabase, students: int, count: int) -> list:
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        await db.get_grades_by_student(random.randint(1, students))
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.001)
+    return latencies
+
+
+async def loop_lag(stop: asyncio.Event) -> list:
+    """Насколько позже срока просыпается цикл событий"""
+    lags = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append((time.perf_counter() - started) * 1000 - 1)
+    return lags
+
+
+async def long_writes(db: SQLiteDatabase, stop: asyncio.Event, students: int, sql: bool = True) -> list:
+    """Имитация импорта: длинные транзакции, удерживающие пишущее соединение"""
+    durations = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        async with db.transaction() as conn:
+            for _ in range(50):
+                if sql:
+                    await conn.executemany(
+                        "INSERT INTO grades (student_id, teacher_id, subject, grade, date) VALUES (?, 0, 'Import', 3, 1704189600)",
+                        [(random.randint(1, students),) for _ in range(200)]
+                    )
+                # Разбор следующей порции импорта
+                await asyncio.sleep(0.002)
+        durations.append((time.perf_counter() - started) * 1000)
+    return durations
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--grades", type=int, default=50_000)
+    parser.add_argument("--reads", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SQLiteDatabase(os.path.join(tmp, "bench.db"), single_flight_methods=[])
+        await db.init_db()
+        await seed(db, args.students, args.grades)
+
+        results = []
+        for name, sql in (("без записи", None), ("запись без SQL", False), ("с длинной записью", True)):
+            stop = asyncio.Event()
+            lag = asyncio.create_task(loop_lag(stop))
+            writer = asyncio.create_task(long_writes(db, stop, args.students, sql)) if sql is not None else None
+            reads = await measure_reads(db, args.students, args.reads)
+            stop.set()
+            if writer is not None:
+                transactions = await writer
+            results.append((name, reads, await lag))
+
+        await db.close()
+
+    print(f"{'сценарий':<22} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  {'цикл p99':>9}  (мс)")
+    for name, values, lags in results:
+        p = percentiles(values)
+        print(f"{name:<22} {p[50]:>8.2f} {p[95]:>8.2f} {p[99]:>8.2f} {p[100]:>8.2f}  {percentiles(lags)[99]:>9.2f}")
+    p = percentiles(transactions)
+    print(f"\nТранзакций записи: {len(transactions)}, длительность p50 {p[50]:.1f} мс, max {p[100]:.1f} мс")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
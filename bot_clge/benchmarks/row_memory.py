@@ -0,0 +1,100 @@
+"""Память и время на большие выборки: словари, модели строк и итерация.
+
+Сравниваются прежний подход ([dict(row) for row in rows] поверх
+aiosqlite.Row), именованные кортежи из row_factory (get_users_by_role,
+get_grades_by_student) и потоковые iter_* методы, которые держат в
+памяти только одну пачку строк. Пик и удержанный объём считаются
+tracemalloc (учитываются и аллокации в потоке sqlite3).
+
+Запуск из каталога bot_clge:
+    python -m benchmarks.row_memory
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+from database import SQLiteDatabase
+from database.models import GRADE_SELECT, USER_COLUMNS
+
+STUDENT_ID = 1
+
+
+async def seed(db: SQLiteDatabase, users: int, grades: int):
+    async with db.transaction() as conn:
+        await conn.execute("INSERT INTO users (user_id, username, full_name, role) VALUES (0, 't', 'Teacher', 'teacher')")
+        await conn.executemany(
+            "INSERT INTO users (user_id, username, full_name, role) VALUES (?, ?, ?, 'student')",
+            [(i, f"student{i}", f"Студент Номер {i}") for i in range(1, users + 1)]
+        )
+        await conn.executemany(
+            "INSERT INTO grades (student_id, teacher_id, subject, grade, date) VALUES (?, 0, 'Математика', ?, ?)",
+            [(STUDENT_ID, 2 + i % 4, 1767261600 + i * 3600) for i in range(grades)]
+        )
+
+
+async def fetch_dicts(db: SQLiteDatabase, query: str, params: tuple) -> list:
+    """Прежний подход: aiosqlite.Row и копия каждой строки в словарь"""
+    async with db._read() as conn:
+        async with conn.execute(query, params) as cursor:
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+
+
+async def count_stream(iterator) -> int:
+    count = 0
+    async for _ in iterator:
+        count += 1
+    return count
+
+
+async def measure(call):
+    """(результат, пик МБ, удержано МБ, мс)"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = await call()
+    elapsed = (time.perf_counter() - started) * 1000
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak / 2 ** 20, retained / 2 ** 20, elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--grades", type=int, default=200_000)
+    args = parser.parse_args()
+
+    users_query = f"SELECT {USER_COLUMNS} FROM users WHERE role = ?"
+    grades_query = GRADE_SELECT + " WHERE g.student_id = ? ORDER BY g.date DESC"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SQLiteDatabase(os.path.join(tmp, "bench.db"), single_flight_methods=[])
+        await db.init_db()
+        await seed(db, args.users, args.grades)
+
+        scenarios = [
+            ("пользователи: dict", lambda: fetch_dicts(db, users_query, ("student",))),
+            ("пользователи: User", lambda: db.get_users_by_role("student")),
+            ("пользователи: iter", lambda: count_stream(db.iter_users_by_role("student"))),
+            ("отметки: dict", lambda: fetch_dicts(db, grades_query, (STUDENT_ID,))),
+            ("отметки: Grade", lambda: db.get_grades_by_student(STUDENT_ID)),
+            ("отметки: iter", lambda: count_stream(db.iter_grades_by_student(STUDENT_ID))),
+        ]
+        results = []
+        for name, call in scenarios:
+            # Прогрев: кэш страниц SQLite и подготовленные запросы
+            await call()
+            results.append((name, *(await measure(call))[1:]))
+        await db.close()
+
+    print(f"Пользователей: {args.users}, отметок студента: {args.grades}")
+    print(f"{'сценарий':<22} {'пик МБ':>8} {'удержано МБ':>12} {'мс':>8}")
+    for name, peak, retained, elapsed in results:
+        print(f"{name:<22} {peak:>8.1f} {retained:>12.1f} {elapsed:>8.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,163 @@
+"""Память на колледж: отдельный процесс на каждого или все в одном.
+
+Каждый замер идёт в новом процессе интерпретатора: импортируется main
+(все обработчики), запускаются N колледжей со своими базами SQLite и
+собирается общий диспетчер. Затраты одного процесса с одним колледжем
+сравниваются с приростом на каждый следующий колледж в общем процессе.
+RSS читается из /proc (только Linux) в отдельном прогоне без tracemalloc,
+память Python — tracemalloc, потоки — соединения aiosqlite.
+
+Запуск из каталога bot_clge:
+    python -m benchmarks.tenant_memory
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import tracemalloc
+from typing import Optional
+
+GROUPS = 12
+TEACHERS = 40
+
+
+def rss_bytes() -> Optional[int]:
+    """Резидентная память процесса; None, если /proc недоступен"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, AttributeError, ValueError):
+        return None
+
+
+async def seed(path: str, students: int):
+    """База колледжа: группы, учителя, студенты и расписание на неделю"""
+    from database import SQLiteDatabase
+
+    db = SQLiteDatabase(path)
+    await db.init_db()
+    async with db.transaction() as conn:
+        await conn.executemany(
+            "INSERT INTO groups (group_id, group_name) VALUES (?, ?)",
+            [(g, f"Группа {g}") for g in range(1, GROUPS + 1)]
+        )
+        await conn.executemany(
+            "INSERT INTO users (user_id, username, full_name, role) VALUES (?, ?, ?, 'teacher')",
+            [(t, f"teacher{t}", f"Учитель Номер {t}") for t in range(1, TEACHERS + 1)]
+        )
+        await conn.executemany(
+            "INSERT INTO users (user_id, username, full_name, role, group_id) VALUES (?, ?, ?, 'student', ?)",
+            [(1000 + s, f"student{s}", f"Студент Номер {s}", 1 + s % GROUPS) for s in range(students)]
+        )
+        await conn.executemany(
+            "INSERT INTO schedule (group_id, day_of_week, lesson_number, subject, teacher_id) VALUES (?, ?, ?, ?, ?)",
+            [
+                (g, day, lesson, f"Предмет {lesson}", 1 + (g * 7 + day + lesson) % TEACHERS)
+                for g in range(1, GROUPS + 1) for day in range(1, 7) for lesson in range(1, 6)
+            ]
+        )
+    await db.close()
+
+
+async def child(count: int, directory: str):
+    """Замер внутри нового процесса: count колледжей на одном цикле событий"""
+    from dataclasses import replace
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from config import config
+    from main import create_dispatcher
+    from tenants import Tenant, TenantSettings
+
+    session = AiohttpSession()
+    tenants = []
+    for i in range(count):
+        settings = replace(
+            config,
+            BOT_TOKEN=f"{1000 + i}:BENCHMARK",
+            DATABASE_URL=os.path.join(directory, f"college{i}.db"),
+            BACKUP_INTERVAL_HOURS=0,
+        )
+        tenant = Tenant(TenantSettings(f"college{i}", settings), session)
+        await tenant.start()
+        tenants.append(tenant)
+    create_dispatcher(tenants)
+    await asyncio.sleep(0.5)
+
+    gc.collect()
+    result = {
+        'rss': rss_bytes(),
+        'python': tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+        'threads': threading.active_count(),
+        'snapshot': sum(tenant.metrics()['snapshot_kb'] for tenant in tenants) * 1024,
+    }
+    for tenant in tenants:
+        await tenant.close()
+    await session.close()
+    print(json.dumps(result))
+
+
+def run_child(count: int, directory: str, trace: bool) -> dict:
+    command = [sys.executable, "-m", "benchmarks.tenant_memory", "--child", str(count), "--dir", directory]
+    if trace:
+        command.append("--trace")
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(count: int, directory: str) -> dict:
+    """RSS без tracemalloc (он сам занимает память), объём Python — с ним"""
+    result = run_child(count, directory, trace=False)
+    result['python'] = run_child(count, directory, trace=True)['python']
+    return result
+
+
+def megabytes(value: Optional[float]) -> str:
+    return f"{value / 2 ** 20:.1f}" if value is not None else "—"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--students", type=int, default=600)
+    parser.add_argument("--child", type=int)
+    parser.add_argument("--dir")
+    parser.add_argument("--trace", action="store_true")
+    args = parser.parse_args()
+
+    if args.child is not None:
+        if args.trace:
+            tracemalloc.start()
+        asyncio.run(child(args.child, args.dir))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        async def seed_all():
+            for i in range(args.tenants):
+                await seed(os.path.join(tmp, f"college{i}.db"), args.students)
+        asyncio.run(seed_all())
+
+        single = measure(1, tmp)
+        shared = measure(args.tenants, tmp)
+
+    n = args.tenants
+    per_tenant = {
+        key: (shared[key] - single[key]) / (n - 1) if shared[key] is not None and n > 1 else None
+        for key in ('rss', 'python', 'threads', 'snapshot')
+    }
+    print(f"Колледжей: {n}, студентов в каждом: {args.students}")
+    print(f"{'вариант':<34} {'RSS, МБ':>9} {'Python, МБ':>11} {'потоков':>8}")
+    print(f"{'процесс на колледж (×1)':<34} {megabytes(single['rss']):>9} {megabytes(single['python']):>11} {single['threads']:>8}")
+    print(f"{f'процесс на колледж (×{n})':<34} {megabytes(single['rss'] and single['rss'] * n):>9} "
+          f"{megabytes(single['python'] * n):>11} {single['threads'] * n:>8}")
+    print(f"{f'один процесс, {n} колледжей':<34} {megabytes(shared['rss']):>9} {megabytes(shared['python']):>11} {shared['threads']:>8}")
+    print(f"{'прирост на колледж':<34} {megabytes(per_tenant['rss']):>9} {megabytes(per_tenant['python']):>11} "
+          f"{per_tenant['threads']:>8.1f}")
+    print(f"Снимок справочников одного колледжа: ~{per_tenant['snapshot'] / 1024:.0f} КБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Ограничение частоты: цена проверки и запросы к базе при флуде.
+
+Первая часть — время ThrottlingMiddleware.hit() в зависимости от числа
+отслеживаемых пользователей (ведро токенов, O(1) на апдейт). Вторая —
+один пользователь жмёт «📊 Мои отметки» без пауз: сколько запросов к базе
+и какое время обработки с ограничением и без него.
+
+Запуск из каталога bot_clge:
+    python -m benchmarks.throttling
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update, Message, Chat, User
+
+from database import SQLiteDatabase
+from middleware import DatabaseMiddleware, ThrottlingMiddleware, Limit
+from handlers import menu_router, student_router
+from benchmarks.common import percentiles
+
+STUDENT_ID = 1
+TEXT = "📊 Мои отметки"
+
+
+def make_update(update_id: int) -> Update:
+    user = User(id=STUDENT_ID, is_bot=False, first_name="Bench")
+    return Update(update_id=update_id, message=Message(
+        message_id=update_id,
+        date=datetime.now(),
+        chat=Chat(id=STUDENT_ID, type="private"),
+        from_user=user,
+        text=TEXT,
+    ))
+
+
+def hit_cost(users: int, hits: int) -> float:
+    """Среднее время hit() в микросекундах при users отслеживаемых ведрах"""
+    throttling = ThrottlingMiddleware(Limit(1.0, 8))
+    now = time.monotonic()
+    for user_id in range(users):
+        throttling.hit("default", (0, user_id), now)
+    started = time.perf_counter()
+    for i in range(hits):
+        throttling.hit("default", (0, i % users), now + i * 1e-6)
+    return (time.perf_counter() - started) / hits * 1_000_000
+
+
+class CountingDatabase(SQLiteDatabase):
+    queries = 0
+
+    async def get_user(self, user_id):
+        self.queries += 1
+        return await super().get_user(user_id)
+
+    async def get_grades_by_student(self, student_id):
+        self.queries += 1
+        return await super().get_grades_by_student(student_id)
+
+
+class NullBot(Bot):
+    """Ответы обработчиков никуда не отправляются"""
+
+    async def __call__(self, method, request_timeout=None):
+        return None
+
+
+def make_dispatcher(db: CountingDatabase, throttling: ThrottlingMiddleware) -> Dispatcher:
+    dp = Dispatcher()
+    dp["term_starts"] = [(2, 1), (9, 1)]
+    dp.message.middleware(throttling)
+    dp.message.middleware(DatabaseMiddleware(db))
+    dp.include_router(menu_router)
+    dp.include_router(student_router)
+    return dp
+
+
+async def flood(dp: Dispatcher, db: CountingDatabase, bot: Bot, updates: int) -> tuple:
+    db.queries = 0
+    latencies = []
+    for update_id in range(updates):
+        started = time.perf_counter()
+        await dp.feed_update(bot, make_update(update_id))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return db.queries, latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hits", type=int, default=200_000)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--grades", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'пользователей':>14} {'hit(), мкс':>11}")
+    for users in (1_000, 100_000, 1_000_000):
+        print(f"{users:>14} {hit_cost(users, args.hits):>11.2f}")
+
+    bot = NullBot(token="42:BENCHMARK")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = CountingDatabase(os.path.join(tmp, "bench.db"))
+        await db.init_db()
+        await db.load_snapshot()
+        await db.add_user(0, "teacher", "Teacher", role="teacher")
+        await db.add_user(STUDENT_ID, "bench", "Bench", role="student")
+        async with db.transaction() as conn:
+            await conn.executemany(
+                "INSERT INTO grades (student_id, teacher_id, subject, grade, date) VALUES (?, 0, ?, ?, ?)",
+                [(STUDENT_ID, f"Предмет {i % 12}", 2 + i % 4, 1790848800 + i * 3600) for i in range(args.grades)]
+            )
+
+        print(f"\nФлуд «{TEXT}»: {args.updates} апдейтов подряд, отметок {args.grades}")
+        print(f"{'вариант':<18} {'запросов к БД':>14} {'p50, мс':>9} {'p99, мс':>9} {'всего, с':>9}")
+        # Без ограничения — лимит, который флуд не исчерпает
+        unlimited = Limit(float(args.updates), args.updates)
+        throttling = ThrottlingMiddleware(unlimited)
+        dp = make_dispatcher(db, throttling)
+        for name, limits in (("без ограничения", {}), ("с ограничением", {"grades": Limit(0.5, 4)})):
+            throttling.limits = limits
+            queries, latencies = await flood(dp, db, bot, args.updates)
+            p = percentiles(latencies)
+            print(f"{name:<18} {queries:>14} {p[50]:>9.3f} {p[99]:>9.3f} {sum(latencies) / 1000:>9.2f}")
+        await db.close()
+    await bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,13 @@
-from .db import Database
-
-__all__ = ['Database']
+from .base import Database
+from .db import SQLiteDatabase
+from .factory import create_database
+from .loader import UserLoader
+from .archive import Archiver
+from .audit import AuditLog, AuditAction
+from .periods import parse_term_starts
+from .models import User, Group, ScheduleEntry, Grade, Message, Thread, AuditEntry
 
+__all__ = [
+    'Database', 'SQLiteDatabase', 'create_database', 'UserLoader', 'Archiver', 'AuditLog', 'AuditAction',
+    'parse_term_starts', 'User', 'Group', 'ScheduleEntry', 'Grade', 'Message', 'Thread', 'AuditEntry'
+]
@@ -0,0 +1,113 @@
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+GRADES = (2, 3, 4, 5)
+
+# Средний балл ниже порога по предмету — студент в списке неуспевающих
+FAILING_BELOW = 3.0
+
+
+@dataclass(frozen=True)
+class SubjectStats:
+    subject: str
+    count: int
+    mean: float
+    # Число оценок 2, 3, 4, 5
+    distribution: Tuple[int, int, int, int]
+
+
+@dataclass(frozen=True)
+class FailingStudent:
+    user_id: int
+    full_name: str
+    subject: str
+    mean: float
+    count: int
+
+
+@dataclass(frozen=True)
+class MonthTrend:
+    month: str
+    count: int
+    mean: float
+
+
+@dataclass(frozen=True)
+class GroupGradeStats:
+    """Сводка отметок группы; всё посчитано агрегатами в SQL"""
+    group_id: int
+    total: SubjectStats
+    subjects: Tuple[SubjectStats, ...]
+    failing: Tuple[FailingStudent, ...]
+    trend: Tuple[MonthTrend, ...]
+    student_ids: FrozenSet[int]
+
+    @classmethod
+    def from_rows(cls, group_id: int, subjects: Iterable, failing: Iterable, trend: Iterable,
+                  student_ids: Iterable[int]) -> "GroupGradeStats":
+        """Собрать сводку из строк агрегирующих запросов"""
+        subjects = tuple(
+            SubjectStats(row['subject'], row['count'], float(row['mean']),
+                         (row['c2'], row['c3'], row['c4'], row['c5']))
+            for row in subjects
+        )
+        count = sum(item.count for item in subjects)
+        total = SubjectStats(
+            "Все предметы",
+            count,
+            sum(item.mean * item.count for item in subjects) / count if count else 0.0,
+            tuple(sum(item.distribution[i] for item in subjects) for i in range(len(GRADES))),
+        )
+        return cls(
+            group_id=group_id,
+            total=total,
+            subjects=subjects,
+            failing=tuple(
+                FailingStudent(row['user_id'], row['full_name'], row['subject'], float(row['mean']), row['count'])
+                for row in failing
+            ),
+            trend=tuple(MonthTrend(row['month'], row['count'], float(row['mean'])) for row in trend),
+            student_ids=frozenset(student_ids),
+        )
+
+
+class GradeStatsCache:
+    """Сводки отметок по группам до первого изменения.
+
+    add_grade сбрасывает сводку группы, в которую входит студент;
+    изменения состава групп и ролей сбрасывают все сводки. Сводка,
+    посчитанная во время такого изменения, в кэш не попадает.
+    """
+
+    def __init__(self):
+        self._by_group: Dict[int, GroupGradeStats] = {}
+        # Растёт при каждом сбросе
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, group_id: int) -> Optional[GroupGradeStats]:
+        stats = self._by_group.get(group_id)
+        if stats is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return stats
+
+    def put(self, stats: GroupGradeStats, generation: int):
+        """Сохранить сводку, посчитанную начиная с поколения generation"""
+        if generation == self.generation:
+            self._by_group[stats.group_id] = stats
+
+    def invalidate_student(self, student_id: int):
+        self.generation += 1
+        for group_id, stats in list(self._by_group.items()):
+            if student_id in stats.student_ids:
+                del self._by_group[group_id]
+
+    def clear(self):
+        self.generation += 1
+        self._by_group.clear()
+
+    def metrics(self) -> Dict[str, int]:
+        return {'groups': len(self._by_group), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,239 @@
+import asyncio
+import aiosqlite
+import json
+import logging
+import os
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+from urllib.request import pathname2url
+from .db import SQLiteDatabase
+from .models import Grade, Message, Model, row_factory
+from .periods import Term, day_start, term_for, to_datetime
+
+logger = logging.getLogger(__name__)
+
+
+def legacy_epoch(column: str) -> str:
+    """Выражение SQL: секунды Unix из столбца архива, где дата могла остаться строкой"""
+    return (
+        f"CASE WHEN instr({column}, '-') THEN CAST(strftime('%s', {column}, 'utc') AS INTEGER) "
+        f"ELSE CAST({column} AS INTEGER) END"
+    )
+
+
+class Archiver:
+    """Перенос отметок и сообщений закрытых семестров в архивные файлы.
+
+    Для каждого семестра создаётся отдельный файл БД рядом с основной
+    (<имя>_archive_<ГГГГ-ММ>.db). Строки переносятся порциями: каждая
+    порция — короткая транзакция на пишущем соединении, между порциями
+    другие записи успевают пройти. После переноса место возвращается
+    инкрементальным VACUUM. Архив подключается через ATTACH только на
+    время исторического запроса. В архивах, созданных до перехода на
+    секунды Unix, даты хранятся строками и переводятся при чтении.
+    """
+
+    # таблица -> (первичный ключ, столбец даты)
+    TABLES = {
+        'grades': ('grade_id', 'date'),
+        'messages': ('message_id', 'timestamp'),
+    }
+
+    def __init__(self, db: SQLiteDatabase, term_starts: Sequence[Tuple[int, int]], archive_dir: Optional[str] = None,
+                 batch_size: int = 500, pause: float = 0.05, vacuum_pages: int = 256):
+        self.db = db
+        self.term_starts = term_starts
+        self.archive_dir = archive_dir or os.path.dirname(os.path.abspath(db.db_path))
+        self.batch_size = batch_size
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, today: Optional[date] = None) -> "asyncio.Task[Dict[str, int]]":
+        """Запустить архивацию в фоне; повторный вызов возвращает текущий запуск"""
+        if not self.running:
+            self._task = asyncio.create_task(self.archive_closed_terms(today))
+        return self._task
+
+    @property
+    def _prefix(self) -> str:
+        return os.path.splitext(os.path.basename(self.db.db_path))[0] + "_archive_"
+
+    def archive_path(self, term_name: str) -> str:
+        return os.path.join(self.archive_dir, f"{self._prefix}{term_name}.db")
+
+    def archived_terms(self) -> List[str]:
+        """Названия семестров, для которых есть архивный файл"""
+        prefix = self._prefix
+        if not os.path.isdir(self.archive_dir):
+            return []
+        return sorted(
+            name[len(prefix):-3] for name in os.listdir(self.archive_dir)
+            if name.startswith(prefix) and name.endswith(".db")
+        )
+
+    async def archive_closed_terms(self, today: Optional[date] = None) -> Dict[str, int]:
+        """Перенести в архив всё, что относится к семестрам до текущего"""
+        current = term_for(today or date.today(), self.term_starts)
+        cutoff = day_start(current.start)
+        moved: Dict[str, int] = {}
+
+        for table, (_, date_column) in self.TABLES.items():
+            while True:
+                oldest = await self._oldest_date(table, date_column, cutoff)
+                if oldest is None:
+                    break
+                term = term_for(to_datetime(oldest).date(), self.term_starts)
+                count = await self._move_term(table, term)
+                moved[f"{table}:{term.name}"] = moved.get(f"{table}:{term.name}", 0) + count
+        if moved:
+            # Сводки по группам считаются только по текущим отметкам
+            self.db.grade_stats.clear()
+            await self.vacuum()
+
+        logger.info("Архивация завершена: %s", moved or "нечего переносить")
+        return moved
+
+    async def _oldest_date(self, table: str, date_column: str, cutoff: int) -> Optional[int]:
+        async with self.db._read() as conn:
+            async with conn.execute(
+                f"SELECT MIN({date_column}) FROM {table} WHERE {date_column} < ?", (cutoff,)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return row[0]
+
+    async def _move_term(self, table: str, term: Term) -> int:
+        key, date_column = self.TABLES[table]
+        uri = f"file:{pathname2url(self.archive_path(term.name))}"
+        bounds = (day_start(term.start), day_start(term.end))
+        total = 0
+
+        while True:
+            async with self.db._write() as conn:
+                await conn.execute("ATTACH DATABASE ? AS archive", (uri,))
+                try:
+                    await conn.execute(
+                        f"CREATE TABLE IF NOT EXISTS archive.{table} AS SELECT * FROM main.{table} WHERE 0"
+                    )
+                    async with conn.execute(
+                        f"SELECT {key} FROM main.{table} WHERE {date_column} >= ? AND {date_column} < ? "
+                        f"ORDER BY {key} LIMIT ?",
+                        (*bounds, self.batch_size)
+                    ) as cursor:
+                        ids = [row[0] for row in await cursor.fetchall()]
+                    if ids:
+                        batch = json.dumps(ids)
+                        await conn.execute(
+                            f"INSERT INTO archive.{table} SELECT * FROM main.{table} "
+                            f"WHERE {key} IN (SELECT value FROM json_each(?))", (batch,)
+                        )
+                        await conn.execute(
+                            f"DELETE FROM main.{table} WHERE {key} IN (SELECT value FROM json_each(?))", (batch,)
+                        )
+                        if table == 'messages':
+                            await self._repoint_threads(conn, batch)
+                    await conn.commit()
+                except Exception:
+                    # DETACH невозможен внутри открытой транзакции
+                    await conn.rollback()
+                    raise
+                finally:
+                    await conn.execute("DETACH DATABASE archive")
+
+            total += len(ids)
+            if len(ids) < self.batch_size:
+                break
+            # Даём пройти интерактивным записям между порциями
+            await asyncio.sleep(self.pause)
+
+        await self._index_archive(table, term)
+        return total
+
+    @staticmethod
+    async def _repoint_threads(conn: aiosqlite.Connection, batch: str):
+        """Диалоги, чьё последнее сообщение ушло в архив, ссылаются на последнее оставшееся (или ни на какое)"""
+        await conn.execute("""
+            UPDATE main.message_threads SET last_message_id = (
+                SELECT m.message_id FROM main.messages m
+                WHERE (m.from_user_id = message_threads.user_id AND m.to_user_id = message_threads.counterpart_id)
+                   OR (m.from_user_id = message_threads.counterpart_id AND m.to_user_id = message_threads.user_id)
+                ORDER BY m.timestamp DESC, m.message_id DESC
+                LIMIT 1
+            )
+            WHERE last_message_id IN (SELECT value FROM json_each(?))
+        """, (batch,))
+
+    async def _index_archive(self, table: str, term: Term):
+        column = 'student_id' if table == 'grades' else 'to_user_id'
+        async with self.db._write() as conn:
+            await conn.execute("ATTACH DATABASE ? AS archive", (f"file:{pathname2url(self.archive_path(term.name))}",))
+            try:
+                await conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS archive.idx_{table}_{column} ON {table} ({column})"
+                )
+                await conn.commit()
+            finally:
+                await conn.execute("DETACH DATABASE archive")
+
+    async def vacuum(self):
+        """Вернуть освободившиеся страницы файловой системе небольшими шагами.
+
+        Полного VACUUM здесь нет: старые базы переводятся на инкрементальный
+        режим в init_db, до начала работы.
+        """
+        async with self.db._read() as conn:
+            async with conn.execute("PRAGMA auto_vacuum") as cursor:
+                mode = (await cursor.fetchone())[0]
+        if mode != 2:
+            logger.warning("auto_vacuum не инкрементальный, место вернётся после перезапуска (init_db)")
+            return
+
+        while True:
+            async with self.db._write() as conn:
+                async with conn.execute("PRAGMA freelist_count") as cursor:
+                    free = (await cursor.fetchone())[0]
+                if not free:
+                    return
+                await conn.execute(f"PRAGMA incremental_vacuum({self.vacuum_pages})")
+                await conn.commit()
+            await asyncio.sleep(self.pause)
+
+    async def get_archived_grades(self, student_id: int, term_name: str) -> List[Grade]:
+        """Отметки студента за архивный семестр"""
+        return await self._query_archive(term_name, Grade, f"""
+            SELECT g.grade_id, g.student_id, g.teacher_id, g.subject, g.grade, {legacy_epoch('g.date')} AS date,
+                   u.full_name AS teacher_name
+            FROM archive.grades g
+            LEFT JOIN main.users u ON g.teacher_id = u.user_id
+            WHERE g.student_id = ?
+            ORDER BY date DESC
+        """, (student_id,))
+
+    async def get_archived_messages(self, user_id: int, term_name: str) -> List[Message]:
+        """Сообщения пользователя за архивный семестр"""
+        return await self._query_archive(term_name, Message, f"""
+            SELECT message_id, from_user_id, to_user_id, message_text, {legacy_epoch('timestamp')} AS timestamp
+            FROM archive.messages
+            WHERE to_user_id = ? OR from_user_id = ?
+            ORDER BY timestamp DESC
+        """, (user_id, user_id))
+
+    async def _query_archive(self, term_name: str, model: Type[Model], query: str, params: tuple) -> List[Model]:
+        path = self.archive_path(term_name)
+        if not os.path.exists(path):
+            return []
+        async with self.db._read() as conn:
+            await conn.execute("ATTACH DATABASE ? AS archive", (f"file:{pathname2url(path)}?mode=ro",))
+            try:
+                async with conn.execute(query, params) as cursor:
+                    cursor.row_factory = row_factory(model)
+                    return await cursor.fetchall()
+            except aiosqlite.OperationalError:
+                # В архиве семестра может не быть нужной таблицы
+                return []
+            finally:
+                await conn.execute("DETACH DATABASE archive")
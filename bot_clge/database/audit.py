@@ -0,0 +1,164 @@
+"""Журнал действий администраторов: кто, что, над кем и когда.
+
+Обработчик только ставит запись в очередь (AuditLog.record), без
+обращения к базе; фоновая задача дописывает накопившиеся записи пакетом
+в одной транзакции. Таблица audit_log только пополняется: изменение и
+удаление строк запрещены триггерами. Выгрузка идёт потоком в JSON Lines:
+
+    python -m database.audit --db college_bot.db --since 2026-09-01 > audit.jsonl
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from datetime import date
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .base import Database
+from .models import AuditEntry
+from .periods import day_start, now
+
+logger = logging.getLogger(__name__)
+
+
+class AuditAction(str, Enum):
+    SET_TEACHER = "set_teacher"
+    SET_STUDENT = "set_student"
+    ADD_ADMIN = "add_admin"
+    CREATE_GROUP = "create_group"
+    ADD_TO_GROUP = "add_to_group"
+    REMOVE_FROM_GROUP = "remove_from_group"
+    BROADCAST = "broadcast"
+    PROMOTE_GROUPS = "promote_groups"
+    RENAME_GROUP = "rename_group"
+    MERGE_GROUPS = "merge_groups"
+    SPLIT_GROUP = "split_group"
+    ARCHIVE_GROUP = "archive_group"
+    DELETE_GROUP = "delete_group"
+
+
+class AuditLog:
+    """Очередь записей журнала с пакетной записью в базу.
+
+    Запись уходит в базу не позже чем через interval секунд или сразу,
+    как только в очереди набралось batch_size записей. Если запись в базу
+    не удалась, пакет возвращается в начало очереди и пишется в следующий
+    раз. Очередь ограничена max_pending записями; сверх этого записи
+    отбрасываются и считаются в dropped.
+    """
+
+    def __init__(self, db: Database, batch_size: int = 100, interval: float = 2.0, max_pending: int = 50_000):
+        self.db = db
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: List[Tuple[int, int, str, Optional[int], Optional[str]]] = []
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self.written = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.dropped = 0
+
+    def record(self, actor_id: int, action: AuditAction, target_id: Optional[int] = None, **details: Any):
+        """Поставить запись в очередь; в базу она попадёт со следующим пакетом"""
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            logger.error("Очередь журнала переполнена, запись %s от %s отброшена", action.value, actor_id)
+            return
+        self._pending.append((
+            now(), actor_id, action.value, target_id,
+            json.dumps(details, ensure_ascii=False) if details else None,
+        ))
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Записать накопившиеся записи; сколько записано"""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+            try:
+                await self.db.add_audit_entries(batch)
+            except Exception:
+                # Новые записи, пришедшие во время попытки, остаются после пакета
+                self._pending[:0] = batch
+                self.failed_batches += 1
+                logger.exception("Не удалось записать журнал действий (%d записей)", len(batch))
+                return 0
+            self.written += len(batch)
+            self.batches += 1
+            return len(batch)
+
+    async def run_forever(self):
+        """Записывать очередь пакетами до отмены"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Отмена задачи не должна оборвать запись пакета на середине
+            await asyncio.shield(self.flush())
+
+    async def close(self):
+        """Записать остаток очереди (после отмены run_forever)"""
+        await self.flush()
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            'pending': len(self._pending),
+            'written': self.written,
+            'batches': self.batches,
+            'failed_batches': self.failed_batches,
+            'dropped': self.dropped,
+        }
+
+
+def entry_to_json(entry: AuditEntry) -> str:
+    """Строка JSON Lines для записи журнала"""
+    item = entry._asdict()
+    item['details'] = json.loads(entry.details) if entry.details else None
+    return json.dumps(item, ensure_ascii=False)
+
+
+async def export_jsonl(db: Database, write: Callable[[str], Any], start: Optional[int] = None,
+                       end: Optional[int] = None) -> int:
+    """Выгрузить журнал за период потоком, по строке JSON на запись; сколько выгружено"""
+    count = 0
+    async for entry in db.iter_audit_log(start, end):
+        write(entry_to_json(entry) + "\n")
+        count += 1
+    return count
+
+
+async def _main(argv: List[str]) -> int:
+    from .factory import create_database
+
+    parser = argparse.ArgumentParser(prog="python -m database.audit")
+    parser.add_argument("--db", default="college_bot.db", help="файл SQLite или адрес postgresql://")
+    parser.add_argument("--since", type=date.fromisoformat, help="с даты ГГГГ-ММ-ДД включительно")
+    parser.add_argument("--until", type=date.fromisoformat, help="по дату ГГГГ-ММ-ДД не включая")
+    args = parser.parse_args(argv)
+
+    db = create_database(args.db)
+    # Выгрузка только читает: миграции и очистка init_db живой базе здесь не нужны
+    await db.open_readonly()
+    try:
+        count = await export_jsonl(
+            db, sys.stdout.write,
+            day_start(args.since) if args.since else None,
+            day_start(args.until) if args.until else None,
+        )
+    finally:
+        await db.close()
+    logger.info("Выгружено записей: %d", count)
+    return 0
+
+
+if __name__ == "__main__":
+    # Сообщения — в stderr, stdout занят выгрузкой
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -0,0 +1,241 @@
+"""Резервные копии базы без остановки бота.
+
+Запуск из каталога bot_clge:
+    python -m database.backup list
+    python -m database.backup create
+    python -m database.backup restore backups/college_bot_20261019_030000.db
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any
+from urllib.request import pathname2url
+import aiosqlite
+from .db import SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "backup"
+
+
+@dataclass(frozen=True)
+class BackupInfo:
+    path: str
+    created: datetime
+    size: int
+
+
+class BackupManager:
+    """Онлайн-копии базы через SQLite backup API.
+
+    Копия снимается с отдельного соединения только для чтения, которое
+    держит открытую читающую транзакцию: в режиме WAL это фиксирует
+    состояние базы на момент начала, поэтому копия согласована и не
+    перезапускается из-за новых записей. Страницы копируются порциями
+    по pages с паузой между ними в потоке aiosqlite, так что ни цикл
+    событий, ни пишущее соединение, ни пул чтения не ждут окончания.
+    Пока копия снимается, WAL не может быть полностью перенесён в базу
+    и растёт на объём записей за это время.
+    """
+
+    def __init__(self, db: SQLiteDatabase, backup_dir: Optional[str] = None, keep: int = 7,
+                 pages: int = 256, pause: float = 0.005):
+        self.db = db
+        self.backup_dir = backup_dir or os.path.join(os.path.dirname(os.path.abspath(db.db_path)), "backups")
+        self.keep = keep
+        self.pages = pages
+        self.pause = pause
+        self.progress = (0, 0)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def _prefix(self) -> str:
+        return os.path.splitext(os.path.basename(self.db.db_path))[0] + "_"
+
+    def start(self) -> "asyncio.Task[BackupInfo]":
+        """Запустить копирование в фоне; повторный вызов возвращает текущий запуск"""
+        if not self.running:
+            self._task = asyncio.create_task(self.create_backup())
+        return self._task
+
+    async def create_backup(self, record: bool = True) -> BackupInfo:
+        """Снять копию базы, проверить её и удалить лишние старые копии.
+
+        record=False — не записывать запуск в scheduler_runs: так копию снимает
+        командная строка, не открывая базу на запись.
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        created = datetime.now()
+        path = os.path.join(self.backup_dir, f"{self._prefix}{created.strftime('%Y%m%d_%H%M%S')}.db")
+        partial = path + ".part"
+        started = time.perf_counter()
+
+        source = await aiosqlite.connect(f"file:{pathname2url(os.path.abspath(self.db.db_path))}?mode=ro", uri=True)
+        try:
+            # Читающая транзакция фиксирует состояние базы на всё время копирования
+            await source.execute("BEGIN")
+            await source.execute("SELECT COUNT(*) FROM sqlite_master")
+            target = await aiosqlite.connect(partial)
+            try:
+                await source.backup(target, pages=self.pages, progress=self._on_progress, sleep=self.pause)
+                await check_integrity(target, quick=True)
+            finally:
+                await target.close()
+        except Exception:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        finally:
+            await source.close()
+
+        os.replace(partial, path)
+        duration = time.perf_counter() - started
+        if record:
+            await self.db.save_scheduler_run(JOB_NAME, created.strftime("%Y-%m-%d %H:%M:%S"), duration)
+        self.prune()
+
+        info = BackupInfo(path, created, os.path.getsize(path))
+        logger.info("Резервная копия %s: %.1f МБ за %.1f с", path, info.size / 2 ** 20, duration)
+        return info
+
+    def _on_progress(self, status: int, remaining: int, total: int):
+        self.progress = (total - remaining, total)
+
+    def list_backups(self) -> List[BackupInfo]:
+        """Готовые копии от новых к старым"""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        backups = []
+        for name in os.listdir(self.backup_dir):
+            if not name.startswith(self._prefix) or not name.endswith(".db"):
+                continue
+            try:
+                created = datetime.strptime(name[len(self._prefix):-3], "%Y%m%d_%H%M%S")
+            except ValueError:
+                continue
+            path = os.path.join(self.backup_dir, name)
+            backups.append(BackupInfo(path, created, os.path.getsize(path)))
+        return sorted(backups, key=lambda item: item.created, reverse=True)
+
+    def prune(self) -> List[str]:
+        """Оставить keep последних копий"""
+        removed = []
+        for info in self.list_backups()[self.keep:]:
+            os.remove(info.path)
+            removed.append(info.path)
+        return removed
+
+    async def run_forever(self, interval: timedelta):
+        """Снимать копию раз в interval, считая от последней успешной"""
+        while True:
+            last = await self.db.get_scheduler_run(JOB_NAME)
+            if last:
+                due = datetime.strptime(last['last_run'], "%Y-%m-%d %H:%M:%S") + interval
+                delay = (due - datetime.now()).total_seconds()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            try:
+                await self.start()
+            except Exception:
+                logger.exception("Ошибка резервного копирования")
+                await asyncio.sleep(min(interval.total_seconds(), 600))
+
+    def status(self) -> Dict[str, Any]:
+        """Состояние копирования для администратора"""
+        backups = self.list_backups()
+        done, total = self.progress
+        return {
+            'running': self.running,
+            'progress': done / total if self.running and total else None,
+            'count': len(backups),
+            'last': backups[0] if backups else None,
+        }
+
+
+async def check_integrity(conn: aiosqlite.Connection, quick: bool = False):
+    """Проверить целостность базы; ValueError со списком ошибок, если она повреждена"""
+    pragma = "quick_check" if quick else "integrity_check"
+    async with conn.execute(f"PRAGMA {pragma}") as cursor:
+        problems = [row[0] for row in await cursor.fetchall()]
+    if problems != ["ok"]:
+        raise ValueError("База повреждена: " + "; ".join(problems[:10]))
+
+
+async def restore(backup_path: str, db_path: str) -> Optional[str]:
+    """Восстановить базу из копии.
+
+    Копия сначала проверяется полным integrity_check. Текущая база
+    (если есть) сохраняется рядом с суффиксом .before-restore. Бот
+    на время восстановления должен быть остановлен.
+    """
+    source = await aiosqlite.connect(f"file:{pathname2url(os.path.abspath(backup_path))}?mode=ro", uri=True)
+    try:
+        await check_integrity(source)
+
+        saved = None
+        if os.path.exists(db_path):
+            saved = f"{db_path}.before-restore-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            current = await aiosqlite.connect(db_path)
+            try:
+                await current.execute("VACUUM INTO ?", (saved,))
+            finally:
+                await current.close()
+
+        target = await aiosqlite.connect(db_path)
+        try:
+            await source.backup(target)
+            await check_integrity(target, quick=True)
+        finally:
+            await target.close()
+    finally:
+        await source.close()
+    return saved
+
+
+async def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m database.backup")
+    parser.add_argument("--db", default="college_bot.db", help="файл базы бота")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="показать копии")
+    commands.add_parser("create", help="снять копию")
+    restore_parser = commands.add_parser("restore", help="восстановить базу из копии (бот должен быть остановлен)")
+    restore_parser.add_argument("backup")
+    args = parser.parse_args(argv)
+
+    if args.command == "restore":
+        try:
+            saved = await restore(args.backup, args.db)
+        except (ValueError, sqlite3.DatabaseError) as e:
+            print(f"Восстановление отменено: {e}")
+            return 1
+        print(f"База {args.db} восстановлена из {args.backup}")
+        if saved:
+            print(f"Прежняя база сохранена в {saved}")
+        return 0
+
+    # База бота не открывается: init_db выполнил бы миграции и, возможно, VACUUM
+    # на работающей базе, а копия снимается своим соединением только для чтения
+    manager = BackupManager(SQLiteDatabase(args.db))
+    if args.command == "create":
+        try:
+            await manager.create_backup(record=False)
+        except (ValueError, sqlite3.DatabaseError) as e:
+            print(f"Копия не снята: {e}")
+            return 1
+    for info in manager.list_backups():
+        print(f"{info.created:%Y-%m-%d %H:%M:%S}  {info.size / 2 ** 20:8.1f} МБ  {info.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
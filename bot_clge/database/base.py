@@ -0,0 +1,364 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from dataclasses import replace
+from types import MappingProxyType
+from typing import Optional, List, Dict, Any, Iterable, AsyncIterator, Tuple
+from .analytics import GroupGradeStats, GradeStatsCache, FAILING_BELOW
+from .groups import GroupPlan, GroupReport, archive_suffix
+from .models import User, Group, ScheduleEntry, Grade, Message, Thread, AuditEntry
+from .periods import now, to_datetime, utc_offset
+from .schedule import ScheduleConflict, batch_conflicts, lesson
+from .singleflight import SingleFlight, single_flight
+from .snapshot import Snapshot
+
+
+class Database(ABC):
+    """Интерфейс хранилища бота.
+
+    Обработчики и фоновые задачи работают только через эти методы, а
+    конкретный движок (SQLiteDatabase, PostgresDatabase) выбирается при
+    запуске. Объединение одинаковых запросов (@single_flight) и снимок
+    справочников общие для всех движков: реализации отдают строки, а
+    сборка и обновление снимка происходят здесь.
+    """
+
+    # Сколько секунд close() ждёт начатые запросы: перебор, брошенный без aclose(),
+    # держит соединение, пока его не соберёт сборщик мусора
+    CLOSE_TIMEOUT = 5.0
+
+    def __init__(self, single_flight_methods: Optional[Iterable[str]] = None):
+        # По умолчанию объединяются все методы, помеченные @single_flight
+        if single_flight_methods is None:
+            single_flight_methods = [
+                name for name in dir(type(self))
+                if getattr(getattr(type(self), name), 'single_flight', False)
+            ]
+        self.single_flight_methods = frozenset(single_flight_methods)
+        self.flights = SingleFlight()
+        # Снимок справочных таблиц; строится вызовом load_snapshot()
+        self.snapshot: Optional[Snapshot] = None
+        self._snapshot_lock = asyncio.Lock()
+        # Сводки отметок по группам; сбрасываются в add_grade и при смене состава групп
+        self.grade_stats = GradeStatsCache()
+        # Растёт после каждой зафиксированной записи и входит в ключ @single_flight:
+        # чтение, начатое после записи, не присоединяется к запросу, начатому до неё
+        self.data_version = 0
+
+    def _data_changed(self):
+        """Отметить зафиксированную запись; движок вызывает после фиксации"""
+        self.data_version += 1
+
+    @abstractmethod
+    async def init_db(self):
+        """Создать таблицы и открыть соединения"""
+
+    @abstractmethod
+    async def open_readonly(self):
+        """Открыть соединения только для чтения, без создания таблиц и миграций (выгрузки, отчёты)"""
+
+    @abstractmethod
+    async def close(self):
+        """Закрыть все соединения с базой данных, дождавшись начатых запросов (не дольше CLOSE_TIMEOUT)"""
+
+    @abstractmethod
+    async def add_user(self, user_id: int, username: str, full_name: str, role: str = "student",
+                       group_id: Optional[int] = None):
+        """Добавить пользователя (или перезаписать существующего)"""
+
+    @abstractmethod
+    async def get_user(self, user_id: int) -> Optional[User]:
+        """Получить информацию о пользователе"""
+
+    @abstractmethod
+    async def get_users_by_ids(self, user_ids: Iterable[int]) -> Dict[int, User]:
+        """Получить пользователей по списку ID одним запросом"""
+
+    @abstractmethod
+    async def update_user_role(self, user_id: int, role: str):
+        """Изменить роль пользователя"""
+
+    @abstractmethod
+    async def update_user_group(self, user_id: int, group_id: Optional[int]):
+        """Изменить группу пользователя"""
+
+    @abstractmethod
+    async def create_group(self, group_name: str) -> int:
+        """Создать группу и вернуть её ID"""
+
+    @abstractmethod
+    async def get_all_groups(self) -> List[Group]:
+        """Получить все действующие (не архивные) группы"""
+
+    @abstractmethod
+    async def get_group_by_name(self, group_name: str) -> Optional[Group]:
+        """Получить группу по имени"""
+
+    @abstractmethod
+    async def get_group_by_id(self, group_id: int) -> Optional[Group]:
+        """Получить группу по ID"""
+
+    @abstractmethod
+    async def get_users_by_role(self, role: str) -> List[User]:
+        """Получить всех пользователей с определенной ролью"""
+
+    @abstractmethod
+    def iter_users_by_role(self, role: str) -> AsyncIterator[User]:
+        """Пользователи с определенной ролью по одному, не загружая весь список.
+
+        Пока итерация не закончена, за ней закреплено соединение с базой:
+        между шагами не стоит надолго ждать, а при досрочном выходе
+        итератор нужно закрыть (contextlib.aclosing).
+        """
+
+    @abstractmethod
+    async def get_users_by_group(self, group_id: int) -> List[User]:
+        """Получить всех пользователей в группе"""
+
+    @abstractmethod
+    def iter_users_by_group(self, group_id: int) -> AsyncIterator[User]:
+        """Пользователи группы по одному (см. iter_users_by_role)"""
+
+    async def add_schedule(self, group_id: int, day_of_week: int, lesson_number: int, subject: str, teacher_id: int,
+                           replace: bool = False) -> List[ScheduleConflict]:
+        """Поставить урок в слот группы; пустой список — записано, иначе накладки (урок не записан)"""
+        return await self.set_schedule([lesson(group_id, day_of_week, lesson_number, subject, teacher_id)], replace)
+
+    async def set_schedule(self, entries: Iterable[ScheduleEntry], replace: bool = False) -> List[ScheduleConflict]:
+        """Записать пакет уроков одной транзакцией (см. database/schedule.py).
+
+        replace — заменять уроки, уже стоящие в слотах групп; урок, который
+        учитель ведёт у другой группы, не заменяется. При любой накладке
+        не записывается ничего, а возвращается список накладок.
+        """
+        entries = list(entries)
+        conflicts = batch_conflicts(entries)
+        if conflicts or not entries:
+            return conflicts
+        conflicts = await self._save_schedule(entries, replace)
+        if not conflicts:
+            groups = {entry.group_id for entry in entries}
+            if len(groups) == 1:
+                await self._refresh_snapshot(schedule_group=groups.pop())
+            else:
+                await self._refresh_snapshot(schedule=True)
+        return conflicts
+
+    @abstractmethod
+    async def _save_schedule(self, entries: List[ScheduleEntry], replace: bool) -> List[ScheduleConflict]:
+        """Проверить уроки пробами уникальных индексов слотов и, если накладок нет, записать (upsert)"""
+
+    @abstractmethod
+    async def get_schedule_by_group(self, group_id: int) -> List[ScheduleEntry]:
+        """Получить расписание группы (с именем учителя), по дню и номеру урока"""
+
+    @abstractmethod
+    async def add_grade(self, student_id: int, teacher_id: int, subject: str, grade: int, date: int):
+        """Добавить отметку; date — секунды Unix"""
+
+    @abstractmethod
+    async def get_grades_by_student(self, student_id: int) -> List[Grade]:
+        """Получить все отметки студента (с именем учителя), новые первыми"""
+
+    @abstractmethod
+    def iter_grades_by_student(self, student_id: int) -> AsyncIterator[Grade]:
+        """Отметки студента по одной, новые первыми (см. iter_users_by_role)"""
+
+    @abstractmethod
+    async def get_grades_between(self, student_id: int, start: int, end: int) -> List[Grade]:
+        """Отметки студента с датой в [start, end) (секунды Unix), новые первыми"""
+
+    @abstractmethod
+    async def get_subject_grades_between(self, subject: str, start: int, end: int) -> List[Grade]:
+        """Отметки всех студентов по предмету с датой в [start, end), новые первыми"""
+
+    @abstractmethod
+    def iter_group_grades(self, group_id: int) -> AsyncIterator[Tuple]:
+        """Отметки студентов группы по одной строке, не загружая их все в память.
+
+        Строка: (имя студента, предмет, отметка, дата в секундах Unix, имя учителя),
+        по студенту, предмету и дате.
+        """
+
+    @property
+    def grades_version(self) -> int:
+        """Растёт при каждой новой отметке и изменении состава групп"""
+        return self.grade_stats.generation
+
+    @abstractmethod
+    async def get_students_by_teacher(self, teacher_id: int) -> List[User]:
+        """Получить всех студентов учителя"""
+
+    @abstractmethod
+    async def add_message(self, from_user_id: int, to_user_id: int, message_text: str, timestamp: int) -> int:
+        """Добавить сообщение, обновить диалоги обоих пользователей и вернуть ID сообщения"""
+
+    @abstractmethod
+    async def get_threads(self, user_id: int, limit: int = 50) -> List[Thread]:
+        """Диалоги пользователя (собеседник, непрочитанные, последнее сообщение), последние первыми"""
+
+    @abstractmethod
+    async def get_unread_count(self, user_id: int) -> int:
+        """Число непрочитанных сообщений пользователя"""
+
+    @abstractmethod
+    async def get_conversation(self, user_id: int, counterpart_id: int, before_id: Optional[int] = None,
+                               limit: int = 10) -> List[Message]:
+        """Страница переписки двух пользователей, новые первыми; before_id — последнее сообщение прошлой страницы"""
+
+    @abstractmethod
+    async def mark_thread_read(self, user_id: int, counterpart_id: int):
+        """Отметить диалог прочитанным"""
+
+    @abstractmethod
+    async def delete_user_from_group(self, user_id: int):
+        """Удалить пользователя из группы"""
+
+    async def delete_group(self, group_id: int):
+        """Удалить группу вместе с расписанием; её пользователи остаются без группы"""
+        await self.apply_group_plan(GroupPlan(delete=(group_id,)))
+
+    async def apply_group_plan(self, plan: GroupPlan, dry_run: bool = False) -> GroupReport:
+        """Выполнить массовую операцию над группами одной транзакцией (см. database/groups.py).
+
+        При dry_run запросы выполняются и откатываются: отчёт показывает,
+        сколько строк будет затронуто, а база не меняется.
+        """
+        groups = {group.group_id: group for group in await self._fetch_snapshot_groups()}
+        plan.check(groups)
+        started = time.perf_counter()
+        timestamp = now()
+        report = await self._apply_group_plan(
+            plan, timestamp, archive_suffix(to_datetime(timestamp).year), dry_run
+        )
+        report.elapsed_ms = (time.perf_counter() - started) * 1000
+        report.renamed = tuple(
+            (groups[group_id].group_name, name) for group_id, name in plan.renames.items()
+        )
+        if not dry_run:
+            self.grade_stats.clear()
+            await self._refresh_snapshot(groups=True, schedule=True)
+        return report
+
+    @abstractmethod
+    async def _apply_group_plan(self, plan: GroupPlan, archived_at: int, archive_suffix: str,
+                                dry_run: bool) -> GroupReport:
+        """Шаги плана в одной транзакции, по запросу на шаг; при dry_run — откатить"""
+
+    @abstractmethod
+    async def set_reminders(self, user_id: int, enabled: bool):
+        """Включить или выключить напоминания о начале урока"""
+
+    @abstractmethod
+    async def get_reminders_enabled(self, user_id: int) -> bool:
+        """Включены ли у пользователя напоминания"""
+
+    @abstractmethod
+    async def get_reminder_subscribers(self, group_id: int) -> List[int]:
+        """Получить ID студентов группы, включивших напоминания"""
+
+    @abstractmethod
+    async def get_scheduler_run(self, job: str) -> Optional[Dict[str, Any]]:
+        """Получить сведения о последнем запуске фоновой задачи"""
+
+    @abstractmethod
+    async def save_scheduler_run(self, job: str, last_run: str, duration: Optional[float] = None,
+                                 sent: int = 0, failed: int = 0):
+        """Сохранить сведения о запуске фоновой задачи"""
+
+    @abstractmethod
+    async def add_audit_entries(self, entries: Iterable[Tuple[int, int, str, Optional[int], Optional[str]]]):
+        """Дописать пакет записей журнала одной транзакцией.
+
+        Запись: (created_at, actor_id, action, target_id, details). Журнал
+        только пополняется: изменение и удаление строк запрещены в самой базе.
+        """
+
+    @abstractmethod
+    async def get_audit_log(self, actor_id: Optional[int] = None, target_id: Optional[int] = None,
+                            start: Optional[int] = None, end: Optional[int] = None,
+                            before_id: Optional[int] = None, limit: int = 20) -> List[AuditEntry]:
+        """Записи журнала, новые первыми, по индексам (actor_id, created_at),
+        (target_id, created_at) или (created_at); before_id — последняя запись прошлой страницы"""
+
+    @abstractmethod
+    def iter_audit_log(self, start: Optional[int] = None, end: Optional[int] = None) -> AsyncIterator[AuditEntry]:
+        """Записи журнала за период по одной, старые первыми (см. iter_users_by_role)"""
+
+    @abstractmethod
+    async def _fetch_group_grade_stats(self, group_id: int, failing_below: float, utc_offset: int) -> GroupGradeStats:
+        """Посчитать сводку отметок группы агрегирующими запросами; месяцы — по местному времени"""
+
+    @single_flight
+    async def get_group_grade_stats(self, group_id: int) -> GroupGradeStats:
+        """Сводка отметок группы: по предметам, неуспевающие, динамика по месяцам"""
+        stats = self.grade_stats.get(group_id)
+        if stats is None:
+            generation = self.grade_stats.generation
+            stats = await self._fetch_group_grade_stats(group_id, FAILING_BELOW, utc_offset())
+            self.grade_stats.put(stats, generation)
+        return stats
+
+    # Строки для снимка справочников
+
+    @abstractmethod
+    async def _fetch_snapshot_groups(self) -> List[Group]:
+        """Все действующие группы по group_id"""
+
+    @abstractmethod
+    async def _fetch_snapshot_teachers(self) -> List[User]:
+        """Все учителя по имени"""
+
+    @abstractmethod
+    async def _fetch_snapshot_schedule(self, group_id: Optional[int] = None) -> List[ScheduleEntry]:
+        """Расписание с именем учителя по группе, дню и номеру урока (без архивных групп)"""
+
+    async def load_snapshot(self) -> Snapshot:
+        """Построить снимок групп, расписания и учителей целиком"""
+        async with self._snapshot_lock:
+            fields = Snapshot.index_groups(await self._fetch_snapshot_groups())
+            fields.update(Snapshot.index_teachers(await self._fetch_snapshot_teachers()))
+            fields['schedule_by_group'] = Snapshot.index_schedule(await self._fetch_snapshot_schedule())
+            version = self.snapshot.version + 1 if self.snapshot else 1
+            self.snapshot = Snapshot(version=version, **fields)
+        return self.snapshot
+
+    async def _refresh_snapshot(self, groups: bool = False, teachers: bool = False,
+                                schedule: bool = False, schedule_group: Optional[int] = None):
+        """Опубликовать новую версию снимка, перечитав только затронутые части"""
+        if self.snapshot is None:
+            return
+        async with self._snapshot_lock:
+            current = self.snapshot
+            fields = {}
+            if groups:
+                fields.update(Snapshot.index_groups(await self._fetch_snapshot_groups()))
+            if teachers:
+                fields.update(Snapshot.index_teachers(await self._fetch_snapshot_teachers()))
+            if schedule:
+                fields['schedule_by_group'] = Snapshot.index_schedule(await self._fetch_snapshot_schedule())
+            elif schedule_group is not None:
+                by_group = dict(current.schedule_by_group)
+                by_group.update(Snapshot.index_schedule(
+                    await self._fetch_snapshot_schedule(schedule_group), schedule_group
+                ))
+                fields['schedule_by_group'] = MappingProxyType(by_group)
+            if groups and 'schedule_by_group' not in fields:
+                # Расписание удалённых групп больше не показываем
+                by_group = {
+                    group_id: items for group_id, items in current.schedule_by_group.items()
+                    if group_id in fields['groups_by_id']
+                }
+                fields['schedule_by_group'] = MappingProxyType(by_group)
+            self.snapshot = replace(current, version=current.version + 1, **fields)
+
+    async def _user_saved(self, user_id: int):
+        """Обновить кэши после add_user: учителя, расписание (если пользователь ведёт уроки), сводки отметок"""
+        self.grade_stats.clear()
+        if self.snapshot is None:
+            return
+        teaches = any(
+            item.teacher_id == user_id
+            for items in self.snapshot.schedule_by_group.values() for item in items
+        )
+        await self._refresh_snapshot(teachers=True, schedule=teaches)
@@ -1,14 +1,58 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
 import aiosqlite
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable, AsyncIterator, Tuple, Type
+from urllib.request import pathname2url
+from .analytics import GroupGradeStats
+from .base import Database
+from .groups import GroupPlan, GroupReport
+from .schedule import SCHEDULE_REMOVED_TABLE, SLOT_CLEANUP, ScheduleConflict, slot_conflicts
+from .models import (
+    User, Group, ScheduleEntry, Grade, Message, Thread, AuditEntry, Model,
+    USER_COLUMNS, GROUP_COLUMNS, MESSAGE_COLUMNS, AUDIT_COLUMNS, SCHEDULE_SELECT, GRADE_SELECT, columns, row_factory
+)
+from .periods import now
+from .singleflight import single_flight
 
+logger = logging.getLogger(__name__)
 
-class Database:
-    def __init__(self, db_path: str = "college_bot.db"):
+
+class SQLiteDatabase(Database):
+    """Хранилище в файле SQLite: одно пишущее соединение и пул читающих"""
+
+    BUSY_TIMEOUT_MS = 5000
+    # Столбцы времени (секунды Unix), которые в старых базах хранились строками местного времени
+    EPOCH_COLUMNS = {
+        'grades': 'date',
+        'messages': 'timestamp',
+        'message_threads': 'last_timestamp',
+    }
+    # Сколько строк забирать из потока sqlite3 за раз при итерации
+    ITER_BATCH = 256
+
+    def __init__(self, db_path: str = "college_bot.db", single_flight_methods: Optional[Iterable[str]] = None,
+                 read_pool_size: int = 4):
+        super().__init__(single_flight_methods)
         self.db_path = db_path
+        # Одно пишущее соединение и пул соединений только для чтения (mode=ro)
+        self.read_pool_size = read_pool_size
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._readers: List[aiosqlite.Connection] = []
+        self._reader_queue: Optional[asyncio.Queue] = None
 
     async def init_db(self):
-        """Инициализация базы данных и создание таблиц"""
-        async with aiosqlite.connect(self.db_path) as db:
+        """Инициализация базы данных, создание таблиц и открытие соединений"""
+        await self._open_writer()
+        async with self._write() as db:
+            # Создание схемы и перенос старых данных — одна транзакция
+            await db.execute("BEGIN")
+            legacy = await self._rename_text_timestamps(db)
+
             # Таблица пользователей
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS users (
@@ -21,13 +65,17 @@ class Database:
                 )
             """)
 
-            # Таблица групп
+            # Таблица групп; archived_at — время архивации (NULL у действующих групп)
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS groups (
                     group_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    group_name TEXT NOT NULL UNIQUE
+                    group_name TEXT NOT NULL UNIQUE,
+                    archived_at INTEGER
                 )
             """)
+            async with db.execute("PRAGMA table_info(groups)") as cursor:
+                if 'archived_at' not in [row['name'] for row in await cursor.fetchall()]:
+                    await db.execute("ALTER TABLE groups ADD COLUMN archived_at INTEGER")
 
             # Таблица расписания
             await db.execute("""
@@ -51,12 +99,30 @@ class Database:
                     teacher_id INTEGER NOT NULL,
                     subject TEXT NOT NULL,
                     grade INTEGER NOT NULL,
-                    date TEXT NOT NULL,
+                    date INTEGER NOT NULL,
                     FOREIGN KEY (student_id) REFERENCES users(user_id),
                     FOREIGN KEY (teacher_id) REFERENCES users(user_id)
                 )
             """)
 
+            # Состав и расписание группы: массовые операции над группами идут по этим индексам
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_group ON users (group_id)")
+            # Строки, оставшиеся от групп, удалённых до каскадного удаления
+            await db.execute("""
+                UPDATE users SET group_id = NULL
+                WHERE group_id IS NOT NULL AND group_id NOT IN (SELECT group_id FROM groups)
+            """)
+            await db.execute("DELETE FROM schedule WHERE group_id NOT IN (SELECT group_id FROM groups)")
+            await self._unique_schedule_slots(db)
+
+            # Отметки студента по предметам: покрывающий индекс для сводок по группе
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_grades_student ON grades (student_id, subject, grade, date)"
+            )
+            # Отметки за период: студента и по предмету
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_grades_student_date ON grades (student_id, date)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_grades_subject_date ON grades (subject, date)")
+
             # Таблица сообщений
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS messages (
@@ -64,167 +130,782 @@ class Database:
                     from_user_id INTEGER NOT NULL,
                     to_user_id INTEGER NOT NULL,
                     message_text TEXT NOT NULL,
-                    timestamp TEXT NOT NULL,
+                    timestamp INTEGER NOT NULL,
                     FOREIGN KEY (from_user_id) REFERENCES users(user_id),
                     FOREIGN KEY (to_user_id) REFERENCES users(user_id)
                 )
             """)
 
+            # История переписки: входящие по времени и диалог пары пользователей
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_messages_to_time ON messages (to_user_id, timestamp)")
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_messages_pair_time ON messages (from_user_id, to_user_id, timestamp)"
+            )
+
+            # Диалоги пользователя: собеседник, число непрочитанных и последнее сообщение.
+            # Поддерживается в add_message, чтобы список диалогов не считался по всей истории
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS message_threads (
+                    user_id INTEGER NOT NULL,
+                    counterpart_id INTEGER NOT NULL,
+                    unread INTEGER NOT NULL DEFAULT 0,
+                    last_message_id INTEGER,
+                    last_timestamp INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, counterpart_id)
+                )
+            """)
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_threads_user_time ON message_threads (user_id, last_timestamp)"
+            )
+            await self._copy_text_timestamps(db, legacy)
+            # Диалоги для сообщений, сохранённых до появления таблицы (считаются прочитанными)
+            await db.execute("""
+                INSERT OR IGNORE INTO message_threads (user_id, counterpart_id, unread, last_message_id, last_timestamp)
+                SELECT owner, other, 0, MAX(message_id), MAX(timestamp)
+                FROM (
+                    SELECT from_user_id AS owner, to_user_id AS other, message_id, timestamp FROM messages
+                    UNION ALL
+                    SELECT to_user_id, from_user_id, message_id, timestamp FROM messages
+                )
+                WHERE NOT EXISTS (SELECT 1 FROM message_threads)
+                GROUP BY owner, other
+            """)
+
+            # Подписки студентов на напоминания о начале урока
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS reminder_subscriptions (
+                    user_id INTEGER PRIMARY KEY,
+                    FOREIGN KEY (user_id) REFERENCES users(user_id)
+                )
+            """)
+
+            # Последние запуски фоновых задач (переживают перезапуск бота)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS scheduler_runs (
+                    job TEXT PRIMARY KEY,
+                    last_run TEXT NOT NULL,
+                    duration REAL,
+                    sent INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+
+            # Журнал действий администраторов: строки только добавляются
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS audit_log (
+                    audit_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at INTEGER NOT NULL,
+                    actor_id INTEGER NOT NULL,
+                    action TEXT NOT NULL,
+                    target_id INTEGER,
+                    details TEXT
+                )
+            """)
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_audit_actor ON audit_log (actor_id, created_at)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_audit_target ON audit_log (target_id, created_at)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_audit_time ON audit_log (created_at)")
+            for operation in ("UPDATE", "DELETE"):
+                await db.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS audit_log_no_{operation.lower()}
+                    BEFORE {operation} ON audit_log
+                    BEGIN SELECT RAISE(ABORT, 'audit_log: разрешено только добавление'); END
+                """)
+
             await db.commit()
+            await self._enable_incremental_vacuum(db)
+
+        await self._open_readers()
+
+    async def open_readonly(self):
+        """Открыть только читающие соединения (mode=ro): файл базы не меняется"""
+        await self._open_readers()
+
+    async def _enable_incremental_vacuum(self, db: aiosqlite.Connection):
+        """Перевести базу, созданную до включения auto_vacuum, на инкрементальный режим.
+
+        Режим меняется только полным VACUUM, который переписывает весь файл,
+        поэтому это делается один раз при запуске, до открытия читателей, а
+        архивация потом освобождает место короткими шагами incremental_vacuum.
+        """
+        async with db.execute("PRAGMA auto_vacuum") as cursor:
+            if (await cursor.fetchone())[0] == 2:
+                return
+        started = time.perf_counter()
+        await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        await db.execute("VACUUM")
+        logger.info("База переведена на auto_vacuum = INCREMENTAL за %.1f с", time.perf_counter() - started)
+
+    async def _unique_schedule_slots(self, db: aiosqlite.Connection):
+        """Уникальные слоты группы и учителя; мешающие им уроки старых баз один раз переносятся в schedule_removed"""
+        async with db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_schedule_teacher_slot'"
+        ) as cursor:
+            indexed = await cursor.fetchone() is not None
+        if not indexed:
+            await db.execute(SCHEDULE_REMOVED_TABLE)
+            removed_at = now()
+            for reason, condition in SLOT_CLEANUP:
+                await db.execute(f"""
+                    INSERT INTO schedule_removed
+                    SELECT schedule_id, group_id, day_of_week, lesson_number, subject, teacher_id, ?, ?
+                    FROM schedule WHERE {condition}
+                """, (reason, removed_at))
+                cursor = await db.execute(f"DELETE FROM schedule WHERE {condition}")
+                if cursor.rowcount:
+                    logger.warning("Уроки расписания перенесены в schedule_removed (%s): %d", reason, cursor.rowcount)
+            await db.execute("DROP INDEX IF EXISTS idx_schedule_group")
+        await db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_schedule_slot ON schedule (group_id, day_of_week, lesson_number)"
+        )
+        await db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_schedule_teacher_slot ON schedule (teacher_id, day_of_week, lesson_number)"
+        )
+
+    async def _rename_text_timestamps(self, db: aiosqlite.Connection) -> List[str]:
+        """Отложить таблицы, где время ещё хранится строкой: они создадутся заново с INTEGER"""
+        legacy = []
+        for table, column in self.EPOCH_COLUMNS.items():
+            async with db.execute(f"PRAGMA table_info({table})") as cursor:
+                types = {row['name']: row['type'] for row in await cursor.fetchall()}
+            if types.get(column, "").upper() != "TEXT":
+                continue
+            # Индексы переименованной таблицы сохранили бы свои имена и помешали создать новые
+            async with db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+            ) as cursor:
+                indexes = [row[0] for row in await cursor.fetchall()]
+            for index in indexes:
+                await db.execute(f"DROP INDEX {index}")
+            await db.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+            legacy.append(table)
+        return legacy
+
+    async def _copy_text_timestamps(self, db: aiosqlite.Connection, legacy: List[str]):
+        """Перенести строки отложенных таблиц, переводя местное время в секунды Unix"""
+        for table in legacy:
+            column = self.EPOCH_COLUMNS[table]
+            async with db.execute(f"PRAGMA table_info({table})") as cursor:
+                names = [row['name'] for row in await cursor.fetchall()]
+            values = ", ".join(
+                # 'utc' переводит местное время в UTC, '%s' — секунды Unix
+                f"CAST(strftime('%s', {name}, 'utc') AS INTEGER)" if name == column else name
+                for name in names
+            )
+            await db.execute(f"INSERT INTO {table} ({', '.join(names)}) SELECT {values} FROM {table}_legacy")
+            await db.execute(f"DROP TABLE {table}_legacy")
+
+    async def close(self):
+        """Закрыть все соединения с базой данных"""
+        readers, self._readers = self._readers, []
+        queue, self._reader_queue = self._reader_queue, None
+        # Новые чтения уже не начнутся; начатые дочитывают и возвращают соединение в пул
+        returned = 0
+
+        async def wait_readers():
+            nonlocal returned
+            while returned < len(readers):
+                await queue.get()
+                returned += 1
+
+        try:
+            await asyncio.wait_for(wait_readers(), self.CLOSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Заняты при закрытии читающих соединений: %d, они закрываются принудительно",
+                           len(readers) - returned)
+        for conn in readers:
+            await conn.close()
+        if self._writer is not None:
+            async with self._write_lock:
+                await self._writer.close()
+                self._writer = None
+
+    async def _open_writer(self):
+        if self._writer is not None:
+            return
+        self._writer = await aiosqlite.connect(self.db_path)
+        self._writer.row_factory = aiosqlite.Row
+        # Для новой базы: освобождённые страницы возвращаются инкрементальным VACUUM
+        await self._writer.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # WAL: читатели не блокируются пишущим соединением и наоборот
+        await self._writer.execute("PRAGMA journal_mode = WAL")
+        await self._writer.execute("PRAGMA synchronous = NORMAL")
+        await self._writer.execute(f"PRAGMA busy_timeout = {self.BUSY_TIMEOUT_MS}")
+
+    async def _open_readers(self):
+        if self._reader_queue is not None:
+            return
+        uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+        queue: asyncio.Queue = asyncio.Queue()
+        for _ in range(self.read_pool_size):
+            conn = await aiosqlite.connect(uri, uri=True)
+            conn.row_factory = aiosqlite.Row
+            await conn.execute("PRAGMA query_only = ON")
+            await conn.execute(f"PRAGMA busy_timeout = {self.BUSY_TIMEOUT_MS}")
+            self._readers.append(conn)
+            queue.put_nowait(conn)
+        self._reader_queue = queue
+
+    @asynccontextmanager
+    async def _read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Соединение только для чтения из пула"""
+        queue = self._reader_queue
+        if queue is None:
+            raise RuntimeError("Database не инициализирована: вызовите init_db()")
+        conn = await queue.get()
+        try:
+            yield conn
+        finally:
+            queue.put_nowait(conn)
+
+    @asynccontextmanager
+    async def _write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Единственное пишущее соединение; записи выполняются строго по очереди"""
+        if self._writer is None:
+            raise RuntimeError("Database не инициализирована: вызовите init_db()")
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                if self._writer.in_transaction:
+                    await self._writer.rollback()
+                raise
+            finally:
+                # Запись могла быть зафиксирована: новые чтения не присоединяются к начатым до неё
+                self._data_changed()
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Транзакция на пишущем соединении для массовых операций; фиксируется при выходе"""
+        async with self._write() as db:
+            yield db
+            await db.commit()
+
+    async def _fetch_all(self, model: Type[Model], query: str, params: tuple = ()) -> List[Model]:
+        """Все строки запроса, собранные в model прямо в потоке sqlite3"""
+        async with self._read() as db:
+            async with db.execute(query, params) as cursor:
+                cursor.row_factory = row_factory(model)
+                return await cursor.fetchall()
+
+    async def _fetch_one(self, model: Type[Model], query: str, params: tuple = ()) -> Optional[Model]:
+        async with self._read() as db:
+            async with db.execute(query, params) as cursor:
+                cursor.row_factory = row_factory(model)
+                return await cursor.fetchone()
+
+    async def _iterate(self, model: Type[Model], query: str, params: tuple = ()) -> AsyncIterator[Model]:
+        """Строки запроса по одной; читающее соединение занято, пока итерация не закончится"""
+        async with self._read() as db:
+            async with db.execute(query, params) as cursor:
+                cursor.row_factory = row_factory(model)
+                cursor.arraysize = self.ITER_BATCH
+                async for item in cursor:
+                    yield item
 
     async def add_user(self, user_id: int, username: str, full_name: str, role: str = "student", group_id: Optional[int] = None):
         """Добавить пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("""
                 INSERT OR REPLACE INTO users (user_id, username, full_name, role, group_id)
                 VALUES (?, ?, ?, ?, ?)
             """, (user_id, username, full_name, role, group_id))
             await db.commit()
+        await self._user_saved(user_id)
 
-    async def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+    @single_flight
+    async def get_user(self, user_id: int) -> Optional[User]:
         """Получить информацию о пользователе"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)) as cursor:
-                row = await cursor.fetchone()
-                return dict(row) if row else None
+        return await self._fetch_one(User, f"SELECT {USER_COLUMNS} FROM users WHERE user_id = ?", (user_id,))
+
+    async def get_users_by_ids(self, user_ids: Iterable[int]) -> Dict[int, User]:
+        """Получить пользователей по списку ID одним запросом"""
+        ids = list(dict.fromkeys(user_ids))
+        if not ids:
+            return {}
+        users = await self._fetch_all(
+            User,
+            f"SELECT {USER_COLUMNS} FROM users WHERE user_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(ids),)
+        )
+        return {user.user_id: user for user in users}
 
     async def update_user_role(self, user_id: int, role: str):
         """Изменить роль пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("UPDATE users SET role = ? WHERE user_id = ?", (role, user_id))
             await db.commit()
+        self.grade_stats.clear()
+        await self._refresh_snapshot(teachers=True)
 
     async def update_user_group(self, user_id: int, group_id: Optional[int]):
         """Изменить группу пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("UPDATE users SET group_id = ? WHERE user_id = ?", (group_id, user_id))
             await db.commit()
+        self.grade_stats.clear()
 
     async def create_group(self, group_name: str) -> int:
         """Создать группу"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             cursor = await db.execute("INSERT INTO groups (group_name) VALUES (?)", (group_name,))
             await db.commit()
-            return cursor.lastrowid
+            group_id = cursor.lastrowid
+        await self._refresh_snapshot(groups=True)
+        return group_id
 
-    async def get_all_groups(self) -> List[Dict[str, Any]]:
-        """Получить все группы"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("SELECT * FROM groups") as cursor:
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+    @single_flight
+    async def get_all_groups(self) -> List[Group]:
+        """Получить все действующие группы"""
+        return await self._fetch_all(Group, f"SELECT {GROUP_COLUMNS} FROM groups WHERE archived_at IS NULL")
 
-    async def get_group_by_name(self, group_name: str) -> Optional[Dict[str, Any]]:
+    @single_flight
+    async def get_group_by_name(self, group_name: str) -> Optional[Group]:
         """Получить группу по имени"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("SELECT * FROM groups WHERE group_name = ?", (group_name,)) as cursor:
-                row = await cursor.fetchone()
-                return dict(row) if row else None
+        return await self._fetch_one(Group, f"SELECT {GROUP_COLUMNS} FROM groups WHERE group_name = ?", (group_name,))
 
-    async def get_group_by_id(self, group_id: int) -> Optional[Dict[str, Any]]:
+    @single_flight
+    async def get_group_by_id(self, group_id: int) -> Optional[Group]:
         """Получить группу по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("SELECT * FROM groups WHERE group_id = ?", (group_id,)) as cursor:
-                row = await cursor.fetchone()
-                return dict(row) if row else None
+        return await self._fetch_one(Group, f"SELECT {GROUP_COLUMNS} FROM groups WHERE group_id = ?", (group_id,))
 
-    async def get_users_by_role(self, role: str) -> List[Dict[str, Any]]:
+    @single_flight
+    async def get_users_by_role(self, role: str) -> List[User]:
         """Получить всех пользователей с определенной ролью"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("SELECT * FROM users WHERE role = ?", (role,)) as cursor:
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+        return await self._fetch_all(User, f"SELECT {USER_COLUMNS} FROM users WHERE role = ?", (role,))
 
-    async def get_users_by_group(self, group_id: int) -> List[Dict[str, Any]]:
+    def iter_users_by_role(self, role: str) -> AsyncIterator[User]:
+        """Пользователи с определенной ролью по одному"""
+        return self._iterate(User, f"SELECT {USER_COLUMNS} FROM users WHERE role = ?", (role,))
+
+    @single_flight
+    async def get_users_by_group(self, group_id: int) -> List[User]:
         """Получить всех пользователей в группе"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("SELECT * FROM users WHERE group_id = ?", (group_id,)) as cursor:
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+        return await self._fetch_all(User, f"SELECT {USER_COLUMNS} FROM users WHERE group_id = ?", (group_id,))
 
-    async def add_schedule(self, group_id: int, day_of_week: int, lesson_number: int, subject: str, teacher_id: int):
-        """Добавить запись в расписание"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
+    def iter_users_by_group(self, group_id: int) -> AsyncIterator[User]:
+        """Пользователи группы по одному"""
+        return self._iterate(User, f"SELECT {USER_COLUMNS} FROM users WHERE group_id = ?", (group_id,))
+
+    async def _save_schedule(self, entries: List[ScheduleEntry], replace: bool) -> List[ScheduleConflict]:
+        """Пробы уникальных индексов слотов и запись — под одной блокировкой пишущего соединения"""
+        conflicts = []
+        async with self._write() as db:
+            for entry in entries:
+                slot = (entry.day_of_week, entry.lesson_number)
+                async with db.execute(SCHEDULE_SELECT + """
+                    WHERE s.group_id = ? AND s.day_of_week = ? AND s.lesson_number = ?
+                """, (entry.group_id, *slot)) as cursor:
+                    cursor.row_factory = row_factory(ScheduleEntry)
+                    in_group = await cursor.fetchall()
+                async with db.execute(SCHEDULE_SELECT + """
+                    WHERE s.teacher_id = ? AND s.day_of_week = ? AND s.lesson_number = ? AND s.group_id <> ?
+                """, (entry.teacher_id, *slot, entry.group_id)) as cursor:
+                    cursor.row_factory = row_factory(ScheduleEntry)
+                    for_teacher = await cursor.fetchall()
+                conflicts.extend(slot_conflicts(entry, in_group, for_teacher, replace))
+            if conflicts:
+                return conflicts
+            await db.executemany("""
                 INSERT INTO schedule (group_id, day_of_week, lesson_number, subject, teacher_id)
                 VALUES (?, ?, ?, ?, ?)
-            """, (group_id, day_of_week, lesson_number, subject, teacher_id))
+                ON CONFLICT (group_id, day_of_week, lesson_number)
+                DO UPDATE SET subject = excluded.subject, teacher_id = excluded.teacher_id
+            """, [
+                (entry.group_id, entry.day_of_week, entry.lesson_number, entry.subject, entry.teacher_id)
+                for entry in entries
+            ])
             await db.commit()
+        return conflicts
 
-    async def get_schedule_by_group(self, group_id: int) -> List[Dict[str, Any]]:
+    @single_flight
+    async def get_schedule_by_group(self, group_id: int) -> List[ScheduleEntry]:
         """Получить расписание для группы"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("""
-                SELECT s.*, u.full_name as teacher_name
-                FROM schedule s
-                LEFT JOIN users u ON s.teacher_id = u.user_id
-                WHERE s.group_id = ?
-                ORDER BY s.day_of_week, s.lesson_number
-            """, (group_id,)) as cursor:
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+        return await self._fetch_all(ScheduleEntry, SCHEDULE_SELECT + """
+            WHERE s.group_id = ?
+            ORDER BY s.day_of_week, s.lesson_number
+        """, (group_id,))
 
-    async def add_grade(self, student_id: int, teacher_id: int, subject: str, grade: int, date: str):
+    async def add_grade(self, student_id: int, teacher_id: int, subject: str, grade: int, date: int):
         """Добавить отметку"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("""
                 INSERT INTO grades (student_id, teacher_id, subject, grade, date)
                 VALUES (?, ?, ?, ?, ?)
             """, (student_id, teacher_id, subject, grade, date))
             await db.commit()
+        self.grade_stats.invalidate_student(student_id)
 
-    async def get_grades_by_student(self, student_id: int) -> List[Dict[str, Any]]:
+    @single_flight
+    async def get_grades_by_student(self, student_id: int) -> List[Grade]:
         """Получить все отметки студента"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("""
-                SELECT g.*, u.full_name as teacher_name
-                FROM grades g
-                LEFT JOIN users u ON g.teacher_id = u.user_id
-                WHERE g.student_id = ?
-                ORDER BY g.date DESC
-            """, (student_id,)) as cursor:
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+        return await self._fetch_all(Grade, GRADE_SELECT + " WHERE g.student_id = ? ORDER BY g.date DESC", (student_id,))
 
-    async def get_students_by_teacher(self, teacher_id: int) -> List[Dict[str, Any]]:
-        """Получить всех студентов учителя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+    def iter_grades_by_student(self, student_id: int) -> AsyncIterator[Grade]:
+        """Отметки студента по одной, новые первыми"""
+        return self._iterate(Grade, GRADE_SELECT + " WHERE g.student_id = ? ORDER BY g.date DESC", (student_id,))
+
+    async def get_grades_between(self, student_id: int, start: int, end: int) -> List[Grade]:
+        """Отметки студента за период по индексу (student_id, date)"""
+        return await self._fetch_all(
+            Grade, GRADE_SELECT + " WHERE g.student_id = ? AND g.date >= ? AND g.date < ? ORDER BY g.date DESC",
+            (student_id, start, end)
+        )
+
+    async def get_subject_grades_between(self, subject: str, start: int, end: int) -> List[Grade]:
+        """Отметки по предмету за период по индексу (subject, date)"""
+        return await self._fetch_all(
+            Grade, GRADE_SELECT + " WHERE g.subject = ? AND g.date >= ? AND g.date < ? ORDER BY g.date DESC",
+            (subject, start, end)
+        )
+
+    async def iter_group_grades(self, group_id: int) -> AsyncIterator[Tuple]:
+        """Отметки студентов группы построчно, курсором на читающем соединении"""
+        async with self._read() as db:
             async with db.execute("""
-                SELECT DISTINCT u.*
+                SELECT u.full_name, g.subject, g.grade, g.date, t.full_name
                 FROM users u
-                INNER JOIN schedule s ON u.group_id = s.group_id
-                WHERE s.teacher_id = ? AND u.role = 'student'
-            """, (teacher_id,)) as cursor:
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+                JOIN grades g ON g.student_id = u.user_id
+                LEFT JOIN users t ON g.teacher_id = t.user_id
+                WHERE u.group_id = ? AND u.role = 'student'
+                ORDER BY u.full_name, u.user_id, g.subject, g.date
+            """, (group_id,)) as cursor:
+                cursor.arraysize = self.ITER_BATCH
+                async for row in cursor:
+                    yield tuple(row)
 
-    async def add_message(self, from_user_id: int, to_user_id: int, message_text: str, timestamp: str):
-        """Добавить сообщение"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
+    @single_flight
+    async def get_students_by_teacher(self, teacher_id: int) -> List[User]:
+        """Получить всех студентов учителя"""
+        return await self._fetch_all(User, f"""
+            SELECT DISTINCT {columns(USER_COLUMNS, "u")}
+            FROM users u
+            INNER JOIN schedule s ON u.group_id = s.group_id
+            WHERE s.teacher_id = ? AND u.role = 'student'
+        """, (teacher_id,))
+
+    async def add_message(self, from_user_id: int, to_user_id: int, message_text: str, timestamp: int) -> int:
+        """Добавить сообщение и обновить диалоги отправителя и получателя"""
+        async with self._write() as db:
+            cursor = await db.execute("""
                 INSERT INTO messages (from_user_id, to_user_id, message_text, timestamp)
                 VALUES (?, ?, ?, ?)
             """, (from_user_id, to_user_id, message_text, timestamp))
+            message_id = cursor.lastrowid
+            await db.executemany("""
+                INSERT INTO message_threads (user_id, counterpart_id, unread, last_message_id, last_timestamp)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, counterpart_id) DO UPDATE SET
+                    unread = unread + excluded.unread,
+                    last_message_id = excluded.last_message_id,
+                    last_timestamp = excluded.last_timestamp
+            """, [
+                (to_user_id, from_user_id, 1, message_id, timestamp),
+                (from_user_id, to_user_id, 0, message_id, timestamp),
+            ])
+            await db.commit()
+        return message_id
+
+    async def get_threads(self, user_id: int, limit: int = 50) -> List[Thread]:
+        """Диалоги пользователя, последние первыми"""
+        return await self._fetch_all(Thread, """
+            SELECT t.counterpart_id, t.unread, t.last_timestamp,
+                   u.full_name as counterpart_name, u.username as counterpart_username,
+                   m.message_text as last_text, m.from_user_id as last_from_user_id
+            FROM message_threads t
+            LEFT JOIN users u ON u.user_id = t.counterpart_id
+            LEFT JOIN messages m ON m.message_id = t.last_message_id
+            WHERE t.user_id = ?
+            ORDER BY t.last_timestamp DESC
+            LIMIT ?
+        """, (user_id, limit))
+
+    async def get_unread_count(self, user_id: int) -> int:
+        """Число непрочитанных сообщений пользователя"""
+        async with self._read() as db:
+            async with db.execute(
+                "SELECT COALESCE(SUM(unread), 0) FROM message_threads WHERE user_id = ?", (user_id,)
+            ) as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def get_conversation(self, user_id: int, counterpart_id: int, before_id: Optional[int] = None,
+                               limit: int = 10) -> List[Message]:
+        """Страница переписки двух пользователей, новые первыми.
+
+        Следующая страница — before_id последнего сообщения предыдущей:
+        выборка идёт по индексу (from_user_id, to_user_id, timestamp) от
+        ключа (timestamp, message_id), без OFFSET.
+        """
+        async with self._read() as db:
+            keyset, params = "", ()
+            if before_id is not None:
+                async with db.execute(
+                    "SELECT timestamp, message_id FROM messages WHERE message_id = ?", (before_id,)
+                ) as cursor:
+                    row = await cursor.fetchone()
+                if row is None:
+                    return []
+                keyset, params = " AND (timestamp, message_id) < (?, ?)", tuple(row)
+
+            direction = f"""
+                SELECT {MESSAGE_COLUMNS} FROM messages
+                WHERE from_user_id = ? AND to_user_id = ?{keyset}
+                ORDER BY timestamp DESC, message_id DESC
+                LIMIT ?
+            """
+            async with db.execute(f"""
+                SELECT * FROM ({direction})
+                UNION ALL
+                SELECT * FROM ({direction})
+                ORDER BY timestamp DESC, message_id DESC
+                LIMIT ?
+            """, (user_id, counterpart_id, *params, limit, counterpart_id, user_id, *params, limit, limit)) as cursor:
+                cursor.row_factory = row_factory(Message)
+                return await cursor.fetchall()
+
+    async def mark_thread_read(self, user_id: int, counterpart_id: int):
+        """Отметить диалог прочитанным"""
+        async with self._write() as db:
+            await db.execute("""
+                UPDATE message_threads SET unread = 0
+                WHERE user_id = ? AND counterpart_id = ? AND unread > 0
+            """, (user_id, counterpart_id))
             await db.commit()
 
     async def delete_user_from_group(self, user_id: int):
         """Удалить пользователя из группы"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("UPDATE users SET group_id = NULL WHERE user_id = ?", (user_id,))
             await db.commit()
+        self.grade_stats.clear()
+
+    async def _apply_group_plan(self, plan: GroupPlan, archived_at: int, archive_suffix: str,
+                                dry_run: bool) -> GroupReport:
+        """Шаги плана в одной транзакции; списки ID передаются одним параметром через json_each"""
+        report = GroupReport(dry_run=dry_run)
+        archive = json.dumps(list(plan.archive))
+        delete = json.dumps([*plan.merges, *plan.delete])
+        async with self._write() as db:
+            await db.execute("BEGIN")
+            if plan.merges:
+                # {источник: приёмник} — все пользователи источников одним запросом
+                cursor = await db.execute("""
+                    UPDATE users SET group_id = (
+                        SELECT value FROM json_each(?1) WHERE key = CAST(users.group_id AS TEXT)
+                    )
+                    WHERE group_id IN (SELECT CAST(key AS INTEGER) FROM json_each(?1))
+                """, (json.dumps(dict(plan.merges)),))
+                report.users_moved += cursor.rowcount
+            if plan.archive:
+                cursor = await db.execute(
+                    "UPDATE users SET group_id = NULL WHERE group_id IN (SELECT value FROM json_each(?))", (archive,)
+                )
+                report.users_detached += cursor.rowcount
+                cursor = await db.execute(
+                    "DELETE FROM schedule WHERE group_id IN (SELECT value FROM json_each(?))", (archive,)
+                )
+                report.schedule_deleted += cursor.rowcount
+                cursor = await db.execute("""
+                    UPDATE groups SET archived_at = ?, group_name = group_name || ?
+                    WHERE group_id IN (SELECT value FROM json_each(?))
+                """, (archived_at, archive_suffix, archive))
+                report.groups_archived += cursor.rowcount
+            if plan.merges or plan.delete:
+                cursor = await db.execute(
+                    "UPDATE users SET group_id = NULL WHERE group_id IN (SELECT value FROM json_each(?))", (delete,)
+                )
+                report.users_detached += cursor.rowcount
+                cursor = await db.execute(
+                    "DELETE FROM schedule WHERE group_id IN (SELECT value FROM json_each(?))", (delete,)
+                )
+                report.schedule_deleted += cursor.rowcount
+                cursor = await db.execute(
+                    "DELETE FROM groups WHERE group_id IN (SELECT value FROM json_each(?))", (delete,)
+                )
+                report.groups_deleted += cursor.rowcount
+            if plan.renames:
+                renames = json.dumps(dict(plan.renames))
+                # Сначала временные названия, чтобы обмен и сдвиг названий (ИС-11 → ИС-21,
+                # ИС-21 → ИС-31) не упирались в UNIQUE. Названия вводятся без пробелов
+                # по краям, поэтому " <ID>" ни с одним настоящим не совпадёт
+                await db.execute("""
+                    UPDATE groups SET group_name = ' ' || group_id
+                    WHERE group_id IN (SELECT CAST(key AS INTEGER) FROM json_each(?))
+                """, (renames,))
+                cursor = await db.execute("""
+                    UPDATE groups SET group_name = (
+                        SELECT value FROM json_each(?1) WHERE key = CAST(groups.group_id AS TEXT)
+                    )
+                    WHERE group_id IN (SELECT CAST(key AS INTEGER) FROM json_each(?1))
+                """, (renames,))
+                report.groups_renamed += cursor.rowcount
+            for split in plan.splits:
+                cursor = await db.execute("INSERT INTO groups (group_name) VALUES (?)", (split.new_name,))
+                new_group_id = cursor.lastrowid
+                report.groups_created += 1
+                cursor = await db.execute("""
+                    UPDATE users SET group_id = ?
+                    WHERE group_id = ? AND user_id IN (SELECT value FROM json_each(?))
+                """, (new_group_id, split.group_id, json.dumps(list(split.user_ids))))
+                report.users_moved += cursor.rowcount
+                async with db.execute("SELECT COUNT(*) FROM schedule WHERE group_id = ?", (split.group_id,)) as cursor:
+                    report.schedule_to_assign += (await cursor.fetchone())[0]
+            if dry_run:
+                await db.rollback()
+            else:
+                await db.commit()
+        return report
 
-    async def delete_group(self, group_id: int):
-        """Удалить группу"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("DELETE FROM groups WHERE group_id = ?", (group_id,))
+    async def set_reminders(self, user_id: int, enabled: bool):
+        """Включить или выключить напоминания о начале урока"""
+        async with self._write() as db:
+            if enabled:
+                await db.execute("INSERT OR IGNORE INTO reminder_subscriptions (user_id) VALUES (?)", (user_id,))
+            else:
+                await db.execute("DELETE FROM reminder_subscriptions WHERE user_id = ?", (user_id,))
             await db.commit()
 
+    async def get_reminders_enabled(self, user_id: int) -> bool:
+        """Включены ли у пользователя напоминания"""
+        async with self._read() as db:
+            async with db.execute("SELECT 1 FROM reminder_subscriptions WHERE user_id = ?", (user_id,)) as cursor:
+                return await cursor.fetchone() is not None
+
+    @single_flight
+    async def get_reminder_subscribers(self, group_id: int) -> List[int]:
+        """Получить ID студентов группы, включивших напоминания"""
+        async with self._read() as db:
+            async with db.execute("""
+                SELECT u.user_id
+                FROM users u
+                INNER JOIN reminder_subscriptions r ON r.user_id = u.user_id
+                WHERE u.group_id = ? AND u.role = 'student'
+            """, (group_id,)) as cursor:
+                rows = await cursor.fetchall()
+                return [row['user_id'] for row in rows]
+
+    async def get_scheduler_run(self, job: str) -> Optional[Dict[str, Any]]:
+        """Получить сведения о последнем запуске фоновой задачи"""
+        async with self._read() as db:
+            async with db.execute("SELECT * FROM scheduler_runs WHERE job = ?", (job,)) as cursor:
+                row = await cursor.fetchone()
+                return dict(row) if row else None
+
+    async def save_scheduler_run(self, job: str, last_run: str, duration: Optional[float] = None,
+                                 sent: int = 0, failed: int = 0):
+        """Сохранить сведения о запуске фоновой задачи"""
+        async with self._write() as db:
+            await db.execute("""
+                INSERT OR REPLACE INTO scheduler_runs (job, last_run, duration, sent, failed)
+                VALUES (?, ?, ?, ?, ?)
+            """, (job, last_run, duration, sent, failed))
+            await db.commit()
+
+    async def add_audit_entries(self, entries: Iterable[Tuple[int, int, str, Optional[int], Optional[str]]]):
+        """Дописать пакет записей журнала одной транзакцией"""
+        async with self.transaction() as db:
+            await db.executemany(
+                "INSERT INTO audit_log (created_at, actor_id, action, target_id, details) VALUES (?, ?, ?, ?, ?)",
+                entries
+            )
+
+    @staticmethod
+    def _audit_conditions(actor_id: Optional[int], target_id: Optional[int],
+                          start: Optional[int], end: Optional[int]) -> Tuple[List[str], List[Any]]:
+        conditions, params = [], []
+        for condition, value in (("actor_id = ?", actor_id), ("target_id = ?", target_id),
+                                 ("created_at >= ?", start), ("created_at < ?", end)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        return conditions, params
+
+    async def get_audit_log(self, actor_id: Optional[int] = None, target_id: Optional[int] = None,
+                            start: Optional[int] = None, end: Optional[int] = None,
+                            before_id: Optional[int] = None, limit: int = 20) -> List[AuditEntry]:
+        """Записи журнала, новые первыми; страницы от ключа (created_at, audit_id)"""
+        conditions, params = self._audit_conditions(actor_id, target_id, start, end)
+        async with self._read() as db:
+            if before_id is not None:
+                async with db.execute(
+                    "SELECT created_at, audit_id FROM audit_log WHERE audit_id = ?", (before_id,)
+                ) as cursor:
+                    row = await cursor.fetchone()
+                if row is None:
+                    return []
+                conditions.append("(created_at, audit_id) < (?, ?)")
+                params.extend(row)
+            where = " WHERE " + " AND ".join(conditions) if conditions else ""
+            async with db.execute(
+                f"SELECT {AUDIT_COLUMNS} FROM audit_log{where} ORDER BY created_at DESC, audit_id DESC LIMIT ?",
+                (*params, limit)
+            ) as cursor:
+                cursor.row_factory = row_factory(AuditEntry)
+                return await cursor.fetchall()
+
+    def iter_audit_log(self, start: Optional[int] = None, end: Optional[int] = None) -> AsyncIterator[AuditEntry]:
+        """Записи журнала за период по одной, старые первыми"""
+        conditions, params = self._audit_conditions(None, None, start, end)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return self._iterate(
+            AuditEntry, f"SELECT {AUDIT_COLUMNS} FROM audit_log{where} ORDER BY created_at, audit_id", tuple(params)
+        )
+
+    async def _fetch_group_grade_stats(self, group_id: int, failing_below: float, utc_offset: int) -> GroupGradeStats:
+        """Сводка отметок группы; все запросы в одной читающей транзакции"""
+        students = "FROM users u JOIN grades g ON g.student_id = u.user_id WHERE u.group_id = ? AND u.role = 'student'"
+        async with self._read() as db:
+            await db.execute("BEGIN")
+            try:
+                async with db.execute(f"""
+                    SELECT g.subject, COUNT(*) AS count, AVG(g.grade) AS mean,
+                           SUM(g.grade = 2) AS c2, SUM(g.grade = 3) AS c3,
+                           SUM(g.grade = 4) AS c4, SUM(g.grade = 5) AS c5
+                    {students}
+                    GROUP BY g.subject
+                    ORDER BY g.subject
+                """, (group_id,)) as cursor:
+                    subjects = await cursor.fetchall()
+                async with db.execute(f"""
+                    SELECT u.user_id, u.full_name, g.subject, AVG(g.grade) AS mean, COUNT(*) AS count
+                    {students}
+                    GROUP BY u.user_id, g.subject
+                    HAVING AVG(g.grade) < ?
+                    ORDER BY mean, u.full_name
+                """, (group_id, failing_below)) as cursor:
+                    failing = await cursor.fetchall()
+                async with db.execute(f"""
+                    SELECT strftime('%Y-%m', g.date + ?, 'unixepoch') AS month, COUNT(*) AS count,
+                           AVG(g.grade) AS mean
+                    {students}
+                    GROUP BY month
+                    ORDER BY month
+                """, (utc_offset, group_id)) as cursor:
+                    trend = await cursor.fetchall()
+                async with db.execute(
+                    "SELECT user_id FROM users WHERE group_id = ? AND role = 'student'", (group_id,)
+                ) as cursor:
+                    student_ids = [row[0] for row in await cursor.fetchall()]
+            finally:
+                await db.rollback()
+        return GroupGradeStats.from_rows(group_id, subjects, failing, trend, student_ids)
+
+    async def _fetch_snapshot_groups(self) -> List[Group]:
+        return await self._fetch_all(
+            Group, f"SELECT {GROUP_COLUMNS} FROM groups WHERE archived_at IS NULL ORDER BY group_id"
+        )
+
+    async def _fetch_snapshot_teachers(self) -> List[User]:
+        return await self._fetch_all(
+            User, f"SELECT {USER_COLUMNS} FROM users WHERE role = 'teacher' ORDER BY full_name"
+        )
+
+    async def _fetch_snapshot_schedule(self, group_id: Optional[int] = None) -> List[ScheduleEntry]:
+        query = SCHEDULE_SELECT
+        params = ()
+        if group_id is not None:
+            query += " WHERE s.group_id = ?"
+            params = (group_id,)
+        else:
+            query += " WHERE s.group_id IN (SELECT group_id FROM groups WHERE archived_at IS NULL)"
+        query += " ORDER BY s.group_id, s.day_of_week, s.lesson_number"
+        return await self._fetch_all(ScheduleEntry, query, params)
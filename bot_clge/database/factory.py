@@ -0,0 +1,18 @@
+from typing import Any
+from .base import Database
+from .db import SQLiteDatabase
+
+
+def create_database(url: str, **kwargs: Any) -> Database:
+    """Создать хранилище по адресу.
+
+    postgresql://... — PostgreSQL (нужен пакет asyncpg), иначе путь к
+    файлу SQLite (допускается префикс sqlite:///).
+    """
+    if url.startswith(("postgres://", "postgresql://")):
+        # asyncpg нужен только для PostgreSQL
+        from .postgres import PostgresDatabase
+        return PostgresDatabase(url, **kwargs)
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///"):]
+    return SQLiteDatabase(url, **kwargs)
@@ -0,0 +1,148 @@
+"""Массовые операции над группами: перевод на следующий курс, переименование,
+слияние, разделение, архивирование и удаление вместе с расписанием.
+
+Операция описывается планом GroupPlan и выполняется Database.apply_group_plan
+одной транзакцией: каждый шаг — один запрос над множеством строк
+(UPDATE users ... WHERE group_id IN ...), а не запрос на каждого студента.
+Пробный прогон (dry_run) выполняет те же запросы и откатывает транзакцию,
+поэтому отчёт показывает точное число строк, которые будут затронуты.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Mapping, Tuple
+from .models import Group
+
+# Курс — первая цифра в названии группы: «ИС-21» — второй курс, первая группа
+COURSE_RE = re.compile(r"\d")
+
+
+@dataclass(frozen=True)
+class GroupSplit:
+    """Выделить студентов user_ids из группы group_id в новую группу (расписание у неё пока пустое)"""
+    group_id: int
+    new_name: str
+    user_ids: Tuple[int, ...]
+
+
+@dataclass(frozen=True)
+class GroupPlan:
+    """Что сделать с группами; шаги выполняются в порядке полей.
+
+    merges переносит всех пользователей группы-источника в группу-приёмник,
+    после чего источник удаляется вместе с расписанием. archive скрывает
+    группу из списков, открепляет её студентов, снимает расписание (чтобы
+    учителя освободили эти уроки) и дописывает к названию год архивации.
+    delete открепляет пользователей и удаляет группу вместе с расписанием.
+    Переименование и новые группы идут последними, когда прежние названия
+    уже освобождены.
+    """
+    merges: Mapping[int, int] = field(default_factory=dict)
+    archive: Tuple[int, ...] = ()
+    delete: Tuple[int, ...] = ()
+    renames: Mapping[int, str] = field(default_factory=dict)
+    splits: Tuple[GroupSplit, ...] = ()
+
+    def __bool__(self) -> bool:
+        return bool(self.splits or self.merges or self.renames or self.archive or self.delete)
+
+    def check(self, groups: Mapping[int, Group]):
+        """Проверить план по текущим группам; ValueError с понятным администратору текстом"""
+        touched: Dict[int, str] = {}
+
+        def claim(group_id: int, step: str):
+            if group_id not in groups:
+                raise ValueError(f"Группа с ID {group_id} не найдена")
+            if group_id in touched and touched[group_id] != step:
+                raise ValueError(f"Группа {groups[group_id].group_name} участвует в двух операциях сразу")
+            touched[group_id] = step
+
+        for source, target in self.merges.items():
+            claim(source, "merge")
+            if target not in groups:
+                raise ValueError(f"Группа с ID {target} не найдена")
+            if target == source or target in self.merges or target in self.archive or target in self.delete:
+                raise ValueError(f"Группа {groups[target].group_name} не может принять студентов")
+        for group_id in self.renames:
+            claim(group_id, "rename")
+        for group_id in self.archive:
+            claim(group_id, "archive")
+        for group_id in self.delete:
+            claim(group_id, "delete")
+        for split in self.splits:
+            claim(split.group_id, "split")
+            if not split.user_ids:
+                raise ValueError("Не указаны студенты для новой группы")
+
+        # Названия действующих групп после выполнения плана должны остаться уникальными
+        gone = set(self.merges) | set(self.archive) | set(self.delete)
+        names = [
+            self.renames.get(group_id, group.group_name)
+            for group_id, group in groups.items() if group_id not in gone
+        ]
+        names.extend(split.new_name for split in self.splits)
+        seen = set()
+        for name in names:
+            if not name.strip():
+                raise ValueError("Название группы не может быть пустым")
+            if name in seen:
+                raise ValueError(f"Группа '{name}' уже существует")
+            seen.add(name)
+
+
+@dataclass
+class GroupReport:
+    """Сколько строк затронул план (или затронет — при пробном прогоне)"""
+    dry_run: bool
+    groups_created: int = 0
+    groups_renamed: int = 0
+    groups_archived: int = 0
+    groups_deleted: int = 0
+    users_moved: int = 0
+    users_detached: int = 0
+    schedule_deleted: int = 0
+    # Уроки исходных групп, которые новым группам разделения нужно назначить заново:
+    # учитель не может вести урок у двух групп одновременно, поэтому расписание не копируется
+    schedule_to_assign: int = 0
+    # (старое название, новое) для переименованных групп
+    renamed: Tuple[Tuple[str, str], ...] = ()
+    elapsed_ms: float = 0.0
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            name: value for name, value in vars(self).items()
+            if isinstance(value, int) and not isinstance(value, bool)
+        }
+
+
+def promotion_plan(groups: Iterable[Group], last_course: int = 4) -> GroupPlan:
+    """Перевод на следующий курс: у каждой группы растёт первая цифра названия.
+
+    Группы последнего курса архивируются (выпуск), группы без цифры в
+    названии не меняются.
+    """
+    renames: Dict[int, str] = {}
+    archive: List[int] = []
+    for group in groups:
+        match = COURSE_RE.search(group.group_name)
+        if match is None:
+            continue
+        course = int(match.group())
+        if course >= last_course:
+            archive.append(group.group_id)
+        else:
+            name = group.group_name
+            renames[group.group_id] = name[:match.start()] + str(course + 1) + name[match.end():]
+    return GroupPlan(renames=renames, archive=tuple(archive))
+
+
+def parse_ids(text: str) -> Tuple[int, ...]:
+    """ID через запятую: "3,5, 8" → (3, 5, 8)"""
+    parts = [part.strip() for part in text.split(",") if part.strip()]
+    if not parts or not all(part.isdigit() for part in parts):
+        raise ValueError(f"Ожидались ID через запятую, получено: {text}")
+    return tuple(dict.fromkeys(int(part) for part in parts))
+
+
+def archive_suffix(year: int) -> str:
+    """Дописывается к названию архивной группы, освобождая его для новой"""
+    return f" (архив {year})"
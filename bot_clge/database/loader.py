@@ -0,0 +1,63 @@
+import asyncio
+from typing import Optional, Dict, Iterable, List
+from .base import Database
+from .models import User
+
+
+class UserLoader:
+    """Пакетная загрузка пользователей в рамках одного апдейта.
+
+    Все вызовы load(), сделанные до ближайшего переключения event loop,
+    собираются и выполняются одним запросом get_users_by_ids. Результаты
+    запоминаются до конца обработки апдейта.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._cache: Dict[int, Optional[User]] = {}
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._batch: Optional[asyncio.Task] = None
+
+    async def load(self, user_id: int) -> Optional[User]:
+        """Получить пользователя (с объединением запросов)"""
+        if user_id in self._cache:
+            return self._cache[user_id]
+
+        future = self._pending.get(user_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[user_id] = future
+            if self._batch is None:
+                self._batch = asyncio.create_task(self._dispatch())
+        return await future
+
+    async def load_many(self, user_ids: Iterable[int]) -> List[Optional[User]]:
+        """Получить несколько пользователей за один запрос"""
+        return list(await asyncio.gather(*(self.load(user_id) for user_id in user_ids)))
+
+    def clear(self, user_id: Optional[int] = None):
+        """Сбросить закэшированные данные (после изменения пользователя)"""
+        if user_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(user_id, None)
+
+    async def _dispatch(self):
+        # Даём остальным корутинам апдейта добавить свои ID в пакет
+        await asyncio.sleep(0)
+        pending, self._pending = self._pending, {}
+        self._batch = None
+
+        try:
+            users = await self.db.get_users_by_ids(pending.keys())
+        except Exception as e:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for user_id, future in pending.items():
+            user = users.get(user_id)
+            self._cache[user_id] = user
+            if not future.done():
+                future.set_result(user)
@@ -0,0 +1,115 @@
+"""Строки таблиц в виде именованных кортежей.
+
+Кортеж собирается прямо из значений строки (row_factory для sqlite3,
+make() для записей asyncpg), без промежуточного словаря, поэтому
+занимает заметно меньше памяти и неизменяем: такие строки можно класть
+в снимок и кэши без копирования. Порядок полей совпадает с порядком
+столбцов в SELECT.
+"""
+from typing import Callable, NamedTuple, Optional, Type, TypeVar
+
+Model = TypeVar("Model", bound=tuple)
+
+
+class User(NamedTuple):
+    user_id: int
+    username: Optional[str]
+    full_name: Optional[str]
+    role: str
+    group_id: Optional[int]
+
+
+class Group(NamedTuple):
+    group_id: int
+    group_name: str
+
+
+class ScheduleEntry(NamedTuple):
+    schedule_id: int
+    group_id: int
+    day_of_week: int
+    lesson_number: int
+    subject: str
+    teacher_id: int
+    teacher_name: Optional[str] = None
+
+
+class Grade(NamedTuple):
+    grade_id: int
+    student_id: int
+    teacher_id: int
+    subject: str
+    grade: int
+    # Секунды Unix (UTC)
+    date: int
+    teacher_name: Optional[str] = None
+
+
+class Message(NamedTuple):
+    message_id: int
+    from_user_id: int
+    to_user_id: int
+    message_text: str
+    # Секунды Unix (UTC)
+    timestamp: int
+
+
+class Thread(NamedTuple):
+    """Диалог пользователя с собеседником"""
+    counterpart_id: int
+    unread: int
+    last_timestamp: int
+    counterpart_name: Optional[str]
+    counterpart_username: Optional[str]
+    last_text: Optional[str]
+    last_from_user_id: Optional[int]
+
+
+class AuditEntry(NamedTuple):
+    """Запись журнала действий: кто, что, над кем и когда"""
+    audit_id: int
+    # Секунды Unix (UTC)
+    created_at: int
+    actor_id: int
+    action: str
+    target_id: Optional[int]
+    # Подробности в JSON
+    details: Optional[str]
+
+
+# Столбцы в порядке полей моделей
+USER_COLUMNS = "user_id, username, full_name, role, group_id"
+GROUP_COLUMNS = "group_id, group_name"
+MESSAGE_COLUMNS = "message_id, from_user_id, to_user_id, message_text, timestamp"
+AUDIT_COLUMNS = "audit_id, created_at, actor_id, action, target_id, details"
+
+# Строки расписания и отметок с именем учителя; условие WHERE добавляет движок
+SCHEDULE_SELECT = """
+    SELECT s.schedule_id, s.group_id, s.day_of_week, s.lesson_number, s.subject, s.teacher_id,
+           u.full_name AS teacher_name
+    FROM schedule s
+    LEFT JOIN users u ON s.teacher_id = u.user_id
+"""
+GRADE_SELECT = """
+    SELECT g.grade_id, g.student_id, g.teacher_id, g.subject, g.grade, g.date,
+           u.full_name AS teacher_name
+    FROM grades g
+    LEFT JOIN users u ON g.teacher_id = u.user_id
+"""
+
+
+def columns(names: str, alias: str) -> str:
+    """Список столбцов с префиксом таблицы: columns(USER_COLUMNS, "u") → "u.user_id, u.username, ..." """
+    return ", ".join(f"{alias}.{name.strip()}" for name in names.split(","))
+
+
+def maker(model: Type[Model]) -> Callable[[tuple], Model]:
+    """Собрать модель из последовательности значений без проверки длины"""
+    new = tuple.__new__
+    return lambda row: new(model, row)
+
+
+def row_factory(model: Type[Model]) -> Callable:
+    """row_factory для курсора sqlite3: строка сразу становится моделью"""
+    new = tuple.__new__
+    return lambda cursor, row: new(model, row)
@@ -0,0 +1,82 @@
+"""Время отметок и сообщений: целые секунды Unix (UTC) и периоды.
+
+В базе дата отметки и время сообщения хранятся числом секунд, поэтому
+сортировка и выборка за период — сравнение целых чисел по индексу.
+В местное время сервера значения переводятся только при показе, а
+границы периодов (неделя, месяц, семестр) считаются от местной полуночи.
+"""
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+
+def now() -> int:
+    """Текущее время в секундах Unix"""
+    return int(time.time())
+
+
+def day_start(day: date) -> int:
+    """Местная полночь дня в секундах Unix"""
+    return int(datetime(day.year, day.month, day.day).timestamp())
+
+
+def to_datetime(timestamp: int) -> datetime:
+    """Секунды Unix в местное время сервера"""
+    return datetime.fromtimestamp(timestamp)
+
+
+def utc_offset(timestamp: Optional[int] = None) -> int:
+    """Смещение местного времени от UTC в секундах (на момент timestamp)"""
+    moment = datetime.fromtimestamp(now() if timestamp is None else timestamp).astimezone()
+    return int(moment.utcoffset().total_seconds())
+
+
+@dataclass(frozen=True)
+class Term:
+    """Учебный семестр [start, end)"""
+    name: str
+    start: date
+    end: date
+
+
+def parse_term_starts(spec: str) -> List[Tuple[int, int]]:
+    """Разобрать даты начала семестров "09-01,02-01" -> [(2, 1), (9, 1)]"""
+    starts = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        month, day = (int(x) for x in part.split("-"))
+        starts.append((month, day))
+    if not starts:
+        raise ValueError("Не заданы даты начала семестров")
+    return sorted(starts)
+
+
+def term_for(day: date, starts: Sequence[Tuple[int, int]]) -> Term:
+    """Семестр, в который попадает дата"""
+    boundaries = sorted(
+        date(year, month, dom)
+        for year in (day.year - 1, day.year, day.year + 1)
+        for month, dom in starts
+    )
+    for start, end in zip(boundaries, boundaries[1:]):
+        if start <= day < end:
+            return Term(start.strftime("%Y-%m"), start, end)
+    raise ValueError(f"Не удалось определить семестр для {day}")
+
+
+def week_range(today: date) -> Tuple[int, int]:
+    """Неделя с понедельника [start, end) в секундах Unix"""
+    start = today - timedelta(days=today.weekday())
+    return day_start(start), day_start(start + timedelta(days=7))
+
+
+def month_range(today: date) -> Tuple[int, int]:
+    """Календарный месяц [start, end) в секундах Unix"""
+    start = today.replace(day=1)
+    return day_start(start), day_start((start + timedelta(days=32)).replace(day=1))
+
+
+def term_range(today: date, starts: Sequence[Tuple[int, int]]) -> Tuple[int, int]:
+    """Текущий семестр [start, end) в секундах Unix"""
+    term = term_for(today, starts)
+    return day_start(term.start), day_start(term.end)
@@ -0,0 +1,751 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Any, Iterable, AsyncIterator, Tuple, Type
+import asyncpg
+from .analytics import GroupGradeStats
+from .base import Database
+from .groups import GroupPlan, GroupReport
+from .schedule import SCHEDULE_REMOVED_TABLE, SLOT_CLEANUP, ScheduleConflict, slot_conflicts
+from .models import (
+    User, Group, ScheduleEntry, Grade, Message, Thread, AuditEntry, Model,
+    USER_COLUMNS, GROUP_COLUMNS, MESSAGE_COLUMNS, AUDIT_COLUMNS, SCHEDULE_SELECT, GRADE_SELECT, columns, maker
+)
+from .periods import now, utc_offset
+from .singleflight import single_flight
+
+logger = logging.getLogger(__name__)
+
+# Блокировка на время создания схемы, чтобы несколько экземпляров бота не мешали друг другу
+SCHEMA_LOCK_ID = 0x636c6765
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS groups (
+        group_id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        group_name TEXT NOT NULL UNIQUE,
+        archived_at BIGINT
+    )
+    """,
+    # Время архивации группы (NULL у действующих групп); в старых базах столбца нет
+    "ALTER TABLE groups ADD COLUMN IF NOT EXISTS archived_at BIGINT",
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT PRIMARY KEY,
+        username TEXT,
+        full_name TEXT,
+        role TEXT NOT NULL DEFAULT 'student',
+        group_id INTEGER REFERENCES groups (group_id) ON DELETE SET NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS schedule (
+        schedule_id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        group_id INTEGER NOT NULL REFERENCES groups (group_id) ON DELETE CASCADE,
+        day_of_week INTEGER NOT NULL,
+        lesson_number INTEGER NOT NULL,
+        subject TEXT NOT NULL,
+        teacher_id BIGINT NOT NULL REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS grades (
+        grade_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        student_id BIGINT NOT NULL REFERENCES users (user_id),
+        teacher_id BIGINT NOT NULL REFERENCES users (user_id),
+        subject TEXT NOT NULL,
+        grade INTEGER NOT NULL,
+        date BIGINT NOT NULL
+    )
+    """,
+    # Состав и расписание группы: массовые операции над группами идут по этим индексам
+    "CREATE INDEX IF NOT EXISTS idx_users_group ON users (group_id)",
+    # Отметки студента по предметам: покрывающий индекс для сводок по группе
+    "CREATE INDEX IF NOT EXISTS idx_grades_student ON grades (student_id, subject, grade, date)",
+    # Отметки за период: студента и по предмету
+    "CREATE INDEX IF NOT EXISTS idx_grades_student_date ON grades (student_id, date)",
+    "CREATE INDEX IF NOT EXISTS idx_grades_subject_date ON grades (subject, date)",
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        message_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        from_user_id BIGINT NOT NULL REFERENCES users (user_id),
+        to_user_id BIGINT NOT NULL REFERENCES users (user_id),
+        message_text TEXT NOT NULL,
+        timestamp BIGINT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_messages_to_time ON messages (to_user_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_pair_time ON messages (from_user_id, to_user_id, timestamp)",
+    """
+    CREATE TABLE IF NOT EXISTS message_threads (
+        user_id BIGINT NOT NULL,
+        counterpart_id BIGINT NOT NULL,
+        unread INTEGER NOT NULL DEFAULT 0,
+        last_message_id BIGINT,
+        last_timestamp BIGINT NOT NULL,
+        PRIMARY KEY (user_id, counterpart_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_threads_user_time ON message_threads (user_id, last_timestamp)",
+    """
+    INSERT INTO message_threads (user_id, counterpart_id, unread, last_message_id, last_timestamp)
+    SELECT owner, other, 0, MAX(message_id), MAX(timestamp)
+    FROM (
+        SELECT from_user_id AS owner, to_user_id AS other, message_id, timestamp FROM messages
+        UNION ALL
+        SELECT to_user_id, from_user_id, message_id, timestamp FROM messages
+    ) AS pairs
+    WHERE NOT EXISTS (SELECT 1 FROM message_threads)
+    GROUP BY owner, other
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reminder_subscriptions (
+        user_id BIGINT PRIMARY KEY REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS scheduler_runs (
+        job TEXT PRIMARY KEY,
+        last_run TEXT NOT NULL,
+        duration DOUBLE PRECISION,
+        sent INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    # Журнал действий администраторов: строки только добавляются
+    """
+    CREATE TABLE IF NOT EXISTS audit_log (
+        audit_id BIGSERIAL PRIMARY KEY,
+        created_at BIGINT NOT NULL,
+        actor_id BIGINT NOT NULL,
+        action TEXT NOT NULL,
+        target_id BIGINT,
+        details TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_audit_actor ON audit_log (actor_id, created_at, audit_id)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_target ON audit_log (target_id, created_at, audit_id)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_time ON audit_log (created_at, audit_id)",
+    """
+    CREATE OR REPLACE FUNCTION audit_log_append_only() RETURNS trigger AS $$
+    BEGIN
+        RAISE EXCEPTION 'audit_log: разрешено только добавление';
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS audit_log_append_only ON audit_log",
+    """
+    CREATE TRIGGER audit_log_append_only
+    BEFORE UPDATE OR DELETE OR TRUNCATE ON audit_log
+    FOR EACH STATEMENT EXECUTE FUNCTION audit_log_append_only()
+    """,
+]
+
+
+class PostgresDatabase(Database):
+    """Хранилище в PostgreSQL через пул соединений asyncpg.
+
+    В отличие от SQLite записи идут параллельно по соединениям пула.
+    asyncpg подготавливает каждый запрос на соединении один раз и
+    держит его в кэше (statement_cache_size), поэтому повторные вызовы
+    методов не разбирают SQL заново. За PgBouncer в режиме transaction
+    кэш нужно отключить: statement_cache_size=0.
+    """
+
+    # Сколько строк серверный курсор забирает за раз при итерации
+    ITER_BATCH = 256
+    # Столбцы времени (секунды Unix), которые в старых базах хранились строками местного времени
+    EPOCH_COLUMNS = {
+        'grades': 'date',
+        'messages': 'timestamp',
+        'message_threads': 'last_timestamp',
+    }
+
+    def __init__(self, dsn: str, single_flight_methods: Optional[Iterable[str]] = None,
+                 min_size: int = 2, max_size: int = 10, **pool_kwargs: Any):
+        super().__init__(single_flight_methods)
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool_kwargs = pool_kwargs
+        self._pool: Optional[asyncpg.Pool] = None
+
+    async def init_db(self):
+        """Инициализация базы данных, создание таблиц и открытие пула"""
+        if self._pool is None:
+            self._pool = await asyncpg.create_pool(
+                self.dsn, min_size=self.min_size, max_size=self.max_size, **self.pool_kwargs
+            )
+        async with self.transaction() as conn:
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", SCHEMA_LOCK_ID)
+            await self._convert_text_timestamps(conn)
+            for statement in SCHEMA:
+                await conn.execute(statement)
+            await self._unique_schedule_slots(conn)
+
+    async def open_readonly(self):
+        """Открыть пул, в котором транзакции по умолчанию только читают; схема не трогается"""
+        if self._pool is None:
+            kwargs = dict(self.pool_kwargs)
+            kwargs['server_settings'] = {**kwargs.get('server_settings', {}), 'default_transaction_read_only': 'on'}
+            self._pool = await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size, **kwargs)
+
+    async def _unique_schedule_slots(self, conn: asyncpg.Connection):
+        """Уникальные слоты группы и учителя; мешающие им уроки старых баз один раз переносятся в schedule_removed"""
+        if await conn.fetchval("SELECT to_regclass('idx_schedule_teacher_slot')") is None:
+            await conn.execute(SCHEDULE_REMOVED_TABLE)
+            removed_at = now()
+            for reason, condition in SLOT_CLEANUP:
+                await conn.execute(f"""
+                    INSERT INTO schedule_removed
+                    SELECT schedule_id, group_id, day_of_week, lesson_number, subject, teacher_id, $1, $2
+                    FROM schedule WHERE {condition}
+                """, reason, removed_at)
+                removed = self._affected(await conn.execute(f"DELETE FROM schedule WHERE {condition}"))
+                if removed:
+                    logger.warning("Уроки расписания перенесены в schedule_removed (%s): %d", reason, removed)
+            await conn.execute("DROP INDEX IF EXISTS idx_schedule_group")
+        await conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_schedule_slot ON schedule (group_id, day_of_week, lesson_number)"
+        )
+        await conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_schedule_teacher_slot ON schedule (teacher_id, day_of_week, lesson_number)"
+        )
+
+    async def _convert_text_timestamps(self, conn: asyncpg.Connection):
+        """Перевести столбцы времени старых таблиц из строк местного времени в секунды Unix"""
+        rows = await conn.fetch("""
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND data_type = 'text'
+              AND (table_name, column_name) IN (SELECT * FROM unnest($1::text[], $2::text[]))
+        """, list(self.EPOCH_COLUMNS), list(self.EPOCH_COLUMNS.values()))
+        # Строки писались в местном времени бота; EXTRACT(EPOCH) от timestamp считает его UTC
+        offset = utc_offset()
+        for row in rows:
+            table, column = row['table_name'], row['column_name']
+            await conn.execute(
+                f"ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT "
+                f"USING EXTRACT(EPOCH FROM {column}::timestamp)::bigint - {offset}"
+            )
+
+    async def close(self):
+        """Закрыть пул соединений"""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            try:
+                await asyncio.wait_for(pool.close(), self.CLOSE_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("Соединения пула заняты при закрытии, закрываются принудительно")
+                pool.terminate()
+
+    @property
+    def pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            raise RuntimeError("Database не инициализирована: вызовите init_db()")
+        return self._pool
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[asyncpg.Connection]:
+        """Транзакция на соединении из пула; фиксируется при выходе"""
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    yield conn
+        finally:
+            self._data_changed()
+
+    async def _execute(self, query: str, *args: Any) -> str:
+        """Запрос на запись в собственной транзакции"""
+        try:
+            return await self.pool.execute(query, *args)
+        finally:
+            self._data_changed()
+
+    async def _fetch_all(self, model: Type[Model], query: str, *args: Any) -> List[Model]:
+        """Все строки запроса, собранные в model"""
+        make = maker(model)
+        return [make(row) for row in await self.pool.fetch(query, *args)]
+
+    async def _fetch_one(self, model: Type[Model], query: str, *args: Any) -> Optional[Model]:
+        row = await self.pool.fetchrow(query, *args)
+        return maker(model)(row) if row is not None else None
+
+    async def _iterate(self, model: Type[Model], query: str, *args: Any) -> AsyncIterator[Model]:
+        """Строки запроса по одной серверным курсором; соединение занято до конца итерации"""
+        make = maker(model)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                async for row in conn.cursor(query, *args, prefetch=self.ITER_BATCH):
+                    yield make(row)
+
+    async def add_user(self, user_id: int, username: str, full_name: str, role: str = "student", group_id: Optional[int] = None):
+        """Добавить пользователя"""
+        await self._execute("""
+            INSERT INTO users (user_id, username, full_name, role, group_id)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (user_id) DO UPDATE SET
+                username = EXCLUDED.username,
+                full_name = EXCLUDED.full_name,
+                role = EXCLUDED.role,
+                group_id = EXCLUDED.group_id
+        """, user_id, username, full_name, role, group_id)
+        await self._user_saved(user_id)
+
+    @single_flight
+    async def get_user(self, user_id: int) -> Optional[User]:
+        """Получить информацию о пользователе"""
+        return await self._fetch_one(User, f"SELECT {USER_COLUMNS} FROM users WHERE user_id = $1", user_id)
+
+    async def get_users_by_ids(self, user_ids: Iterable[int]) -> Dict[int, User]:
+        """Получить пользователей по списку ID одним запросом"""
+        ids = list(dict.fromkeys(user_ids))
+        if not ids:
+            return {}
+        users = await self._fetch_all(User, f"SELECT {USER_COLUMNS} FROM users WHERE user_id = ANY($1::bigint[])", ids)
+        return {user.user_id: user for user in users}
+
+    async def update_user_role(self, user_id: int, role: str):
+        """Изменить роль пользователя"""
+        await self._execute("UPDATE users SET role = $1 WHERE user_id = $2", role, user_id)
+        self.grade_stats.clear()
+        await self._refresh_snapshot(teachers=True)
+
+    async def update_user_group(self, user_id: int, group_id: Optional[int]):
+        """Изменить группу пользователя"""
+        await self._execute("UPDATE users SET group_id = $1 WHERE user_id = $2", group_id, user_id)
+        self.grade_stats.clear()
+
+    async def create_group(self, group_name: str) -> int:
+        """Создать группу"""
+        group_id = await self.pool.fetchval(
+            "INSERT INTO groups (group_name) VALUES ($1) RETURNING group_id", group_name
+        )
+        self._data_changed()
+        await self._refresh_snapshot(groups=True)
+        return group_id
+
+    @single_flight
+    async def get_all_groups(self) -> List[Group]:
+        """Получить все действующие группы"""
+        return await self._fetch_all(Group, f"SELECT {GROUP_COLUMNS} FROM groups WHERE archived_at IS NULL")
+
+    @single_flight
+    async def get_group_by_name(self, group_name: str) -> Optional[Group]:
+        """Получить группу по имени"""
+        return await self._fetch_one(Group, f"SELECT {GROUP_COLUMNS} FROM groups WHERE group_name = $1", group_name)
+
+    @single_flight
+    async def get_group_by_id(self, group_id: int) -> Optional[Group]:
+        """Получить группу по ID"""
+        return await self._fetch_one(Group, f"SELECT {GROUP_COLUMNS} FROM groups WHERE group_id = $1", group_id)
+
+    @single_flight
+    async def get_users_by_role(self, role: str) -> List[User]:
+        """Получить всех пользователей с определенной ролью"""
+        return await self._fetch_all(User, f"SELECT {USER_COLUMNS} FROM users WHERE role = $1", role)
+
+    def iter_users_by_role(self, role: str) -> AsyncIterator[User]:
+        """Пользователи с определенной ролью по одному"""
+        return self._iterate(User, f"SELECT {USER_COLUMNS} FROM users WHERE role = $1", role)
+
+    @single_flight
+    async def get_users_by_group(self, group_id: int) -> List[User]:
+        """Получить всех пользователей в группе"""
+        return await self._fetch_all(User, f"SELECT {USER_COLUMNS} FROM users WHERE group_id = $1", group_id)
+
+    def iter_users_by_group(self, group_id: int) -> AsyncIterator[User]:
+        """Пользователи группы по одному"""
+        return self._iterate(User, f"SELECT {USER_COLUMNS} FROM users WHERE group_id = $1", group_id)
+
+    async def _save_schedule(self, entries: List[ScheduleEntry], replace: bool) -> List[ScheduleConflict]:
+        """Пробы уникальных индексов слотов и запись в одной транзакции"""
+        try:
+            return await self._save_schedule_once(entries, replace)
+        except asyncpg.UniqueViolationError:
+            # Слот заняли параллельно между пробой и записью: повторная проба покажет накладку
+            return await self._save_schedule_once(entries, replace)
+
+    async def _save_schedule_once(self, entries: List[ScheduleEntry], replace: bool) -> List[ScheduleConflict]:
+        make = maker(ScheduleEntry)
+        conflicts = []
+        async with self.transaction() as conn:
+            for entry in entries:
+                slot = (entry.day_of_week, entry.lesson_number)
+                in_group = await conn.fetch(SCHEDULE_SELECT + """
+                    WHERE s.group_id = $1 AND s.day_of_week = $2 AND s.lesson_number = $3
+                """, entry.group_id, *slot)
+                for_teacher = await conn.fetch(SCHEDULE_SELECT + """
+                    WHERE s.teacher_id = $1 AND s.day_of_week = $2 AND s.lesson_number = $3 AND s.group_id <> $4
+                """, entry.teacher_id, *slot, entry.group_id)
+                conflicts.extend(slot_conflicts(
+                    entry, [make(row) for row in in_group], [make(row) for row in for_teacher], replace
+                ))
+            if conflicts:
+                return conflicts
+            await conn.executemany("""
+                INSERT INTO schedule (group_id, day_of_week, lesson_number, subject, teacher_id)
+                VALUES ($1, $2, $3, $4, $5)
+                ON CONFLICT (group_id, day_of_week, lesson_number)
+                DO UPDATE SET subject = EXCLUDED.subject, teacher_id = EXCLUDED.teacher_id
+            """, [
+                (entry.group_id, entry.day_of_week, entry.lesson_number, entry.subject, entry.teacher_id)
+                for entry in entries
+            ])
+        return conflicts
+
+    @single_flight
+    async def get_schedule_by_group(self, group_id: int) -> List[ScheduleEntry]:
+        """Получить расписание для группы"""
+        return await self._fetch_all(ScheduleEntry, SCHEDULE_SELECT + """
+            WHERE s.group_id = $1
+            ORDER BY s.day_of_week, s.lesson_number
+        """, group_id)
+
+    async def add_grade(self, student_id: int, teacher_id: int, subject: str, grade: int, date: int):
+        """Добавить отметку"""
+        await self._execute("""
+            INSERT INTO grades (student_id, teacher_id, subject, grade, date)
+            VALUES ($1, $2, $3, $4, $5)
+        """, student_id, teacher_id, subject, grade, date)
+        self.grade_stats.invalidate_student(student_id)
+
+    @single_flight
+    async def get_grades_by_student(self, student_id: int) -> List[Grade]:
+        """Получить все отметки студента"""
+        return await self._fetch_all(Grade, GRADE_SELECT + " WHERE g.student_id = $1 ORDER BY g.date DESC", student_id)
+
+    def iter_grades_by_student(self, student_id: int) -> AsyncIterator[Grade]:
+        """Отметки студента по одной, новые первыми"""
+        return self._iterate(Grade, GRADE_SELECT + " WHERE g.student_id = $1 ORDER BY g.date DESC", student_id)
+
+    async def get_grades_between(self, student_id: int, start: int, end: int) -> List[Grade]:
+        """Отметки студента за период по индексу (student_id, date)"""
+        return await self._fetch_all(
+            Grade, GRADE_SELECT + " WHERE g.student_id = $1 AND g.date >= $2 AND g.date < $3 ORDER BY g.date DESC",
+            student_id, start, end
+        )
+
+    async def get_subject_grades_between(self, subject: str, start: int, end: int) -> List[Grade]:
+        """Отметки по предмету за период по индексу (subject, date)"""
+        return await self._fetch_all(
+            Grade, GRADE_SELECT + " WHERE g.subject = $1 AND g.date >= $2 AND g.date < $3 ORDER BY g.date DESC",
+            subject, start, end
+        )
+
+    async def iter_group_grades(self, group_id: int) -> AsyncIterator[Tuple]:
+        """Отметки студентов группы построчно, серверным курсором"""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                async for row in conn.cursor("""
+                    SELECT u.full_name, g.subject, g.grade, g.date, t.full_name
+                    FROM users u
+                    JOIN grades g ON g.student_id = u.user_id
+                    LEFT JOIN users t ON g.teacher_id = t.user_id
+                    WHERE u.group_id = $1 AND u.role = 'student'
+                    ORDER BY u.full_name, u.user_id, g.subject, g.date
+                """, group_id, prefetch=self.ITER_BATCH):
+                    yield tuple(row)
+
+    @single_flight
+    async def get_students_by_teacher(self, teacher_id: int) -> List[User]:
+        """Получить всех студентов учителя"""
+        return await self._fetch_all(User, f"""
+            SELECT DISTINCT {columns(USER_COLUMNS, "u")}
+            FROM users u
+            INNER JOIN schedule s ON u.group_id = s.group_id
+            WHERE s.teacher_id = $1 AND u.role = 'student'
+        """, teacher_id)
+
+    async def add_message(self, from_user_id: int, to_user_id: int, message_text: str, timestamp: int) -> int:
+        """Добавить сообщение и обновить диалоги отправителя и получателя"""
+        async with self.transaction() as conn:
+            message_id = await conn.fetchval("""
+                INSERT INTO messages (from_user_id, to_user_id, message_text, timestamp)
+                VALUES ($1, $2, $3, $4)
+                RETURNING message_id
+            """, from_user_id, to_user_id, message_text, timestamp)
+            await conn.executemany("""
+                INSERT INTO message_threads (user_id, counterpart_id, unread, last_message_id, last_timestamp)
+                VALUES ($1, $2, $3, $4, $5)
+                ON CONFLICT (user_id, counterpart_id) DO UPDATE SET
+                    unread = message_threads.unread + EXCLUDED.unread,
+                    last_message_id = EXCLUDED.last_message_id,
+                    last_timestamp = EXCLUDED.last_timestamp
+            """, [
+                (to_user_id, from_user_id, 1, message_id, timestamp),
+                (from_user_id, to_user_id, 0, message_id, timestamp),
+            ])
+        return message_id
+
+    async def get_threads(self, user_id: int, limit: int = 50) -> List[Thread]:
+        """Диалоги пользователя, последние первыми"""
+        return await self._fetch_all(Thread, """
+            SELECT t.counterpart_id, t.unread, t.last_timestamp,
+                   u.full_name as counterpart_name, u.username as counterpart_username,
+                   m.message_text as last_text, m.from_user_id as last_from_user_id
+            FROM message_threads t
+            LEFT JOIN users u ON u.user_id = t.counterpart_id
+            LEFT JOIN messages m ON m.message_id = t.last_message_id
+            WHERE t.user_id = $1
+            ORDER BY t.last_timestamp DESC
+            LIMIT $2
+        """, user_id, limit)
+
+    async def get_unread_count(self, user_id: int) -> int:
+        """Число непрочитанных сообщений пользователя"""
+        return await self.pool.fetchval(
+            "SELECT COALESCE(SUM(unread), 0) FROM message_threads WHERE user_id = $1", user_id
+        )
+
+    async def get_conversation(self, user_id: int, counterpart_id: int, before_id: Optional[int] = None,
+                               limit: int = 10) -> List[Message]:
+        """Страница переписки двух пользователей, новые первыми (выборка от ключа, без OFFSET)"""
+        keyset, params = "", []
+        if before_id is not None:
+            row = await self.pool.fetchrow("SELECT timestamp, message_id FROM messages WHERE message_id = $1", before_id)
+            if row is None:
+                return []
+            keyset, params = " AND (timestamp, message_id) < ($4, $5)", [row['timestamp'], row['message_id']]
+
+        direction = f"""
+            SELECT {MESSAGE_COLUMNS} FROM messages
+            WHERE from_user_id = {{}} AND to_user_id = {{}}{{}}
+            ORDER BY timestamp DESC, message_id DESC
+            LIMIT $3
+        """
+        return await self._fetch_all(Message, f"""
+            SELECT * FROM ({direction.format("$1", "$2", keyset)}) AS sent
+            UNION ALL
+            SELECT * FROM ({direction.format("$2", "$1", keyset)}) AS received
+            ORDER BY timestamp DESC, message_id DESC
+            LIMIT $3
+        """, user_id, counterpart_id, limit, *params)
+
+    async def mark_thread_read(self, user_id: int, counterpart_id: int):
+        """Отметить диалог прочитанным"""
+        await self._execute("""
+            UPDATE message_threads SET unread = 0
+            WHERE user_id = $1 AND counterpart_id = $2 AND unread > 0
+        """, user_id, counterpart_id)
+
+    async def delete_user_from_group(self, user_id: int):
+        """Удалить пользователя из группы"""
+        await self._execute("UPDATE users SET group_id = NULL WHERE user_id = $1", user_id)
+        self.grade_stats.clear()
+
+    @staticmethod
+    def _affected(status: str) -> int:
+        """Число строк из статуса команды: "UPDATE 12" → 12"""
+        return int(status.rsplit(" ", 1)[-1])
+
+    async def _apply_group_plan(self, plan: GroupPlan, archived_at: int, archive_suffix: str,
+                                dry_run: bool) -> GroupReport:
+        """Шаги плана в одной транзакции; списки ID передаются массивами"""
+        report = GroupReport(dry_run=dry_run)
+        delete = [*plan.merges, *plan.delete]
+        async with self.pool.acquire() as conn:
+            transaction = conn.transaction()
+            await transaction.start()
+            try:
+                if plan.merges:
+                    status = await conn.execute("""
+                        UPDATE users u SET group_id = m.target
+                        FROM unnest($1::int[], $2::int[]) AS m (source, target)
+                        WHERE u.group_id = m.source
+                    """, list(plan.merges), list(plan.merges.values()))
+                    report.users_moved += self._affected(status)
+                if plan.archive:
+                    archive = list(plan.archive)
+                    status = await conn.execute("UPDATE users SET group_id = NULL WHERE group_id = ANY($1::int[])", archive)
+                    report.users_detached += self._affected(status)
+                    status = await conn.execute("DELETE FROM schedule WHERE group_id = ANY($1::int[])", archive)
+                    report.schedule_deleted += self._affected(status)
+                    status = await conn.execute("""
+                        UPDATE groups SET archived_at = $2, group_name = group_name || $3
+                        WHERE group_id = ANY($1::int[])
+                    """, archive, archived_at, archive_suffix)
+                    report.groups_archived += self._affected(status)
+                if delete:
+                    status = await conn.execute("UPDATE users SET group_id = NULL WHERE group_id = ANY($1::int[])", delete)
+                    report.users_detached += self._affected(status)
+                    status = await conn.execute("DELETE FROM schedule WHERE group_id = ANY($1::int[])", delete)
+                    report.schedule_deleted += self._affected(status)
+                    status = await conn.execute("DELETE FROM groups WHERE group_id = ANY($1::int[])", delete)
+                    report.groups_deleted += self._affected(status)
+                if plan.renames:
+                    # Временные названия — чтобы сдвиг ИС-11 → ИС-21, ИС-21 → ИС-31 не упирался в UNIQUE
+                    # (см. SQLiteDatabase._apply_group_plan)
+                    await conn.execute(
+                        "UPDATE groups SET group_name = ' ' || group_id WHERE group_id = ANY($1::int[])",
+                        list(plan.renames)
+                    )
+                    status = await conn.execute("""
+                        UPDATE groups g SET group_name = r.name
+                        FROM unnest($1::int[], $2::text[]) AS r (group_id, name)
+                        WHERE g.group_id = r.group_id
+                    """, list(plan.renames), list(plan.renames.values()))
+                    report.groups_renamed += self._affected(status)
+                for split in plan.splits:
+                    new_group_id = await conn.fetchval(
+                        "INSERT INTO groups (group_name) VALUES ($1) RETURNING group_id", split.new_name
+                    )
+                    report.groups_created += 1
+                    status = await conn.execute("""
+                        UPDATE users SET group_id = $1
+                        WHERE group_id = $2 AND user_id = ANY($3::bigint[])
+                    """, new_group_id, split.group_id, list(split.user_ids))
+                    report.users_moved += self._affected(status)
+                    report.schedule_to_assign += await conn.fetchval(
+                        "SELECT COUNT(*) FROM schedule WHERE group_id = $1", split.group_id
+                    )
+            except BaseException:
+                await transaction.rollback()
+                raise
+            if dry_run:
+                await transaction.rollback()
+            else:
+                await transaction.commit()
+                self._data_changed()
+        return report
+
+    async def set_reminders(self, user_id: int, enabled: bool):
+        """Включить или выключить напоминания о начале урока"""
+        if enabled:
+            await self._execute(
+                "INSERT INTO reminder_subscriptions (user_id) VALUES ($1) ON CONFLICT DO NOTHING", user_id
+            )
+        else:
+            await self._execute("DELETE FROM reminder_subscriptions WHERE user_id = $1", user_id)
+
+    async def get_reminders_enabled(self, user_id: int) -> bool:
+        """Включены ли у пользователя напоминания"""
+        row = await self.pool.fetchrow("SELECT 1 FROM reminder_subscriptions WHERE user_id = $1", user_id)
+        return row is not None
+
+    @single_flight
+    async def get_reminder_subscribers(self, group_id: int) -> List[int]:
+        """Получить ID студентов группы, включивших напоминания"""
+        rows = await self.pool.fetch("""
+            SELECT u.user_id
+            FROM users u
+            INNER JOIN reminder_subscriptions r ON r.user_id = u.user_id
+            WHERE u.group_id = $1 AND u.role = 'student'
+        """, group_id)
+        return [row['user_id'] for row in rows]
+
+    async def get_scheduler_run(self, job: str) -> Optional[Dict[str, Any]]:
+        """Получить сведения о последнем запуске фоновой задачи"""
+        row = await self.pool.fetchrow("SELECT * FROM scheduler_runs WHERE job = $1", job)
+        return dict(row) if row else None
+
+    async def save_scheduler_run(self, job: str, last_run: str, duration: Optional[float] = None,
+                                 sent: int = 0, failed: int = 0):
+        """Сохранить сведения о запуске фоновой задачи"""
+        await self._execute("""
+            INSERT INTO scheduler_runs (job, last_run, duration, sent, failed)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (job) DO UPDATE SET
+                last_run = EXCLUDED.last_run,
+                duration = EXCLUDED.duration,
+                sent = EXCLUDED.sent,
+                failed = EXCLUDED.failed
+        """, job, last_run, duration, sent, failed)
+
+    async def add_audit_entries(self, entries: Iterable[Tuple[int, int, str, Optional[int], Optional[str]]]):
+        """Дописать пакет записей журнала одной транзакцией"""
+        async with self.transaction() as conn:
+            await conn.executemany(
+                "INSERT INTO audit_log (created_at, actor_id, action, target_id, details) VALUES ($1, $2, $3, $4, $5)",
+                entries
+            )
+
+    @staticmethod
+    def _audit_conditions(actor_id: Optional[int], target_id: Optional[int],
+                          start: Optional[int], end: Optional[int]) -> Tuple[List[str], List[Any]]:
+        conditions, params = [], []
+        for condition, value in (("actor_id = {}", actor_id), ("target_id = {}", target_id),
+                                 ("created_at >= {}", start), ("created_at < {}", end)):
+            if value is not None:
+                params.append(value)
+                conditions.append(condition.format(f"${len(params)}"))
+        return conditions, params
+
+    async def get_audit_log(self, actor_id: Optional[int] = None, target_id: Optional[int] = None,
+                            start: Optional[int] = None, end: Optional[int] = None,
+                            before_id: Optional[int] = None, limit: int = 20) -> List[AuditEntry]:
+        """Записи журнала, новые первыми; страницы от ключа (created_at, audit_id)"""
+        conditions, params = self._audit_conditions(actor_id, target_id, start, end)
+        if before_id is not None:
+            row = await self.pool.fetchrow("SELECT created_at, audit_id FROM audit_log WHERE audit_id = $1", before_id)
+            if row is None:
+                return []
+            params.extend((row['created_at'], row['audit_id']))
+            conditions.append(f"(created_at, audit_id) < (${len(params) - 1}, ${len(params)})")
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return await self._fetch_all(
+            AuditEntry,
+            f"SELECT {AUDIT_COLUMNS} FROM audit_log{where} ORDER BY created_at DESC, audit_id DESC LIMIT ${len(params) + 1}",
+            *params, limit
+        )
+
+    def iter_audit_log(self, start: Optional[int] = None, end: Optional[int] = None) -> AsyncIterator[AuditEntry]:
+        """Записи журнала за период по одной, старые первыми"""
+        conditions, params = self._audit_conditions(None, None, start, end)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return self._iterate(
+            AuditEntry, f"SELECT {AUDIT_COLUMNS} FROM audit_log{where} ORDER BY created_at, audit_id", *params
+        )
+
+    async def _fetch_group_grade_stats(self, group_id: int, failing_below: float, utc_offset: int) -> GroupGradeStats:
+        """Сводка отметок группы; все запросы видят один снимок данных"""
+        students = "FROM users u JOIN grades g ON g.student_id = u.user_id WHERE u.group_id = $1 AND u.role = 'student'"
+        async with self.pool.acquire() as conn:
+            async with conn.transaction(isolation='repeatable_read', readonly=True):
+                subjects = await conn.fetch(f"""
+                    SELECT g.subject, COUNT(*) AS count, AVG(g.grade)::float8 AS mean,
+                           COUNT(*) FILTER (WHERE g.grade = 2) AS c2, COUNT(*) FILTER (WHERE g.grade = 3) AS c3,
+                           COUNT(*) FILTER (WHERE g.grade = 4) AS c4, COUNT(*) FILTER (WHERE g.grade = 5) AS c5
+                    {students}
+                    GROUP BY g.subject
+                    ORDER BY g.subject
+                """, group_id)
+                failing = await conn.fetch(f"""
+                    SELECT u.user_id, u.full_name, g.subject, AVG(g.grade)::float8 AS mean, COUNT(*) AS count
+                    {students}
+                    GROUP BY u.user_id, g.subject
+                    HAVING AVG(g.grade) < $2
+                    ORDER BY mean, u.full_name
+                """, group_id, failing_below)
+                trend = await conn.fetch(f"""
+                    SELECT to_char(to_timestamp(g.date + $2) AT TIME ZONE 'UTC', 'YYYY-MM') AS month,
+                           COUNT(*) AS count, AVG(g.grade)::float8 AS mean
+                    {students}
+                    GROUP BY month
+                    ORDER BY month
+                """, group_id, utc_offset)
+                student_ids = [
+                    row['user_id'] for row in await conn.fetch(
+                        "SELECT user_id FROM users WHERE group_id = $1 AND role = 'student'", group_id
+                    )
+                ]
+        return GroupGradeStats.from_rows(group_id, subjects, failing, trend, student_ids)
+
+    async def _fetch_snapshot_groups(self) -> List[Group]:
+        return await self._fetch_all(
+            Group, f"SELECT {GROUP_COLUMNS} FROM groups WHERE archived_at IS NULL ORDER BY group_id"
+        )
+
+    async def _fetch_snapshot_teachers(self) -> List[User]:
+        return await self._fetch_all(User, f"SELECT {USER_COLUMNS} FROM users WHERE role = 'teacher' ORDER BY full_name")
+
+    async def _fetch_snapshot_schedule(self, group_id: Optional[int] = None) -> List[ScheduleEntry]:
+        query = SCHEDULE_SELECT
+        params = ()
+        if group_id is not None:
+            query += " WHERE s.group_id = $1"
+            params = (group_id,)
+        else:
+            query += " WHERE s.group_id IN (SELECT group_id FROM groups WHERE archived_at IS NULL)"
+        query += " ORDER BY s.group_id, s.day_of_week, s.lesson_number"
+        return await self._fetch_all(ScheduleEntry, query, *params)
@@ -0,0 +1,95 @@
+"""Проверка расписания на накладки.
+
+Слот — день недели и номер урока. В слоте у группы может стоять один урок,
+а учитель может вести в слоте урок только у одной группы; в базе это
+уникальные индексы idx_schedule_slot (group_id, day_of_week, lesson_number)
+и idx_schedule_teacher_slot (teacher_id, day_of_week, lesson_number).
+Перед записью каждый урок проверяется двумя пробами этих индексов (O(log n)),
+поэтому накладка возвращается списком конфликтов, а не ошибкой вставки.
+Одиночный урок и пакет уроков проверяются одинаково.
+"""
+from typing import Iterable, List, NamedTuple, Tuple
+from .models import ScheduleEntry
+
+# Слот группы уже занят другим уроком: при replace урок заменяется
+GROUP_SLOT = "group"
+# Учитель в это время ведёт урок у другой группы: запись невозможна
+TEACHER_SLOT = "teacher"
+
+# Уроки старых баз, мешающие создать уникальные индексы: (причина, условие WHERE).
+# Перед созданием индексов они один раз переносятся в schedule_removed, где
+# администратор может их просмотреть и вернуть в расписание вручную
+SLOT_CLEANUP = (
+    # Архивные группы больше не занимают уроки учителей
+    ("archived_group", "group_id IN (SELECT group_id FROM groups WHERE archived_at IS NOT NULL)"),
+    # Из повторов слота остаётся последний добавленный урок
+    (GROUP_SLOT, """schedule_id NOT IN (
+        SELECT MAX(schedule_id) FROM schedule GROUP BY group_id, day_of_week, lesson_number
+    )"""),
+    (TEACHER_SLOT, """schedule_id NOT IN (
+        SELECT MAX(schedule_id) FROM schedule GROUP BY teacher_id, day_of_week, lesson_number
+    )"""),
+)
+SCHEDULE_REMOVED_TABLE = """
+    CREATE TABLE IF NOT EXISTS schedule_removed (
+        schedule_id INTEGER PRIMARY KEY,
+        group_id INTEGER NOT NULL,
+        day_of_week INTEGER NOT NULL,
+        lesson_number INTEGER NOT NULL,
+        subject TEXT NOT NULL,
+        teacher_id BIGINT NOT NULL,
+        reason TEXT NOT NULL,
+        removed_at BIGINT NOT NULL
+    )
+"""
+
+
+class ScheduleConflict(NamedTuple):
+    """Накладка: какой урок хотели поставить и что уже занимает слот"""
+    kind: str
+    requested: ScheduleEntry
+    # Урок из базы (с именем учителя); schedule_id 0 — другой урок того же пакета
+    existing: ScheduleEntry
+
+
+def lesson(group_id: int, day_of_week: int, lesson_number: int, subject: str, teacher_id: int) -> ScheduleEntry:
+    """Урок, который ещё не записан в базу"""
+    return ScheduleEntry(0, group_id, day_of_week, lesson_number, subject, teacher_id)
+
+
+def same_lesson(a: ScheduleEntry, b: ScheduleEntry) -> bool:
+    return a.subject == b.subject and a.teacher_id == b.teacher_id
+
+
+def batch_conflicts(entries: Iterable[ScheduleEntry]) -> List[ScheduleConflict]:
+    """Накладки внутри пакета: два урока в одном слоте группы или учителя"""
+    conflicts = []
+    by_group_slot = {}
+    by_teacher_slot = {}
+    for entry in entries:
+        slot = (entry.day_of_week, entry.lesson_number)
+        other = by_group_slot.setdefault((entry.group_id, *slot), entry)
+        if other is not entry:
+            conflicts.append(ScheduleConflict(GROUP_SLOT, entry, other))
+            continue
+        other = by_teacher_slot.setdefault((entry.teacher_id, *slot), entry)
+        if other is not entry:
+            conflicts.append(ScheduleConflict(TEACHER_SLOT, entry, other))
+    return conflicts
+
+
+def slot_conflicts(entry: ScheduleEntry, in_group: Tuple[ScheduleEntry, ...],
+                   for_teacher: Tuple[ScheduleEntry, ...], replace: bool) -> List[ScheduleConflict]:
+    """Накладки урока с уроками из базы: занятый слот группы и занятый учитель.
+
+    in_group — урок группы в этом слоте, for_teacher — уроки учителя в этом
+    слоте у других групп (проба каждого уникального индекса даёт не больше
+    одной строки). Тот же урок в том же слоте накладкой не считается.
+    """
+    conflicts = []
+    for existing in in_group:
+        if not replace and not same_lesson(existing, entry):
+            conflicts.append(ScheduleConflict(GROUP_SLOT, entry, existing))
+    for existing in for_teacher:
+        conflicts.append(ScheduleConflict(TEACHER_SLOT, entry, existing))
+    return conflicts
@@ -0,0 +1,87 @@
+import asyncio
+import functools
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+@dataclass
+class FlightStats:
+    """Счётчики объединения запросов для одного метода"""
+    calls: int = 0
+    executed: int = 0
+
+    @property
+    def coalesced(self) -> int:
+        return self.calls - self.executed
+
+    @property
+    def ratio(self) -> float:
+        """Доля вызовов, получивших результат чужого запроса"""
+        return self.coalesced / self.calls if self.calls else 0.0
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных запросов.
+
+    Пока запрос с ключом key выполняется, все остальные вызовы с тем же
+    ключом ждут его и получают тот же результат. Ничего не кэшируется:
+    после завершения запроса следующий вызов снова идёт в базу.
+    Ключ должен включать версию данных, иначе вызов, начатый после
+    записи, получит результат запроса, начатого до неё.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.stats: Dict[str, FlightStats] = {}
+
+    async def do(self, name: str, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        stats = self.stats.setdefault(name, FlightStats())
+        stats.calls += 1
+
+        task = self._inflight.get(key)
+        if task is None:
+            stats.executed += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._forget, key))
+
+        # shield: отмена одного ожидающего не должна отменять общий запрос
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Статистика по методам"""
+        return {
+            name: {
+                'calls': stats.calls,
+                'executed': stats.executed,
+                'coalesced': stats.coalesced,
+                'ratio': round(stats.ratio, 4),
+            }
+            for name, stats in self.stats.items()
+        }
+
+
+def single_flight(method):
+    """Декоратор метода чтения Database: включает объединение запросов.
+
+    Результат общий для всех ожидающих, поэтому его нельзя изменять.
+    В ключ входит Database.data_version: после зафиксированной записи
+    новые вызовы начинают свой запрос и видят её. Для каких методов
+    объединение активно, задаётся параметром single_flight конструктора
+    Database.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if name not in self.single_flight_methods:
+            return await method(self, *args, **kwargs)
+        key = (name, self.data_version, args, tuple(sorted(kwargs.items())))
+        return await self.flights.do(name, key, lambda: method(self, *args, **kwargs))
+
+    wrapper.single_flight = True
+    return wrapper
@@ -0,0 +1,79 @@
+import sys
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+from .models import User, Group, ScheduleEntry
+
+
+def empty_mapping() -> Mapping:
+    return MappingProxyType({})
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Неизменяемый снимок редко меняющихся таблиц (группы, расписание, учителя).
+
+    Снимок никогда не изменяется на месте: каждая запись в Database
+    публикует новую версию, в которой пересобраны только затронутые части,
+    а остальные словари переиспользуются из предыдущей версии.
+    """
+    version: int = 0
+    groups: Tuple[Group, ...] = ()
+    groups_by_id: Mapping[int, Group] = field(default_factory=empty_mapping)
+    groups_by_name: Mapping[str, Group] = field(default_factory=empty_mapping)
+    schedule_by_group: Mapping[int, Tuple[ScheduleEntry, ...]] = field(default_factory=empty_mapping)
+    teachers: Tuple[User, ...] = ()
+    teachers_by_id: Mapping[int, User] = field(default_factory=empty_mapping)
+
+    # Строки — неизменяемые именованные кортежи, поэтому попадают в снимок без копирования
+
+    @staticmethod
+    def index_groups(groups: Iterable[Group]) -> dict:
+        """Поля снимка для списка групп"""
+        groups = tuple(groups)
+        return {
+            'groups': groups,
+            'groups_by_id': MappingProxyType({g.group_id: g for g in groups}),
+            'groups_by_name': MappingProxyType({g.group_name: g for g in groups}),
+        }
+
+    @staticmethod
+    def index_teachers(teachers: Iterable[User]) -> dict:
+        """Поля снимка для списка учителей"""
+        teachers = tuple(teachers)
+        return {
+            'teachers': teachers,
+            'teachers_by_id': MappingProxyType({t.user_id: t for t in teachers}),
+        }
+
+    @staticmethod
+    def index_schedule(rows: Iterable[ScheduleEntry],
+                       group_id: Optional[int] = None) -> Mapping[int, Tuple[ScheduleEntry, ...]]:
+        """Расписание по группам; для group_id пустое расписание тоже попадает в результат"""
+        by_group: Dict[int, list] = {}
+        if group_id is not None:
+            by_group[group_id] = []
+        for row in rows:
+            by_group.setdefault(row.group_id, []).append(row)
+        return MappingProxyType({key: tuple(items) for key, items in by_group.items()})
+
+    def get_schedule(self, group_id: int) -> Tuple[ScheduleEntry, ...]:
+        """Расписание группы (отсортировано по дню и номеру урока)"""
+        return self.schedule_by_group.get(group_id, ())
+
+    def memory_size(self) -> int:
+        """Приблизительный объём памяти снимка в байтах"""
+        seen = set()
+
+        def size(obj) -> int:
+            if id(obj) in seen:
+                return 0
+            seen.add(id(obj))
+            total = sys.getsizeof(obj)
+            if isinstance(obj, Mapping):
+                total += sum(size(k) + size(v) for k, v in obj.items())
+            elif isinstance(obj, (tuple, list)):
+                total += sum(size(item) for item in obj)
+            return total
+
+        return sum(size(getattr(self, name)) for name in self.__dataclass_fields__)
@@ -0,0 +1,3 @@
+from .storage import CompactMemoryStorage, compact_key
+
+__all__ = ['CompactMemoryStorage', 'compact_key']
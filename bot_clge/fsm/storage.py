@@ -0,0 +1,130 @@
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey, DEFAULT_DESTINY
+
+
+def compact_key(key: StorageKey) -> Hashable:
+    """Ключ записи: (бот, пользователь) для личного чата, иначе все поля StorageKey"""
+    if key.chat_id == key.user_id and key.thread_id is None and key.destiny == DEFAULT_DESTINY:
+        return key.bot_id, key.user_id
+    return key.bot_id, key.chat_id, key.user_id, key.thread_id, key.destiny
+
+
+class CompactMemoryStorage(BaseStorage):
+    """Хранилище FSM в памяти с вытеснением брошенных сценариев.
+
+    В отличие от MemoryStorage запись не создаётся при чтении и удаляется,
+    как только состояние и данные очищены (state.clear()), поэтому память
+    занимают только незавершённые сценарии. Запись — список [состояние,
+    данные или None, время последнего обращения] под коротким ключом, а
+    названия состояний хранятся в одном экземпляре. Записи лежат в порядке
+    последнего обращения: sweep() снимает с начала те, к которым не
+    обращались ttl секунд (просроченная запись не видна и до очистки), а
+    при превышении max_entries вытесняется самая давняя запись.
+    """
+
+    def __init__(self, ttl: float = 24 * 3600, max_entries: int = 100_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        # ключ -> [состояние, данные, время обращения]
+        self._records: "OrderedDict[Hashable, List[Any]]" = OrderedDict()
+        self.expired = 0
+        self.evicted = 0
+
+    def _get(self, key: StorageKey) -> Optional[List[Any]]:
+        record_key = compact_key(key)
+        record = self._records.get(record_key)
+        if record is None:
+            return None
+        now = self.clock()
+        if now - record[2] >= self.ttl:
+            del self._records[record_key]
+            self.expired += 1
+            return None
+        record[2] = now
+        self._records.move_to_end(record_key)
+        return record
+
+    def _put(self, key: StorageKey, state: Optional[str], data: Optional[Dict[str, Any]]):
+        record_key = compact_key(key)
+        if state is None and not data:
+            self._records.pop(record_key, None)
+            return
+        if record_key in self._records:
+            self._records.move_to_end(record_key)
+        self._records[record_key] = [state, data or None, self.clock()]
+        while len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
+            self.evicted += 1
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        record = self._get(key)
+        self._put(key, sys.intern(state) if state is not None else None, record[1] if record else None)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._get(key)
+        return record[0] if record else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = self._get(key)
+        self._put(key, record[0] if record else None, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._get(key)
+        return record[1].copy() if record and record[1] else {}
+
+    async def close(self) -> None:
+        self._records.clear()
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Удалить записи, к которым не обращались ttl секунд; сколько удалено"""
+        now = self.clock() if now is None else now
+        removed = 0
+        records = self._records
+        while records:
+            record_key, record = next(iter(records.items()))
+            if now - record[2] < self.ttl:
+                break
+            del records[record_key]
+            removed += 1
+        self.expired += removed
+        return removed
+
+    async def run_forever(self, interval: float = 600.0):
+        """Периодически убирать брошенные сценарии"""
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __bool__(self) -> bool:
+        # Пустое хранилище не ложно: Dispatcher подменяет ложное storage на MemoryStorage
+        return True
+
+    def memory_size(self) -> int:
+        """Приблизительный объём памяти записей в байтах (названия состояний общие и не считаются)"""
+        total = sys.getsizeof(self._records)
+        for record_key, record in self._records.items():
+            total += sys.getsizeof(record_key) + sys.getsizeof(record) + sys.getsizeof(record[2])
+            total += sum(sys.getsizeof(part) for part in record_key)
+            if record[1]:
+                total += sys.getsizeof(record[1])
+                total += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in record[1].items())
+        return total
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._records),
+            'max_entries': self.max_entries,
+            'expired': self.expired,
+            'evicted': self.evicted,
+        }
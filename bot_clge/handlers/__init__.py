@@ -1,7 +1,14 @@
 from .common import router as common_router
+from .menu import router as menu_router
 from .admin import router as admin_router
 from .teacher import router as teacher_router
 from .student import router as student_router
+from .inbox import router as inbox_router
+from .reports import router as reports_router
+from .inline import router as inline_router
 
-__all__ = ['common_router', 'admin_router', 'teacher_router', 'student_router']
+__all__ = [
+    'common_router', 'menu_router', 'admin_router', 'teacher_router', 'student_router', 'inbox_router',
+    'reports_router', 'inline_router'
+]
 
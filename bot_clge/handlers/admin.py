@@ -1,12 +1,27 @@
-from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+import os
+import tempfile
+from contextlib import aclosing
+from aiogram import Bot, Router, F
+from aiogram.types import Message, CallbackQuery, FSInputFile
 from aiogram.fsm.context import FSMContext
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.state import State, StatesGroup
-from database import Database
+from typing import Optional, Sequence, Tuple
+from database import Database, UserLoader, Archiver, AuditLog, AuditAction, Group
+from database.audit import export_jsonl
+from database.groups import GroupPlan, GroupSplit, promotion_plan, parse_ids
+from database.periods import now
+from database.backup import BackupManager
 from keyboards import (
     get_main_menu, get_cancel_keyboard, get_groups_keyboard,
-    get_users_keyboard, get_action_keyboard
+    get_users_keyboard, get_action_keyboard, get_confirm_keyboard,
+    UserAction, GroupAction, AdminAction,
+    UserCallback, GroupCallback, AdminCallback, ConfirmCallback, CancelCallback
 )
+from scheduler import BackgroundTasks, BatchSender, MorningPush, LessonReminders
+from tenants import Tenant
+from utils import format_grade_stats, format_audit_log, format_group_report
+from .menu import menu
 
 router = Router()
 
@@ -19,35 +34,37 @@ class AdminStates(StatesGroup):
     waiting_for_broadcast_message = State()
     waiting_for_new_admin_username = State()
     selecting_group_for_user = State()
+    confirming_group_plan = State()
 
 
-@router.message(F.text == "👥 Управление учителями")
+# Массовые операции над группами: команда -> как вызывать
+GROUP_COMMANDS = {
+    "promote_groups": "/promote_groups [последний курс] — перевести все группы на следующий курс",
+    "rename_group": "/rename_group ID новое название",
+    "merge_groups": "/merge_groups ID[,ID...] ID_куда — перевести студентов и удалить группы",
+    "split_group": "/split_group ID ID_студентов,... новое название — выделить студентов в новую группу",
+    "archive_group": "/archive_group ID[,ID...] — убрать группы в архив",
+    "delete_group": "/delete_group ID[,ID...] — удалить группы вместе с расписанием",
+}
+
+
+@menu.button("admin", "👥 Управление учителями")
 async def manage_teachers(message: Message, db: Database):
     """Управление учителями"""
-    user = await db.get_user(message.from_user.id)
-    if not user or user['role'] != 'admin':
-        await message.answer("❌ У вас нет доступа к этой функции.")
-        return
-    
-    teachers = await db.get_users_by_role("teacher")
+    teachers = db.snapshot.teachers
     if not teachers:
         await message.answer("📭 Учителей пока нет в системе.")
         return
     
     await message.answer(
         "👥 Выберите учителя:",
-        reply_markup=get_users_keyboard(teachers, "teacher_action")
+        reply_markup=get_users_keyboard(teachers, UserAction.MANAGE_TEACHER)
     )
 
 
-@router.message(F.text == "👨‍🎓 Управление студентами")
+@menu.button("admin", "👨‍🎓 Управление студентами")
 async def manage_students(message: Message, db: Database):
     """Управление студентами"""
-    user = await db.get_user(message.from_user.id)
-    if not user or user['role'] != 'admin':
-        await message.answer("❌ У вас нет доступа к этой функции.")
-        return
-    
     students = await db.get_users_by_role("student")
     if not students:
         await message.answer("📭 Студентов пока нет в системе.")
@@ -55,38 +72,35 @@ async def manage_students(message: Message, db: Database):
     
     await message.answer(
         "👨‍🎓 Выберите студента:",
-        reply_markup=get_users_keyboard(students, "student_action")
+        reply_markup=get_users_keyboard(students, UserAction.MANAGE_STUDENT)
     )
 
 
-@router.message(F.text == "📚 Управление группами")
+@menu.button("admin", "📚 Управление группами")
 async def manage_groups(message: Message, state: FSMContext):
     """Управление группами"""
-    user = await db.get_user(message.from_user.id)
-    if not user or user['role'] != 'admin':
-        await message.answer("❌ У вас нет доступа к этой функции.")
-        return
-    
     await message.answer(
-        "📚 Введите название новой группы:",
+        "📚 Введите название новой группы:\n\n"
+        "Список групп и массовые операции (перевод на курс, слияние, архив): /groups",
         reply_markup=get_cancel_keyboard()
     )
     await state.set_state(AdminStates.waiting_for_group_name)
 
 
 @router.message(AdminStates.waiting_for_group_name, F.text != "❌ Отмена")
-async def create_group(message: Message, state: FSMContext, db: Database):
+async def create_group(message: Message, state: FSMContext, db: Database, audit: AuditLog):
     """Создать группу"""
     group_name = message.text.strip()
     
     # Проверяем, существует ли уже такая группа
-    existing_group = await db.get_group_by_name(group_name)
+    existing_group = db.snapshot.groups_by_name.get(group_name)
     if existing_group:
         await message.answer(f"❌ Группа '{group_name}' уже существует.")
         return
     
     try:
-        await db.create_group(group_name)
+        group_id = await db.create_group(group_name)
+        audit.record(message.from_user.id, AuditAction.CREATE_GROUP, group_id=group_id, group_name=group_name)
         await message.answer(
             f"✅ Группа '{group_name}' успешно создана!",
             reply_markup=get_main_menu("admin")
@@ -97,14 +111,98 @@ async def create_group(message: Message, state: FSMContext, db: Database):
     await state.clear()
 
 
-@router.message(F.text == "📢 Рассылка")
-async def start_broadcast(message: Message, state: FSMContext, db: Database):
-    """Начать рассылку"""
+@router.message(Command("groups"))
+async def list_groups(message: Message, db: Database):
+    """Группы с ID и команды массовых операций"""
+    user = await db.get_user(message.from_user.id)
+    if not user or user.role != 'admin':
+        await message.answer("❌ У вас нет доступа к этой функции.")
+        return
+    
+    lines = [f"{group.group_id} — {group.group_name}" for group in db.snapshot.groups]
+    text = "📚 Группы (ID — название):\n" + ("\n".join(lines) or "Групп пока нет.")
+    text += "\n\nМассовые операции (сначала показывается пробный прогон):\n" + "\n".join(GROUP_COMMANDS.values())
+    await message.answer(text)
+
+
+def build_group_plan(command: str, args: str, groups: Sequence[Group]) -> Tuple[AuditAction, GroupPlan]:
+    """План массовой операции по команде администратора; ValueError при неверных аргументах"""
+    parts = args.split(maxsplit=2)
+    if command == "promote_groups":
+        if parts and not parts[0].isdigit():
+            raise ValueError("Последний курс указывается числом")
+        plan = promotion_plan(groups, int(parts[0]) if parts else 4)
+    elif command == "rename_group":
+        parts = args.split(maxsplit=1)
+        if len(parts) != 2 or not parts[0].isdigit():
+            raise ValueError("Укажите ID группы и новое название")
+        plan = GroupPlan(renames={int(parts[0]): parts[1].strip()})
+    elif command == "merge_groups":
+        if len(parts) != 2 or not parts[1].isdigit():
+            raise ValueError("Укажите ID объединяемых групп и ID группы, куда перевести студентов")
+        target = int(parts[1])
+        plan = GroupPlan(merges={source: target for source in parse_ids(parts[0])})
+    elif command == "split_group":
+        if len(parts) != 3 or not parts[0].isdigit():
+            raise ValueError("Укажите ID группы, ID студентов через запятую и название новой группы")
+        plan = GroupPlan(splits=(GroupSplit(int(parts[0]), parts[2].strip(), parse_ids(parts[1])),))
+    elif command == "archive_group":
+        plan = GroupPlan(archive=parse_ids(args))
+    else:
+        plan = GroupPlan(delete=parse_ids(args))
+    return AuditAction(command), plan
+
+
+@router.message(Command(*GROUP_COMMANDS))
+async def preview_group_plan(message: Message, command: CommandObject, state: FSMContext, db: Database):
+    """Пробный прогон массовой операции над группами и запрос подтверждения"""
     user = await db.get_user(message.from_user.id)
-    if not user or user['role'] != 'admin':
+    if not user or user.role != 'admin':
         await message.answer("❌ У вас нет доступа к этой функции.")
         return
     
+    args = (command.args or "").strip()
+    try:
+        _, plan = build_group_plan(command.command, args, db.snapshot.groups)
+        if not plan:
+            await message.answer("📭 Менять нечего.")
+            return
+        report = await db.apply_group_plan(plan, dry_run=True)
+    except ValueError as e:
+        await message.answer(f"❌ {e}\n\n{GROUP_COMMANDS[command.command]}")
+        return
+    except Exception as e:
+        await message.answer(f"❌ Операцию выполнить нельзя: {e}")
+        return
+    
+    await state.set_state(AdminStates.confirming_group_plan)
+    await state.update_data(group_command=command.command, group_args=args)
+    await message.answer(format_group_report(report), reply_markup=get_confirm_keyboard())
+
+
+@router.callback_query(AdminStates.confirming_group_plan, ConfirmCallback.filter())
+async def apply_group_plan(callback: CallbackQuery, state: FSMContext, db: Database, audit: AuditLog):
+    """Выполнить подтверждённую массовую операцию"""
+    data = await state.get_data()
+    await state.clear()
+    
+    # План строится заново: группы могли измениться, пока администратор читал отчёт
+    try:
+        action, plan = build_group_plan(data['group_command'], data['group_args'], db.snapshot.groups)
+        report = await db.apply_group_plan(plan)
+    except Exception as e:
+        await callback.message.edit_text(f"❌ Ошибка: {e}")
+        await callback.answer()
+        return
+    
+    audit.record(callback.from_user.id, action, args=data['group_args'], **report.counts())
+    await callback.message.edit_text(format_group_report(report))
+    await callback.answer()
+
+
+@menu.button("admin", "📢 Рассылка")
+async def start_broadcast(message: Message, state: FSMContext):
+    """Начать рассылку"""
     await message.answer(
         "📢 Введите сообщение для рассылки:",
         reply_markup=get_cancel_keyboard()
@@ -113,41 +211,39 @@ async def start_broadcast(message: Message, state: FSMContext, db: Database):
 
 
 @router.message(AdminStates.waiting_for_broadcast_message, F.text != "❌ Отмена")
-async def send_broadcast(message: Message, state: FSMContext, db: Database):
+async def send_broadcast(message: Message, state: FSMContext, db: Database, tasks: BackgroundTasks,
+                         sender: BatchSender, audit: AuditLog):
     """Отправить рассылку"""
     broadcast_text = message.text
     
-    # Получаем всех пользователей
-    all_users = []
+    if tasks.spawn(broadcast(message.bot, db, sender, message.chat.id, broadcast_text), name="broadcast"):
+        audit.record(message.from_user.id, AuditAction.BROADCAST, text=broadcast_text)
+        await message.answer(
+            "📢 Рассылка запущена, итог придёт отдельным сообщением.",
+            reply_markup=get_main_menu("admin")
+        )
+    else:
+        await message.answer("❌ Бот перегружен, повторите рассылку позже.", reply_markup=get_main_menu("admin"))
+    await state.clear()
+
+
+async def broadcast(bot: Bot, db: Database, sender: BatchSender, admin_chat_id: int, broadcast_text: str):
+    """Разослать текст всем пользователям и сообщить итог администратору"""
+    # Получаем ID всех пользователей; соединение с базой не держим, пока идёт отправка
+    recipients = []
     for role in ["admin", "teacher", "student"]:
-        users = await db.get_users_by_role(role)
-        all_users.extend(users)
-    
-    sent = 0
-    failed = 0
-    
-    for user in all_users:
-        try:
-            await message.bot.send_message(user['user_id'], f"📢 Рассылка от администратора:\n\n{broadcast_text}")
-            sent += 1
-        except Exception:
-            failed += 1
+        recipients.extend([user.user_id async for user in db.iter_users_by_role(role)])
     
-    await message.answer(
-        f"✅ Рассылка завершена!\nОтправлено: {sent}\nНе удалось отправить: {failed}",
-        reply_markup=get_main_menu("admin")
+    result = await sender.send(recipients, f"📢 Рассылка от администратора:\n\n{broadcast_text}")
+    await bot.send_message(
+        admin_chat_id,
+        f"✅ Рассылка завершена!\nОтправлено: {result.sent}\nНе удалось отправить: {result.failed}"
     )
-    await state.clear()
 
 
-@router.message(F.text == "👤 Добавить администратора")
-async def add_admin_start(message: Message, state: FSMContext, db: Database):
+@menu.button("admin", "👤 Добавить администратора")
+async def add_admin_start(message: Message, state: FSMContext):
     """Начать процесс добавления администратора"""
-    user = await db.get_user(message.from_user.id)
-    if not user or user['role'] != 'admin':
-        await message.answer("❌ У вас нет доступа к этой функции.")
-        return
-    
     await message.answer(
         "👤 Введите username пользователя для назначения администратором (без @):",
         reply_markup=get_cancel_keyboard()
@@ -156,55 +252,292 @@ async def add_admin_start(message: Message, state: FSMContext, db: Database):
 
 
 @router.message(AdminStates.waiting_for_new_admin_username, F.text != "❌ Отмена")
-async def add_admin_process(message: Message, state: FSMContext, db: Database):
+async def add_admin_process(message: Message, state: FSMContext, db: Database, tasks: BackgroundTasks,
+                            audit: AuditLog):
     """Обработать добавление администратора"""
     username = message.text.strip().replace("@", "")
     
     # Находим пользователя по username - проверяем всех пользователей
-    all_users = []
-    for role in ["student", "teacher", "admin"]:
-        users = await db.get_users_by_role(role)
-        all_users.extend(users)
-    
     target_user = None
-    for user in all_users:
-        if user.get('username') == username:
-            target_user = user
+    for role in ["student", "teacher", "admin"]:
+        async with aclosing(db.iter_users_by_role(role)) as users:
+            async for user in users:
+                if user.username == username:
+                    target_user = user
+                    break
+        if target_user:
             break
     
     if not target_user:
         await message.answer(f"❌ Пользователь с username '{username}' не найден. Убедитесь, что пользователь использовал /start в боте.")
         return
     
-    if target_user['role'] == 'admin':
-        await message.answer(f"ℹ️ Пользователь {target_user['full_name']} уже является администратором.")
+    if target_user.role == 'admin':
+        await message.answer(f"ℹ️ Пользователь {target_user.full_name} уже является администратором.")
         await state.clear()
         return
     
     # Обновляем роль
-    await db.update_user_role(target_user['user_id'], "admin")
+    await db.update_user_role(target_user.user_id, "admin")
+    audit.record(message.from_user.id, AuditAction.ADD_ADMIN, target_user.user_id, previous_role=target_user.role)
     
     await message.answer(
-        f"✅ Пользователь {target_user['full_name']} теперь администратор!",
+        f"✅ Пользователь {target_user.full_name} теперь администратор!",
         reply_markup=get_main_menu("admin")
     )
     
     # Уведомляем нового администратора
-    try:
-        await message.bot.send_message(
-            target_user['user_id'],
+    tasks.spawn(
+        message.bot.send_message(
+            target_user.user_id,
             "🎉 Вас назначили администратором! Используйте /start для обновления меню."
-        )
-    except Exception:
-        pass
+        ),
+        name="role_notification"
+    )
     
     await state.clear()
 
 
-@router.callback_query(F.data.startswith("teacher_action_"))
-async def teacher_action(callback: CallbackQuery, state: FSMContext):
+@menu.button("admin", "📈 Аналитика", throttling="analytics")
+async def grade_analytics(message: Message, db: Database):
+    """Выбрать группу для сводки отметок"""
+    groups = db.snapshot.groups
+    if not groups:
+        await message.answer("📭 Групп пока нет.")
+        return
+    
+    await message.answer(
+        "📈 Выберите группу:",
+        reply_markup=get_groups_keyboard(groups, GroupAction.GRADE_STATS)
+    )
+
+
+@router.callback_query(GroupCallback.filter(F.action == GroupAction.GRADE_STATS), flags={"throttling": "analytics"})
+async def show_grade_stats(callback: CallbackQuery, callback_data: GroupCallback, db: Database):
+    """Сводка отметок группы: средние, распределение, неуспевающие, динамика"""
+    group = db.snapshot.groups_by_id.get(callback_data.group_id)
+    if not group:
+        await callback.answer("Группа не найдена.", show_alert=True)
+        return
+    
+    stats = await db.get_group_grade_stats(callback_data.group_id)
+    text = format_grade_stats(stats, group.group_name)
+    if len(text) > 4000:
+        text = text[:4000] + "\n…"
+    await callback.message.edit_text(text)
+    await callback.answer()
+
+
+@router.message(Command("push_status"))
+async def push_status(message: Message, db: Database, morning_push: MorningPush):
+    """Состояние утренней рассылки расписания"""
+    user = await db.get_user(message.from_user.id)
+    if not user or user.role != 'admin':
+        await message.answer("❌ У вас нет доступа к этой функции.")
+        return
+    
+    status = await morning_push.status()
+    duration = f"{status['duration']:.1f} с" if status['duration'] is not None else "—"
+    await message.answer(
+        "☀️ Утренняя рассылка расписания\n\n"
+        f"Сейчас выполняется: {'да' if status['running'] else 'нет'}\n"
+        f"Последний запуск: {status['last_run'] or '—'}\n"
+        f"Длительность: {duration}\n"
+        f"Отправлено: {status['sent']}, ошибок: {status['failed']}\n"
+        f"Следующий запуск: {status['next_run'] or 'выключена'}"
+    )
+
+
+@router.message(Command("reminders_status"))
+async def reminders_status(message: Message, db: Database, lesson_reminders: LessonReminders):
+    """Состояние очереди напоминаний о начале урока"""
+    user = await db.get_user(message.from_user.id)
+    if not user or user.role != 'admin':
+        await message.answer("❌ У вас нет доступа к этой функции.")
+        return
+    
+    metrics = lesson_reminders.metrics()
+    await message.answer(
+        "🔔 Напоминания о начале урока\n\n"
+        f"Событий в очереди: {metrics['queue_size']}\n"
+        f"Ближайшее: {metrics['next_at'] or '—'}\n"
+        f"Сработало: {metrics['fired']}\n"
+        f"Задержка: последняя {metrics['last_lag']:.1f} с, максимальная {metrics['max_lag']:.1f} с"
+    )
+
+
+@router.message(Command("tasks_status"))
+async def tasks_status(message: Message, db: Database, tasks: BackgroundTasks):
+    """Состояние фоновых задач обработчиков"""
+    user = await db.get_user(message.from_user.id)
+    if not user or user.role != 'admin':
+        await message.answer("❌ У вас нет доступа к этой функции.")
+        return
+    
+    metrics = tasks.metrics()
+    await message.answer(
+        "⚙️ Фоновые задачи\n\n"
+        f"В работе: {metrics['running']} из {metrics['limit']}, всего ожидает: {metrics['pending']}\n"
+        f"Выполнено: {metrics['done']}, с ошибкой: {metrics['failed']}, отклонено: {metrics['rejected']}\n"
+        f"Последняя ошибка: {metrics['last_error'] or '—'}"
+    )
+
+
+@router.message(Command("tenant_status"))
+async def tenant_status(message: Message, db: Database, tenant: Tenant):
+    """Нагрузка и ресурсы этого колледжа в общем процессе"""
+    user = await db.get_user(message.from_user.id)
+    if not user or user.role != 'admin':
+        await message.answer("❌ У вас нет доступа к этой функции.")
+        return
+    
+    metrics = tenant.metrics()
+    stats = metrics['grade_stats']
+    await message.answer(
+        f"🏫 Колледж {metrics['name']}\n\n"
+        f"Работает: {metrics['uptime'] / 3600:.1f} ч\n"
+        f"Апдейтов: {metrics['updates']}, с ошибкой: {metrics['errors']}, отброшено частых: {metrics['throttled']}\n"
+        f"Обработка: в среднем {metrics['avg_ms']:.1f} мс, максимум {metrics['max_ms']:.1f} мс\n"
+        f"Снимок справочников: {metrics['snapshot_kb']:.1f} КБ\n"
+        f"Сводки в кэше: {stats.get('groups', 0)} (попаданий {stats.get('hits', 0)}, промахов {stats.get('misses', 0)})\n"
+        f"Отправлено сообщений: {metrics['sent']}, не доставлено: {metrics['send_failed']}\n"
+        f"Фоновых задач в очереди: {metrics['tasks'].get('pending', 0)}\n"
+        f"Отчётов в кэше: {metrics['reports'].get('cached', 0)}\n"
+        f"Инлайн-запросов расписания: {metrics['schedule_search'].get('queries', 0)}"
+    )
+
+
+@router.message(Command("archive"))
+async def archive_terms(message: Message, db: Database, archiver: Optional[Archiver]):
+    """Перенести отметки и сообщения прошлых семестров в архив"""
+    user = await db.get_user(message.from_user.id)
+    if not user or user.role != 'admin':
+        await message.answer("❌ У вас нет доступа к этой функции.")
+        return
+    
+    if archiver is None:
+        await message.answer("❌ Архивация по семестрам доступна только для базы SQLite.")
+        return
+    
+    if archiver.running:
+        await message.answer("⏳ Архивация уже выполняется.")
+        return
+    
+    task = archiver.start()
+    await message.answer("🗄 Архивация прошлых семестров запущена.")
+    moved = await task
+    
+    if not moved:
+        await message.answer("🗄 Архивация завершена: переносить нечего.")
+        return
+    
+    lines = [f"• {name}: {count}" for name, count in sorted(moved.items())]
+    await message.answer("🗄 Архивация завершена, перенесено строк:\n" + "\n".join(lines))
+
+
+@router.message(Command("backup"))
+async def backup_now(message: Message, db: Database, backups: Optional[BackupManager]):
+    """Снять резервную копию базы"""
+    user = await db.get_user(message.from_user.id)
+    if not user or user.role != 'admin':
+        await message.answer("❌ У вас нет доступа к этой функции.")
+        return
+    
+    if backups is None:
+        await message.answer("❌ Резервное копирование встроено только для базы SQLite; для PostgreSQL используйте pg_dump.")
+        return
+    
+    status = backups.status()
+    if status['running']:
+        await message.answer(f"⏳ Копирование уже выполняется: {status['progress'] or 0:.0%}")
+        return
+    
+    task = backups.start()
+    await message.answer("💾 Резервное копирование запущено.")
+    try:
+        info = await task
+    except Exception as e:
+        await message.answer(f"❌ Не удалось снять копию: {e}")
+        return
+    
+    await message.answer(
+        "💾 Копия готова\n\n"
+        f"Файл: {info.path}\n"
+        f"Размер: {info.size / 2 ** 20:.1f} МБ\n"
+        f"Всего копий: {backups.status()['count']}"
+    )
+
+
+@router.message(Command("audit"))
+async def view_audit_log(message: Message, command: CommandObject, db: Database, audit: AuditLog,
+                         user_loader: UserLoader):
+    """Журнал действий: /audit — последние, /audit ID — действия пользователя и над ним"""
+    user = await db.get_user(message.from_user.id)
+    if not user or user.role != 'admin':
+        await message.answer("❌ У вас нет доступа к этой функции.")
+        return
+    
+    target = (command.args or "").strip()
+    if target and not target.isdigit():
+        await message.answer("❌ Укажите ID пользователя: /audit 123456789")
+        return
+    
+    # Показываем и записи, которые ещё ждут пакетной записи
+    await audit.flush()
+    if not target:
+        sections = [("📜 Последние действия", await db.get_audit_log(limit=20))]
+    else:
+        user_id = int(target)
+        sections = [
+            ("📜 Действия пользователя", await db.get_audit_log(actor_id=user_id, limit=10)),
+            ("📜 Действия над пользователем", await db.get_audit_log(target_id=user_id, limit=10)),
+        ]
+    
+    ids = {uid for _, entries in sections for item in entries for uid in (item.actor_id, item.target_id)}
+    ids.discard(None)
+    users = await user_loader.load_many(sorted(ids))
+    names = {item.user_id: item.full_name for item in users if item}
+    text = "\n\n".join(format_audit_log(entries, names, title) for title, entries in sections)
+    if len(text) > 4000:
+        text = text[:4000] + "\n…"
+    await message.answer(text)
+
+
+@router.message(Command("audit_export"))
+async def export_audit_log(message: Message, command: CommandObject, db: Database, audit: AuditLog):
+    """Выгрузить журнал действий файлом JSON Lines: /audit_export [дней]"""
+    user = await db.get_user(message.from_user.id)
+    if not user or user.role != 'admin':
+        await message.answer("❌ У вас нет доступа к этой функции.")
+        return
+    
+    days = (command.args or "").strip()
+    if days and not days.isdigit():
+        await message.answer("❌ Укажите число дней: /audit_export 30")
+        return
+    start = now() - int(days) * 86400 if days else None
+    
+    await audit.flush()
+    # Записи идут из базы курсором прямо в файл, не собираясь в памяти
+    fd, path = tempfile.mkstemp(suffix=".jsonl")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            count = await export_jsonl(db, f.write, start)
+        if not count:
+            await message.answer("📭 Записей за этот период нет.")
+            return
+        await message.answer_document(
+            FSInputFile(path, filename="audit.jsonl"),
+            caption=f"📜 Журнал действий: {count} записей"
+        )
+    finally:
+        os.remove(path)
+
+
+@router.callback_query(UserCallback.filter(F.action == UserAction.MANAGE_TEACHER))
+async def teacher_action(callback: CallbackQuery, callback_data: UserCallback, state: FSMContext):
     """Обработка действий с учителем"""
-    teacher_id = int(callback.data.split("_")[-1])
+    teacher_id = callback_data.user_id
     await state.update_data(target_user_id=teacher_id)
     
     await callback.message.edit_text(
@@ -214,10 +547,10 @@ async def teacher_action(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("student_action_"))
-async def student_action(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(UserCallback.filter(F.action == UserAction.MANAGE_STUDENT))
+async def student_action(callback: CallbackQuery, callback_data: UserCallback, state: FSMContext):
     """Обработка действий со студентом"""
-    student_id = int(callback.data.split("_")[-1])
+    student_id = callback_data.user_id
     await state.update_data(target_user_id=student_id)
     
     await callback.message.edit_text(
@@ -227,23 +560,24 @@ async def student_action(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(F.data == "add_to_group")
+@router.callback_query(AdminCallback.filter(F.action == AdminAction.ADD_TO_GROUP))
 async def add_to_group_start(callback: CallbackQuery, db: Database, state: FSMContext):
     """Начать добавление пользователя в группу"""
-    groups = await db.get_all_groups()
+    groups = db.snapshot.groups
     if not groups:
         await callback.answer("Нет доступных групп.", show_alert=True)
         return
     
     await callback.message.edit_text(
         "Выберите группу:",
-        reply_markup=get_groups_keyboard(groups, "group_add")
+        reply_markup=get_groups_keyboard(groups, GroupAction.ADD_USER)
     )
     await callback.answer()
 
 
-@router.callback_query(F.data == "remove_from_group")
-async def remove_from_group_process(callback: CallbackQuery, db: Database, state: FSMContext):
+@router.callback_query(AdminCallback.filter(F.action == AdminAction.REMOVE_FROM_GROUP))
+async def remove_from_group_process(callback: CallbackQuery, db: Database, state: FSMContext, user_loader: UserLoader,
+                                     audit: AuditLog):
     """Удалить пользователя из группы"""
     data = await state.get_data()
     target_user_id = data.get('target_user_id')
@@ -253,9 +587,14 @@ async def remove_from_group_process(callback: CallbackQuery, db: Database, state
         return
     
     try:
+        # Загружаем до изменения, чтобы сохранить в журнале прежнюю группу
+        user = await user_loader.load(target_user_id)
         await db.delete_user_from_group(target_user_id)
-        user = await db.get_user(target_user_id)
-        user_name = user['full_name'] if user else "Пользователь"
+        audit.record(
+            callback.from_user.id, AuditAction.REMOVE_FROM_GROUP, target_user_id,
+            group_id=user.group_id if user else None
+        )
+        user_name = user.full_name if user else "Пользователь"
         await callback.message.edit_text(f"✅ Пользователь {user_name} удален из группы!")
     except Exception as e:
         await callback.message.edit_text(f"❌ Ошибка: {e}")
@@ -264,10 +603,11 @@ async def remove_from_group_process(callback: CallbackQuery, db: Database, state
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("group_add_"))
-async def add_to_group_process(callback: CallbackQuery, db: Database, state: FSMContext):
+@router.callback_query(GroupCallback.filter(F.action == GroupAction.ADD_USER))
+async def add_to_group_process(callback: CallbackQuery, callback_data: GroupCallback, db: Database, state: FSMContext,
+                               user_loader: UserLoader, audit: AuditLog):
     """Добавить пользователя в группу"""
-    group_id = int(callback.data.split("_")[-1])
+    group_id = callback_data.group_id
     data = await state.get_data()
     target_user_id = data.get('target_user_id')
     
@@ -276,11 +616,15 @@ async def add_to_group_process(callback: CallbackQuery, db: Database, state: FSM
         return
     
     try:
+        user = await user_loader.load(target_user_id)
         await db.update_user_group(target_user_id, group_id)
-        user = await db.get_user(target_user_id)
-        group = await db.get_group_by_id(group_id)
-        group_name = group['group_name'] if group else "Группа"
-        user_name = user['full_name'] if user else "Пользователь"
+        group = db.snapshot.groups_by_id.get(group_id)
+        group_name = group.group_name if group else "Группа"
+        audit.record(
+            callback.from_user.id, AuditAction.ADD_TO_GROUP, target_user_id,
+            group_id=group_id, group_name=group_name, previous_group_id=user.group_id if user else None
+        )
+        user_name = user.full_name if user else "Пользователь"
         await callback.message.edit_text(f"✅ Пользователь {user_name} добавлен в группу {group_name}!")
     except Exception as e:
         await callback.message.edit_text(f"❌ Ошибка: {e}")
@@ -289,8 +633,9 @@ async def add_to_group_process(callback: CallbackQuery, db: Database, state: FSM
     await callback.answer()
 
 
-@router.callback_query(F.data == "set_teacher_role")
-async def set_teacher_role(callback: CallbackQuery, db: Database, state: FSMContext):
+@router.callback_query(AdminCallback.filter(F.action == AdminAction.SET_TEACHER))
+async def set_teacher_role(callback: CallbackQuery, db: Database, state: FSMContext, user_loader: UserLoader,
+                           tasks: BackgroundTasks, audit: AuditLog):
     """Назначить пользователя учителем"""
     data = await state.get_data()
     target_user_id = data.get('target_user_id')
@@ -300,19 +645,22 @@ async def set_teacher_role(callback: CallbackQuery, db: Database, state: FSMCont
         return
     
     try:
+        user = await user_loader.load(target_user_id)
         await db.update_user_role(target_user_id, "teacher")
-        user = await db.get_user(target_user_id)
-        user_name = user['full_name'] if user else "Пользователь"
+        audit.record(
+            callback.from_user.id, AuditAction.SET_TEACHER, target_user_id, previous_role=user.role if user else None
+        )
+        user_name = user.full_name if user else "Пользователь"
         await callback.message.edit_text(f"✅ Пользователь {user_name} теперь учитель!")
         
         # Уведомляем пользователя
-        try:
-            await callback.message.bot.send_message(
+        tasks.spawn(
+            callback.message.bot.send_message(
                 target_user_id,
                 "🎉 Вас назначили учителем! Используйте /start для обновления меню."
-            )
-        except Exception:
-            pass
+            ),
+            name="role_notification"
+        )
     except Exception as e:
         await callback.message.edit_text(f"❌ Ошибка: {e}")
     
@@ -320,8 +668,9 @@ async def set_teacher_role(callback: CallbackQuery, db: Database, state: FSMCont
     await callback.answer()
 
 
-@router.callback_query(F.data == "set_student_role")
-async def set_student_role(callback: CallbackQuery, db: Database, state: FSMContext):
+@router.callback_query(AdminCallback.filter(F.action == AdminAction.SET_STUDENT))
+async def set_student_role(callback: CallbackQuery, db: Database, state: FSMContext, user_loader: UserLoader,
+                           tasks: BackgroundTasks, audit: AuditLog):
     """Назначить пользователя студентом"""
     data = await state.get_data()
     target_user_id = data.get('target_user_id')
@@ -331,19 +680,22 @@ async def set_student_role(callback: CallbackQuery, db: Database, state: FSMCont
         return
     
     try:
+        user = await user_loader.load(target_user_id)
         await db.update_user_role(target_user_id, "student")
-        user = await db.get_user(target_user_id)
-        user_name = user['full_name'] if user else "Пользователь"
+        audit.record(
+            callback.from_user.id, AuditAction.SET_STUDENT, target_user_id, previous_role=user.role if user else None
+        )
+        user_name = user.full_name if user else "Пользователь"
         await callback.message.edit_text(f"✅ Пользователь {user_name} теперь студент!")
         
         # Уведомляем пользователя
-        try:
-            await callback.message.bot.send_message(
+        tasks.spawn(
+            callback.message.bot.send_message(
                 target_user_id,
                 "ℹ️ Ваша роль изменена на студента. Используйте /start для обновления меню."
-            )
-        except Exception:
-            pass
+            ),
+            name="role_notification"
+        )
     except Exception as e:
         await callback.message.edit_text(f"❌ Ошибка: {e}")
     
@@ -351,21 +703,9 @@ async def set_student_role(callback: CallbackQuery, db: Database, state: FSMCont
     await callback.answer()
 
 
-@router.callback_query(F.data == "cancel")
-async def cancel_action(callback: CallbackQuery):
+@router.callback_query(CancelCallback.filter())
+async def cancel_action(callback: CallbackQuery, state: FSMContext):
     """Отменить действие"""
+    await state.clear()
     await callback.message.delete()
     await callback.answer()
-
-
-@router.message(F.text == "❌ Отмена")
-async def cancel_text(message: Message, state: FSMContext, db: Database):
-    """Отменить действие (текстовое)"""
-    user = await db.get_user(message.from_user.id)
-    role = user['role'] if user else "student"
-    await message.answer(
-        "❌ Действие отменено.",
-        reply_markup=get_main_menu(role)
-    )
-    await state.clear()
-
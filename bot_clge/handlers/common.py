@@ -22,7 +22,7 @@ async def cmd_start(message: Message, db: Database):
         await db.add_user(user_id, username, full_name, role="student")
         role = "student"
     else:
-        role = user['role']
+        role = user.role
     
     welcome_text = f"👋 Добро пожаловать, {full_name}!\n\n"
     
@@ -48,7 +48,7 @@ async def cmd_help(message: Message, db: Database):
         await message.answer("Сначала используйте /start для регистрации.")
         return
     
-    role = user['role']
+    role = user.role
     help_text = "📖 Справка по использованию бота:\n\n"
     
     if role == "admin":
@@ -57,18 +57,32 @@ async def cmd_help(message: Message, db: Database):
 • 👨‍🎓 Управление студентами - добавление/удаление студентов из групп
 • 📚 Управление группами - создание новых групп
 • 📢 Рассылка - отправка сообщений всем пользователям
-• 👤 Добавить администратора - назначение новых администраторов"""
+• 👤 Добавить администратора - назначение новых администраторов
+• 📈 Аналитика - средние баллы, распределение отметок и неуспевающие по группе
+• 📄 Отчёты - журнал отметок и расписание группы файлом XLSX
+• /tasks_status - фоновые уведомления и рассылки: очередь и ошибки
+• /tenant_status - нагрузка и ресурсы бота колледжа
+• /groups - список групп, перевод на следующий курс, слияние, разделение, архив
+• /audit [ID] - журнал действий администраторов
+• /audit_export [дней] - выгрузить журнал файлом
+• /archive - перенести отметки и сообщения прошлых семестров в архив
+• /backup - снять резервную копию базы"""
     elif role == "teacher":
         help_text += """👨‍🏫 Функции учителя:
 • 📝 Поставить отметку - выставить оценку студенту
 • 📅 Добавить расписание - добавить урок в расписание группы
 • 📨 Отправить сообщение студенту - отправить личное сообщение
-• 📊 Посмотреть расписание - просмотр расписания группы"""
+• 📊 Посмотреть расписание - просмотр расписания группы
+• 📬 Сообщения - диалоги со студентами и непрочитанные сообщения
+• 📄 Отчёты - журнал отметок и расписание группы файлом XLSX"""
     elif role == "student":
         help_text += """👨‍🎓 Функции студента:
 • 📅 Расписание - просмотр расписания вашей группы
 • 📊 Мои отметки - просмотр всех ваших оценок
-• 📨 Написать учителю - отправить сообщение учителю"""
+• 📨 Написать учителю - отправить сообщение учителю
+• 🔔 Напоминания - включить/выключить напоминания о начале урока
+• 📬 Сообщения - диалоги с учителями и непрочитанные сообщения
+• /old_grades - отметки за прошлые семестры"""
     
     await message.answer(help_text)
 
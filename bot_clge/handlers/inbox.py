@@ -0,0 +1,92 @@
+from typing import Optional
+from aiogram import Router, F
+from aiogram.types import Message, CallbackQuery
+from aiogram.fsm.context import FSMContext
+from database import Database, UserLoader, User
+from keyboards import (
+    get_cancel_keyboard, get_inbox_keyboard, get_conversation_keyboard,
+    INBOX_TEXT, InboxAction, InboxCallback
+)
+from utils import format_conversation
+from .menu import menu
+from .teacher import TeacherStates
+from .student import StudentStates
+
+router = Router()
+
+PAGE_SIZE = 10
+
+
+async def inbox_text(db: Database, user_id: int) -> str:
+    unread = await db.get_unread_count(user_id)
+    return f"📬 Ваши диалоги\n\nНепрочитанных сообщений: {unread}"
+
+
+@menu.button("teacher", INBOX_TEXT, throttling="inbox")
+@menu.button("student", INBOX_TEXT, throttling="inbox")
+async def open_inbox(message: Message, db: Database):
+    """Список диалогов с числом непрочитанных"""
+    threads = await db.get_threads(message.from_user.id)
+    if not threads:
+        await message.answer("📭 Сообщений пока нет.")
+        return
+
+    await message.answer(
+        await inbox_text(db, message.from_user.id),
+        reply_markup=get_inbox_keyboard(threads)
+    )
+
+
+@router.callback_query(InboxCallback.filter(F.action == InboxAction.LIST), flags={"throttling": "inbox"})
+async def back_to_inbox(callback: CallbackQuery, db: Database):
+    """Вернуться к списку диалогов"""
+    threads = await db.get_threads(callback.from_user.id)
+    await callback.message.edit_text(
+        await inbox_text(db, callback.from_user.id),
+        reply_markup=get_inbox_keyboard(threads)
+    )
+    await callback.answer()
+
+
+@router.callback_query(InboxCallback.filter(F.action.in_({InboxAction.OPEN, InboxAction.OLDER})), flags={"throttling": "inbox"})
+async def show_conversation(callback: CallbackQuery, callback_data: InboxCallback, db: Database,
+                            user_loader: UserLoader):
+    """Страница переписки с собеседником"""
+    user_id = callback.from_user.id
+    counterpart_id = callback_data.user_id
+    # Лишнее сообщение показывает, есть ли страница раньше
+    page = await db.get_conversation(
+        user_id, counterpart_id, before_id=callback_data.before_id or None, limit=PAGE_SIZE + 1
+    )
+    older_id = page[PAGE_SIZE - 1].message_id if len(page) > PAGE_SIZE else 0
+    page = page[:PAGE_SIZE]
+
+    if callback_data.action == InboxAction.OPEN:
+        await db.mark_thread_read(user_id, counterpart_id)
+
+    counterpart = await user_loader.load(counterpart_id)
+    name = counterpart.full_name if counterpart else str(counterpart_id)
+    await callback.message.edit_text(
+        format_conversation(page, user_id, name),
+        reply_markup=get_conversation_keyboard(counterpart_id, older_id)
+    )
+    await callback.answer()
+
+
+@router.callback_query(InboxCallback.filter(F.action == InboxAction.REPLY))
+async def reply_in_conversation(callback: CallbackQuery, callback_data: InboxCallback, state: FSMContext,
+                                user_loader: UserLoader):
+    """Ответить собеседнику: дальше работает обычная отправка сообщения"""
+    user: Optional[User] = await user_loader.load(callback.from_user.id)
+    if user and user.role == 'teacher':
+        await state.update_data(student_id=callback_data.user_id)
+        await state.set_state(TeacherStates.waiting_for_message_text)
+    elif user and user.role == 'student':
+        await state.update_data(teacher_id=callback_data.user_id)
+        await state.set_state(StudentStates.waiting_for_message_text)
+    else:
+        await callback.answer("❌ У вас нет доступа к этой функции.", show_alert=True)
+        return
+
+    await callback.message.answer("📨 Введите сообщение:", reply_markup=get_cancel_keyboard())
+    await callback.answer()
@@ -0,0 +1,28 @@
+from aiogram import Router
+from aiogram.types import InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+from utils import ScheduleSearch
+
+router = Router()
+
+
+@router.inline_query()
+async def inline_schedule(inline_query: InlineQuery, schedule_search: ScheduleSearch):
+    """Расписание групп по началу названия: «@бот ИС-2» в любом чате"""
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+    cards, next_offset = schedule_search.search(inline_query.query, offset)
+    results = [
+        InlineQueryResultArticle(
+            id=str(card.group.group_id),
+            title=card.group.group_name,
+            description=f"Уроков в неделю: {card.lessons}" if card.lessons else "Расписание пока не добавлено",
+            input_message_content=InputTextMessageContent(message_text=card.text)
+        )
+        for card in cards
+    ]
+    # Расписание одинаково для всех, поэтому повторный запрос Telegram отдаёт из своего кэша
+    await inline_query.answer(
+        results,
+        cache_time=schedule_search.cache_time,
+        is_personal=False,
+        next_offset=str(next_offset) if next_offset is not None else ""
+    )
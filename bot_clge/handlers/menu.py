@@ -0,0 +1,85 @@
+import inspect
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from aiogram import Router
+from aiogram.types import Message
+from aiogram.fsm.context import FSMContext
+from database import Database, User
+from keyboards import MAIN_MENU, CANCEL_TEXT, get_main_menu
+
+Handler = Callable[..., Awaitable[Any]]
+
+# Обработчик для пользователя с любой ролью (и без регистрации)
+ANY_ROLE = "*"
+
+
+class MenuDispatcher:
+    """Маршрутизация кнопок главного меню одним поиском в словаре.
+
+    Вместо цепочки фильтров F.text == "..." по всем роутерам на каждый
+    апдейт кнопка ищется в словаре текст -> {роль: обработчик}, затем
+    один раз загружается пользователь и вызывается обработчик его роли.
+    Обработчик получает пользователя в аргументе user, а остальные
+    аргументы (db, state, ...) — так же, как обычный обработчик aiogram.
+    Кнопки регистрируются по таблице MAIN_MENU, из которой строится
+    get_main_menu, поэтому меню и обработчики не расходятся. Маршрут
+    ограничения частоты (ThrottlingMiddleware) задаётся для кнопки
+    параметром throttling.
+    """
+
+    def __init__(self, menu_table: Dict[str, Tuple[str, ...]] = MAIN_MENU, name: str = "menu"):
+        self.menu_table = menu_table
+        self._routes: Dict[str, Dict[str, Handler]] = {}
+        self._params: Dict[Handler, frozenset] = {}
+        self._throttling: Dict[str, str] = {}
+        self.router = Router(name=name)
+        self.router.message.register(self._dispatch, self.is_menu_text, flags={"throttling": self.throttling_route})
+
+    def is_menu_text(self, message: Message) -> bool:
+        return message.text in self._routes
+
+    def throttling_route(self, message: Message) -> Optional[str]:
+        return self._throttling.get(message.text)
+
+    def button(self, role: str, text: str, throttling: Optional[str] = None) -> Callable[[Handler], Handler]:
+        """Зарегистрировать обработчик кнопки главного меню для роли"""
+        if role != ANY_ROLE and text not in self.menu_table.get(role, ()):
+            raise ValueError(f"Кнопки '{text}' нет в меню роли '{role}'")
+        if throttling is not None:
+            self._throttling[text] = throttling
+
+        def decorator(handler: Handler) -> Handler:
+            routes = self._routes.setdefault(text, {})
+            if role in routes:
+                raise ValueError(f"Кнопка '{text}' уже зарегистрирована для роли '{role}'")
+            routes[role] = handler
+            self._params[handler] = frozenset(inspect.signature(handler).parameters)
+            return handler
+
+        return decorator
+
+    async def _dispatch(self, message: Message, db: Database, **data: Any) -> Any:
+        routes = self._routes[message.text]
+        user = await db.get_user(message.from_user.id)
+        handler = routes.get(user.role if user else None) or routes.get(ANY_ROLE)
+        if handler is None:
+            await message.answer("❌ У вас нет доступа к этой функции.")
+            return
+
+        data.update(db=db, user=user)
+        params = self._params[handler]
+        return await handler(message, **{name: value for name, value in data.items() if name in params})
+
+
+menu = MenuDispatcher()
+router = menu.router
+
+
+@menu.button(ANY_ROLE, CANCEL_TEXT)
+async def cancel_action(message: Message, state: FSMContext, user: Optional[User]):
+    """Отменить действие"""
+    role = user.role if user else "student"
+    await message.answer(
+        "❌ Действие отменено.",
+        reply_markup=get_main_menu(role)
+    )
+    await state.clear()
@@ -0,0 +1,75 @@
+from aiogram import Router, F, Bot
+from aiogram.types import Message, CallbackQuery
+from database import Database, UserLoader
+from keyboards import (
+    get_groups_keyboard, get_report_kinds_keyboard,
+    REPORTS_TEXT, GroupAction, GroupCallback, ReportKind, ReportCallback
+)
+from reports import ReportManager, ReportJob
+from .menu import menu
+
+router = Router()
+
+
+@menu.button("admin", REPORTS_TEXT, throttling="reports")
+@menu.button("teacher", REPORTS_TEXT, throttling="reports")
+async def choose_report_group(message: Message, db: Database):
+    """Выбрать группу для отчёта"""
+    groups = db.snapshot.groups
+    if not groups:
+        await message.answer("📭 Групп пока нет.")
+        return
+    
+    await message.answer(
+        "📄 Выберите группу:",
+        reply_markup=get_groups_keyboard(groups, GroupAction.REPORTS)
+    )
+
+
+@router.callback_query(GroupCallback.filter(F.action == GroupAction.REPORTS), flags={"throttling": "reports"})
+async def choose_report_kind(callback: CallbackQuery, callback_data: GroupCallback):
+    """Выбрать вид отчёта"""
+    await callback.message.edit_text(
+        "📄 Какой отчёт выгрузить?",
+        reply_markup=get_report_kinds_keyboard(callback_data.group_id)
+    )
+    await callback.answer()
+
+
+@router.callback_query(ReportCallback.filter(), flags={"throttling": "reports"})
+async def send_report(callback: CallbackQuery, callback_data: ReportCallback, bot: Bot, db: Database,
+                      user_loader: UserLoader, reports: ReportManager):
+    """Сформировать отчёт и отправить файлом, показывая ход работы"""
+    user = await user_loader.load(callback.from_user.id)
+    if not user or user.role not in ('admin', 'teacher'):
+        await callback.answer("❌ У вас нет доступа к этой функции.", show_alert=True)
+        return
+    
+    group = db.snapshot.groups_by_id.get(callback_data.group_id)
+    if not group:
+        await callback.answer("Группа не найдена.", show_alert=True)
+        return
+    await callback.answer()
+    
+    shown = {'text': None}
+    
+    async def show_progress(job: ReportJob):
+        text = job.describe()
+        if job.stage == 'queued':
+            status = reports.status()
+            text += f"\nФормируется отчётов: {status['active']} из {status['max_jobs']}"
+        if text != shown['text']:
+            shown['text'] = text
+            await callback.message.edit_text(text)
+    
+    send = reports.send_gradebook if callback_data.kind == ReportKind.GRADEBOOK else reports.send_schedule
+    try:
+        cached = await send(bot, callback.from_user.id, group.group_id, group.group_name, show_progress)
+    except Exception as e:
+        await callback.message.edit_text(f"❌ Не удалось сформировать отчёт: {e}")
+        return
+    
+    if cached:
+        await callback.message.edit_text("✅ Данные не менялись — отправлен готовый файл.")
+    else:
+        await callback.message.edit_text("✅ Отчёт готов.")
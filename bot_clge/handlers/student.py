@@ -1,11 +1,19 @@
-from aiogram import Router, F
+from aiogram import Bot, Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from database import Database
-from keyboards import get_main_menu, get_cancel_keyboard, get_users_keyboard
+from aiogram.filters import Command, CommandObject
+from typing import List, Optional, Tuple
+from datetime import date
+from database import Database, Archiver, User
+from database.periods import now, week_range, month_range, term_range
+from keyboards import (
+    get_main_menu, get_cancel_keyboard, get_users_keyboard, get_grade_periods_keyboard,
+    UserAction, UserCallback, GradePeriod, GradesCallback, GRADE_PERIODS
+)
+from scheduler import BackgroundTasks
 from utils import format_schedule, format_grades
-from datetime import datetime
+from .menu import menu
 
 router = Router()
 
@@ -15,19 +23,14 @@ class StudentStates(StatesGroup):
     waiting_for_message_text = State()
 
 
-@router.message(F.text == "📅 Расписание")
-async def view_schedule_student(message: Message, db: Database):
+@menu.button("student", "📅 Расписание")
+async def view_schedule_student(message: Message, db: Database, user: User):
     """Просмотр расписания (для студента)"""
-    user = await db.get_user(message.from_user.id)
-    if not user or user['role'] != 'student':
-        await message.answer("❌ У вас нет доступа к этой функции.")
-        return
-    
-    if not user.get('group_id'):
+    if not user.group_id:
         await message.answer("❌ Вы не привязаны к группе. Обратитесь к администратору.")
         return
     
-    schedule = await db.get_schedule_by_group(user['group_id'])
+    schedule = db.snapshot.get_schedule(user.group_id)
     
     if not schedule:
         await message.answer("📭 Расписание для вашей группы пока не добавлено.")
@@ -37,51 +40,91 @@ async def view_schedule_student(message: Message, db: Database):
     await message.answer(schedule_text)
 
 
-@router.message(F.text == "📊 Мои отметки")
-async def view_grades_student(message: Message, db: Database):
+async def grades_for_period(db: Database, student_id: int, period: GradePeriod,
+                            term_starts: List[Tuple[int, int]]) -> str:
+    """Текст с отметками студента за период"""
+    today = date.today()
+    if period == GradePeriod.WEEK:
+        bounds = week_range(today)
+    elif period == GradePeriod.MONTH:
+        bounds = month_range(today)
+    elif period == GradePeriod.TERM:
+        bounds = term_range(today, term_starts)
+    else:
+        return format_grades(await db.get_grades_by_student(student_id))
+    grades = await db.get_grades_between(student_id, *bounds)
+    return format_grades(grades, empty=f"За период «{GRADE_PERIODS[period]}» отметок нет.")
+
+
+@menu.button("student", "📊 Мои отметки", throttling="grades")
+async def view_grades_student(message: Message, db: Database, term_starts: List[Tuple[int, int]]):
     """Просмотр отметок (для студента)"""
-    user = await db.get_user(message.from_user.id)
-    if not user or user['role'] != 'student':
-        await message.answer("❌ У вас нет доступа к этой функции.")
+    grades_text = await grades_for_period(db, message.from_user.id, GradePeriod.ALL, term_starts)
+    await message.answer(grades_text, reply_markup=get_grade_periods_keyboard(GradePeriod.ALL))
+
+
+@router.callback_query(GradesCallback.filter(), flags={"throttling": "grades"})
+async def view_grades_for_period(callback: CallbackQuery, callback_data: GradesCallback, db: Database,
+                                 term_starts: List[Tuple[int, int]]):
+    """Отметки за неделю, месяц, семестр или за всё время"""
+    grades_text = await grades_for_period(db, callback.from_user.id, callback_data.period, term_starts)
+    await callback.message.edit_text(grades_text, reply_markup=get_grade_periods_keyboard(callback_data.period))
+    await callback.answer()
+
+
+@router.message(Command("old_grades"), flags={"throttling": "grades"})
+async def view_archived_grades(message: Message, command: CommandObject, archiver: Optional[Archiver]):
+    """Отметки за прошлый семестр: /old_grades ГГГГ-ММ"""
+    terms = archiver.archived_terms() if archiver else []
+    if not command.args:
+        if not terms:
+            await message.answer("📭 Архивных семестров пока нет.")
+        else:
+            await message.answer(
+                "🗄 Архивные семестры: " + ", ".join(terms) +
+                "\n\nОтметки за семестр: /old_grades " + terms[-1]
+            )
         return
     
-    grades = await db.get_grades_by_student(message.from_user.id)
-    grades_text = format_grades(grades)
-    await message.answer(grades_text)
+    term = command.args.strip()
+    if term not in terms:
+        await message.answer("❌ Такого семестра нет в архиве.")
+        return
+    
+    grades = await archiver.get_archived_grades(message.from_user.id, term)
+    await message.answer(f"🗄 Семестр {term}\n\n" + format_grades(grades))
 
 
-@router.message(F.text == "📨 Написать учителю")
-async def start_write_to_teacher(message: Message, state: FSMContext, db: Database):
-    """Начать отправку сообщения учителю"""
-    user = await db.get_user(message.from_user.id)
-    if not user or user['role'] != 'student':
-        await message.answer("❌ У вас нет доступа к этой функции.")
-        return
+@menu.button("student", "🔔 Напоминания")
+async def toggle_reminders(message: Message, db: Database):
+    """Включить/выключить напоминания о начале урока"""
+    enabled = not await db.get_reminders_enabled(message.from_user.id)
+    await db.set_reminders(message.from_user.id, enabled)
     
-    if not user.get('group_id'):
+    if enabled:
+        await message.answer("🔔 Напоминания включены. Мы напомним о каждом уроке незадолго до начала.")
+    else:
+        await message.answer("🔕 Напоминания выключены.")
+
+
+@menu.button("student", "📨 Написать учителю")
+async def start_write_to_teacher(message: Message, state: FSMContext, db: Database, user: User):
+    """Начать отправку сообщения учителю"""
+    if not user.group_id:
         await message.answer("❌ Вы не привязаны к группе.")
         return
     
     # Получаем учителей группы из расписания
-    schedule = await db.get_schedule_by_group(user['group_id'])
+    schedule = db.snapshot.get_schedule(user.group_id)
     
     if not schedule:
         await message.answer("📭 В вашей группе пока нет учителей.")
         return
     
-    # Собираем уникальных учителей
-    teachers_dict = {}
-    for item in schedule:
-        teacher_id = item['teacher_id']
-        if teacher_id not in teachers_dict:
-            teachers_dict[teacher_id] = item.get('teacher_name', 'Учитель')
-    
-    # Формируем список учителей
-    teachers = []
-    for teacher_id, teacher_name in teachers_dict.items():
-        teacher_user = await db.get_user(teacher_id)
-        if teacher_user:
-            teachers.append(teacher_user)
+    # Собираем уникальных учителей из снимка, без запросов к БД
+    teachers_by_id = db.snapshot.teachers_by_id
+    teacher_ids = dict.fromkeys(item.teacher_id for item in schedule)
+    teachers = [teachers_by_id[teacher_id] for teacher_id in teacher_ids if teacher_id in teachers_by_id]
     
     if not teachers:
         await message.answer("📭 Учителей не найдено.")
@@ -89,15 +132,15 @@ async def start_write_to_teacher(message: Message, state: FSMContext, db: Databa
     
     await message.answer(
         "👨‍🏫 Выберите учителя:",
-        reply_markup=get_users_keyboard(teachers, "message_teacher")
+        reply_markup=get_users_keyboard(teachers, UserAction.MESSAGE_TEACHER)
     )
     await state.set_state(StudentStates.waiting_for_teacher)
 
 
-@router.callback_query(F.data.startswith("message_teacher_"), StudentStates.waiting_for_teacher)
-async def select_teacher_for_message(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(UserCallback.filter(F.action == UserAction.MESSAGE_TEACHER), StudentStates.waiting_for_teacher)
+async def select_teacher_for_message(callback: CallbackQuery, callback_data: UserCallback, state: FSMContext):
     """Выбрать учителя для сообщения"""
-    teacher_id = int(callback.data.split("_")[-1])
+    teacher_id = callback_data.user_id
     await state.update_data(teacher_id=teacher_id)
     await callback.message.edit_text(
         "📨 Введите сообщение для учителя:",
@@ -108,46 +151,35 @@ async def select_teacher_for_message(callback: CallbackQuery, state: FSMContext)
 
 
 @router.message(StudentStates.waiting_for_message_text, F.text != "❌ Отмена")
-async def send_message_to_teacher(message: Message, state: FSMContext, db: Database):
+async def send_message_to_teacher(message: Message, state: FSMContext, db: Database, tasks: BackgroundTasks):
     """Отправить сообщение учителю"""
     message_text = message.text
     data = await state.get_data()
     teacher_id = data['teacher_id']
     student_id = message.from_user.id
     
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
     try:
-        # Сохраняем сообщение в БД
-        await db.add_message(student_id, teacher_id, message_text, timestamp)
-        
-        # Отправляем учителю
-        student = await db.get_user(student_id)
-        student_name = student['full_name'] if student else "Студент"
-        
-        await message.bot.send_message(
-            teacher_id,
-            f"📨 Сообщение от студента {student_name}:\n\n{message_text}"
-        )
+        # Сохраняем сообщение в БД: оно уже есть во входящих учителя
+        await db.add_message(student_id, teacher_id, message_text, now())
         
         await message.answer(
             "✅ Сообщение успешно отправлено!",
             reply_markup=get_main_menu("student")
         )
+        
+        # Отправляем учителю в фоне
+        tasks.spawn(
+            deliver_to_teacher(message.bot, db, student_id, teacher_id, message_text),
+            name="message_to_teacher"
+        )
     except Exception as e:
         await message.answer(f"❌ Ошибка при отправке сообщения: {e}")
     
     await state.clear()
 
 
-@router.message(F.text == "❌ Отмена")
-async def cancel_student_action(message: Message, state: FSMContext, db: Database):
-    """Отменить действие"""
-    user = await db.get_user(message.from_user.id)
-    role = user['role'] if user else "student"
-    await message.answer(
-        "❌ Действие отменено.",
-        reply_markup=get_main_menu(role)
-    )
-    await state.clear()
-
+async def deliver_to_teacher(bot: Bot, db: Database, student_id: int, teacher_id: int, message_text: str):
+    """Переслать учителю сообщение студента"""
+    student = await db.get_user(student_id)
+    student_name = student.full_name if student else "Студент"
+    await bot.send_message(teacher_id, f"📨 Сообщение от студента {student_name}:\n\n{message_text}")
@@ -1,18 +1,34 @@
-from aiogram import Router, F
+from typing import Optional
+from aiogram import Bot, Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from database import Database
+from database.periods import now
+from database.schedule import TEACHER_SLOT
 from keyboards import (
     get_main_menu, get_cancel_keyboard, get_groups_keyboard,
-    get_users_keyboard, get_days_keyboard, get_lesson_numbers_keyboard
+    get_users_keyboard, get_days_keyboard, get_lesson_numbers_keyboard,
+    get_grades_keyboard, get_confirm_keyboard, UserAction, GroupAction, UserCallback, GroupCallback,
+    ConfirmCallback
 )
-from utils import get_day_number, format_schedule
-from datetime import datetime
+from scheduler import BackgroundTasks
+from utils import get_day_number, format_group_schedule, format_schedule_conflicts
+from .menu import menu
 
 router = Router()
 
 
+def pressed_button_text(callback: CallbackQuery) -> Optional[str]:
+    """Текст нажатой инлайн-кнопки — то, что пользователь видел в списке"""
+    markup = callback.message.reply_markup if callback.message else None
+    for row in markup.inline_keyboard if markup else ():
+        for button in row:
+            if button.callback_data == callback.data:
+                return button.text
+    return None
+
+
 class TeacherStates(StatesGroup):
     waiting_for_student = State()
     waiting_for_subject = State()
@@ -21,18 +37,14 @@ class TeacherStates(StatesGroup):
     waiting_for_day = State()
     waiting_for_lesson_number = State()
     waiting_for_subject_name = State()
+    confirming_schedule_replace = State()
     waiting_for_student_message = State()
     waiting_for_message_text = State()
 
 
-@router.message(F.text == "📝 Поставить отметку")
+@menu.button("teacher", "📝 Поставить отметку")
 async def start_add_grade(message: Message, state: FSMContext, db: Database):
     """Начать процесс выставления отметки"""
-    user = await db.get_user(message.from_user.id)
-    if not user or user['role'] != 'teacher':
-        await message.answer("❌ У вас нет доступа к этой функции.")
-        return
-    
     # Получаем всех студентов учителя
     students = await db.get_students_by_teacher(message.from_user.id)
     if not students:
@@ -41,16 +53,17 @@ async def start_add_grade(message: Message, state: FSMContext, db: Database):
     
     await message.answer(
         "👨‍🎓 Выберите студента:",
-        reply_markup=get_users_keyboard(students, "grade_student")
+        reply_markup=get_users_keyboard(students, UserAction.GRADE)
     )
     await state.set_state(TeacherStates.waiting_for_student)
 
 
-@router.callback_query(F.data.startswith("grade_student_"), TeacherStates.waiting_for_student)
-async def select_student_for_grade(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(UserCallback.filter(F.action == UserAction.GRADE), TeacherStates.waiting_for_student)
+async def select_student_for_grade(callback: CallbackQuery, callback_data: UserCallback, state: FSMContext):
     """Выбрать студента для оценки"""
-    student_id = int(callback.data.split("_")[-1])
-    await state.update_data(student_id=student_id)
+    student_id = callback_data.user_id
+    # Имя берётся из списка студентов, чтобы ответ об отметке не ждал запроса к базе
+    await state.update_data(student_id=student_id, student_name=pressed_button_text(callback))
     await callback.message.edit_text("📚 Введите название предмета:")
     await state.set_state(TeacherStates.waiting_for_subject)
     await callback.answer()
@@ -69,7 +82,7 @@ async def get_subject_for_grade(message: Message, state: FSMContext):
 
 
 @router.message(TeacherStates.waiting_for_grade, F.text != "❌ Отмена")
-async def add_grade(message: Message, state: FSMContext, db: Database):
+async def add_grade(message: Message, state: FSMContext, db: Database, tasks: BackgroundTasks):
     """Добавить оценку"""
     try:
         grade = int(message.text.strip())
@@ -81,26 +94,20 @@ async def add_grade(message: Message, state: FSMContext, db: Database):
         student_id = data['student_id']
         subject = data['subject']
         teacher_id = message.from_user.id
-        date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        await db.add_grade(student_id, teacher_id, subject, grade, date)
         
-        student = await db.get_user(student_id)
-        student_name = student['full_name'] if student else "Студент"
+        await db.add_grade(student_id, teacher_id, subject, grade, now())
+        student_name = data.get('student_name') or "Студент"
         
         await message.answer(
             f"✅ Оценка {grade} по предмету '{subject}' поставлена студенту {student_name}!",
             reply_markup=get_main_menu("teacher")
         )
         
-        # Уведомляем студента
-        try:
-            await message.bot.send_message(
-                student_id,
-                f"📊 Вам поставлена оценка {grade} по предмету '{subject}'."
-            )
-        except Exception:
-            pass
+        # Уведомляем студента уже после ответа учителю
+        tasks.spawn(
+            message.bot.send_message(student_id, f"📊 Вам поставлена оценка {grade} по предмету '{subject}'."),
+            name="grade_notification"
+        )
         
     except ValueError:
         await message.answer("❌ Оценка должна быть числом от 2 до 5.")
@@ -110,30 +117,25 @@ async def add_grade(message: Message, state: FSMContext, db: Database):
     await state.clear()
 
 
-@router.message(F.text == "📅 Добавить расписание")
+@menu.button("teacher", "📅 Добавить расписание")
 async def start_add_schedule(message: Message, state: FSMContext, db: Database):
     """Начать добавление расписания"""
-    user = await db.get_user(message.from_user.id)
-    if not user or user['role'] != 'teacher':
-        await message.answer("❌ У вас нет доступа к этой функции.")
-        return
-    
-    groups = await db.get_all_groups()
+    groups = db.snapshot.groups
     if not groups:
         await message.answer("📭 Групп пока нет. Обратитесь к администратору.")
         return
     
     await message.answer(
         "📚 Выберите группу:",
-        reply_markup=get_groups_keyboard(groups, "schedule_group")
+        reply_markup=get_groups_keyboard(groups, GroupAction.ADD_SCHEDULE)
     )
     await state.set_state(TeacherStates.waiting_for_group_schedule)
 
 
-@router.callback_query(F.data.startswith("schedule_group_"), TeacherStates.waiting_for_group_schedule)
-async def select_group_for_schedule(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(GroupCallback.filter(F.action == GroupAction.ADD_SCHEDULE), TeacherStates.waiting_for_group_schedule)
+async def select_group_for_schedule(callback: CallbackQuery, callback_data: GroupCallback, state: FSMContext):
     """Выбрать группу для расписания"""
-    group_id = int(callback.data.split("_")[-1])
+    group_id = callback_data.group_id
     await state.update_data(group_id=group_id)
     await callback.message.edit_text(
         "📅 Выберите день недели:",
@@ -192,66 +194,100 @@ async def add_schedule_item(message: Message, state: FSMContext, db: Database):
     teacher_id = message.from_user.id
     
     try:
-        await db.add_schedule(group_id, day_of_week, lesson_number, subject, teacher_id)
-        
-        groups = await db.get_all_groups()
-        group_name = next((g['group_name'] for g in groups if g['group_id'] == group_id), "Группа")
-        
+        conflicts = await db.add_schedule(group_id, day_of_week, lesson_number, subject, teacher_id)
+    except Exception as e:
+        await message.answer(f"❌ Ошибка при добавлении расписания: {e}")
+        await state.clear()
+        return
+    
+    group = db.snapshot.groups_by_id.get(group_id)
+    group_name = group.group_name if group else "Группа"
+    group_names = {g.group_id: g.group_name for g in db.snapshot.groups}
+    
+    if not conflicts:
         await message.answer(
             f"✅ Расписание успешно добавлено для группы {group_name}!",
             reply_markup=get_main_menu("teacher")
         )
-    except Exception as e:
-        await message.answer(f"❌ Ошибка при добавлении расписания: {e}")
+    elif any(item.kind == TEACHER_SLOT for item in conflicts):
+        await message.answer(
+            "❌ Урок не добавлен, накладка в расписании:\n" + format_schedule_conflicts(conflicts, group_names),
+            reply_markup=get_main_menu("teacher")
+        )
+    else:
+        # Слот группы занят другим уроком — заменить только после подтверждения
+        await state.update_data(subject=subject)
+        await state.set_state(TeacherStates.confirming_schedule_replace)
+        await message.answer(
+            "⚠️ Это время уже занято:\n" + format_schedule_conflicts(conflicts, group_names) +
+            f"\n\nЗаменить на {subject}?",
+            reply_markup=get_confirm_keyboard()
+        )
+        return
     
     await state.clear()
 
 
-@router.message(F.text == "📊 Посмотреть расписание")
-async def view_schedule_teacher(message: Message, db: Database):
-    """Просмотр расписания (для учителя)"""
-    user = await db.get_user(message.from_user.id)
-    if not user or user['role'] != 'teacher':
-        await message.answer("❌ У вас нет доступа к этой функции.")
+@router.callback_query(TeacherStates.confirming_schedule_replace, ConfirmCallback.filter())
+async def replace_schedule_item(callback: CallbackQuery, state: FSMContext, db: Database):
+    """Заменить урок в занятом слоте группы"""
+    data = await state.get_data()
+    await state.clear()
+    
+    try:
+        conflicts = await db.add_schedule(
+            data['group_id'], data['day_of_week'], data['lesson_number'], data['subject'], callback.from_user.id,
+            replace=True
+        )
+    except Exception as e:
+        await callback.message.edit_text(f"❌ Ошибка при добавлении расписания: {e}")
+        await callback.answer()
         return
     
-    groups = await db.get_all_groups()
+    if conflicts:
+        group_names = {g.group_id: g.group_name for g in db.snapshot.groups}
+        await callback.message.edit_text(
+            "❌ Урок не добавлен, накладка в расписании:\n" + format_schedule_conflicts(conflicts, group_names)
+        )
+    else:
+        await callback.message.edit_text("✅ Урок заменён.")
+    await callback.answer()
+
+
+@menu.button("teacher", "📊 Посмотреть расписание")
+async def view_schedule_teacher(message: Message, db: Database):
+    """Просмотр расписания (для учителя)"""
+    groups = db.snapshot.groups
     if not groups:
         await message.answer("📭 Групп пока нет.")
         return
     
     await message.answer(
         "📚 Выберите группу для просмотра расписания:",
-        reply_markup=get_groups_keyboard(groups, "view_schedule_group")
+        reply_markup=get_groups_keyboard(groups, GroupAction.VIEW_SCHEDULE)
     )
 
 
-@router.callback_query(F.data.startswith("view_schedule_group_"))
-async def show_schedule_for_group(callback: CallbackQuery, db: Database):
+@router.callback_query(GroupCallback.filter(F.action == GroupAction.VIEW_SCHEDULE))
+async def show_schedule_for_group(callback: CallbackQuery, callback_data: GroupCallback, db: Database):
     """Показать расписание группы"""
-    group_id = int(callback.data.split("_")[-1])
-    schedule = await db.get_schedule_by_group(group_id)
+    group_id = callback_data.group_id
+    schedule = db.snapshot.get_schedule(group_id)
     
     if not schedule:
         await callback.answer("Расписание для этой группы пока не добавлено.", show_alert=True)
         return
     
-    group = await db.get_group_by_id(group_id)
-    group_name = group['group_name'] if group else "Группа"
+    group = db.snapshot.groups_by_id.get(group_id)
+    group_name = group.group_name if group else "Группа"
     
-    schedule_text = f"📅 Расписание группы {group_name}:\n\n{format_schedule(schedule)}"
-    await callback.message.edit_text(schedule_text)
+    await callback.message.edit_text(format_group_schedule(group_name, schedule))
     await callback.answer()
 
 
-@router.message(F.text == "📨 Отправить сообщение студенту")
+@menu.button("teacher", "📨 Отправить сообщение студенту")
 async def start_send_message_to_student(message: Message, state: FSMContext, db: Database):
     """Начать отправку сообщения студенту"""
-    user = await db.get_user(message.from_user.id)
-    if not user or user['role'] != 'teacher':
-        await message.answer("❌ У вас нет доступа к этой функции.")
-        return
-    
     students = await db.get_students_by_teacher(message.from_user.id)
     if not students:
         await message.answer("📭 У вас пока нет студентов.")
@@ -259,15 +295,15 @@ async def start_send_message_to_student(message: Message, state: FSMContext, db:
     
     await message.answer(
         "👨‍🎓 Выберите студента:",
-        reply_markup=get_users_keyboard(students, "message_student")
+        reply_markup=get_users_keyboard(students, UserAction.MESSAGE_STUDENT)
     )
     await state.set_state(TeacherStates.waiting_for_student_message)
 
 
-@router.callback_query(F.data.startswith("message_student_"), TeacherStates.waiting_for_student_message)
-async def select_student_for_message(callback: CallbackQuery, state: FSMContext):
+@router.callback_query(UserCallback.filter(F.action == UserAction.MESSAGE_STUDENT), TeacherStates.waiting_for_student_message)
+async def select_student_for_message(callback: CallbackQuery, callback_data: UserCallback, state: FSMContext):
     """Выбрать студента для сообщения"""
-    student_id = int(callback.data.split("_")[-1])
+    student_id = callback_data.user_id
     await state.update_data(student_id=student_id)
     await callback.message.edit_text(
         "📨 Введите сообщение для студента:",
@@ -278,46 +314,35 @@ async def select_student_for_message(callback: CallbackQuery, state: FSMContext)
 
 
 @router.message(TeacherStates.waiting_for_message_text, F.text != "❌ Отмена")
-async def send_message_to_student(message: Message, state: FSMContext, db: Database):
+async def send_message_to_student(message: Message, state: FSMContext, db: Database, tasks: BackgroundTasks):
     """Отправить сообщение студенту"""
     message_text = message.text
     data = await state.get_data()
     student_id = data['student_id']
     teacher_id = message.from_user.id
     
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
     try:
-        # Сохраняем сообщение в БД
-        await db.add_message(teacher_id, student_id, message_text, timestamp)
-        
-        # Отправляем студенту
-        teacher = await db.get_user(teacher_id)
-        teacher_name = teacher['full_name'] if teacher else "Учитель"
-        
-        await message.bot.send_message(
-            student_id,
-            f"📨 Сообщение от {teacher_name}:\n\n{message_text}"
-        )
+        # Сохраняем сообщение в БД: оно уже есть во входящих студента
+        await db.add_message(teacher_id, student_id, message_text, now())
         
         await message.answer(
             "✅ Сообщение успешно отправлено!",
             reply_markup=get_main_menu("teacher")
         )
+        
+        # Отправляем студенту в фоне
+        tasks.spawn(
+            deliver_to_student(message.bot, db, teacher_id, student_id, message_text),
+            name="message_to_student"
+        )
     except Exception as e:
         await message.answer(f"❌ Ошибка при отправке сообщения: {e}")
     
     await state.clear()
 
 
-@router.message(F.text == "❌ Отмена")
-async def cancel_teacher_action(message: Message, state: FSMContext, db: Database):
-    """Отменить действие"""
-    user = await db.get_user(message.from_user.id)
-    role = user['role'] if user else "teacher"
-    await message.answer(
-        "❌ Действие отменено.",
-        reply_markup=get_main_menu(role)
-    )
-    await state.clear()
-
+async def deliver_to_student(bot: Bot, db: Database, teacher_id: int, student_id: int, message_text: str):
+    """Переслать студенту сообщение учителя"""
+    teacher = await db.get_user(teacher_id)
+    teacher_name = teacher.full_name if teacher else "Учитель"
+    await bot.send_message(student_id, f"📨 Сообщение от {teacher_name}:\n\n{message_text}")
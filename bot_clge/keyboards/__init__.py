@@ -6,7 +6,34 @@ from .keyboards import (
     get_days_keyboard,
     get_lesson_numbers_keyboard,
     get_grades_keyboard,
-    get_action_keyboard
+    get_action_keyboard,
+    get_inbox_keyboard,
+    get_conversation_keyboard,
+    get_report_kinds_keyboard,
+    get_grade_periods_keyboard,
+    get_confirm_keyboard,
+    dynamic_markups,
+    MAIN_MENU,
+    CANCEL_TEXT,
+    INBOX_TEXT,
+    REPORTS_TEXT,
+    GRADE_PERIODS
+)
+from .callbacks import (
+    UserAction,
+    GroupAction,
+    AdminAction,
+    InboxAction,
+    ReportKind,
+    GradePeriod,
+    UserCallback,
+    GroupCallback,
+    AdminCallback,
+    InboxCallback,
+    ReportCallback,
+    GradesCallback,
+    ConfirmCallback,
+    CancelCallback
 )
 
 __all__ = [
@@ -17,6 +44,31 @@ __all__ = [
     'get_days_keyboard',
     'get_lesson_numbers_keyboard',
     'get_grades_keyboard',
-    'get_action_keyboard'
+    'get_action_keyboard',
+    'get_inbox_keyboard',
+    'get_conversation_keyboard',
+    'get_report_kinds_keyboard',
+    'get_grade_periods_keyboard',
+    'get_confirm_keyboard',
+    'dynamic_markups',
+    'MAIN_MENU',
+    'CANCEL_TEXT',
+    'INBOX_TEXT',
+    'REPORTS_TEXT',
+    'GRADE_PERIODS',
+    'UserAction',
+    'GroupAction',
+    'AdminAction',
+    'InboxAction',
+    'ReportKind',
+    'GradePeriod',
+    'UserCallback',
+    'GroupCallback',
+    'AdminCallback',
+    'InboxCallback',
+    'ReportCallback',
+    'GradesCallback',
+    'ConfirmCallback',
+    'CancelCallback'
 ]
 
@@ -0,0 +1,93 @@
+from enum import Enum
+from aiogram.filters.callback_data import CallbackData
+
+
+class UserAction(str, Enum):
+    """Что делать с выбранным пользователем"""
+    GRADE = "g"
+    MESSAGE_STUDENT = "ms"
+    MESSAGE_TEACHER = "mt"
+    MANAGE_TEACHER = "t"
+    MANAGE_STUDENT = "s"
+
+
+class GroupAction(str, Enum):
+    """Что делать с выбранной группой"""
+    ADD_SCHEDULE = "s"
+    VIEW_SCHEDULE = "v"
+    ADD_USER = "a"
+    GRADE_STATS = "st"
+    REPORTS = "r"
+
+
+class AdminAction(str, Enum):
+    """Действия администратора над выбранным пользователем"""
+    ADD_TO_GROUP = "ag"
+    REMOVE_FROM_GROUP = "rg"
+    SET_TEACHER = "st"
+    SET_STUDENT = "ss"
+
+
+class ReportKind(str, Enum):
+    """Какой отчёт выгрузить"""
+    GRADEBOOK = "g"
+    SCHEDULE = "s"
+
+
+class GradePeriod(str, Enum):
+    """За какой период показать отметки"""
+    WEEK = "w"
+    MONTH = "m"
+    TERM = "t"
+    ALL = "a"
+
+
+class InboxAction(str, Enum):
+    """Действия во входящих сообщениях"""
+    LIST = "l"
+    OPEN = "o"
+    OLDER = "p"
+    REPLY = "r"
+
+
+class UserCallback(CallbackData, prefix="u"):
+    """Выбор пользователя: u:<действие>:<user_id>"""
+    action: UserAction
+    user_id: int
+
+
+class GroupCallback(CallbackData, prefix="g"):
+    """Выбор группы: g:<действие>:<group_id>"""
+    action: GroupAction
+    group_id: int
+
+
+class AdminCallback(CallbackData, prefix="a"):
+    """Действие администратора: a:<действие>"""
+    action: AdminAction
+
+
+class InboxCallback(CallbackData, prefix="i"):
+    """Диалог: i:<действие>:<собеседник>:<before_id> (0 — первая страница)"""
+    action: InboxAction
+    user_id: int = 0
+    before_id: int = 0
+
+
+class ReportCallback(CallbackData, prefix="rp"):
+    """Отчёт по группе: rp:<вид>:<group_id>"""
+    kind: ReportKind
+    group_id: int
+
+
+class GradesCallback(CallbackData, prefix="gp"):
+    """Отметки студента за период: gp:<период>"""
+    period: GradePeriod
+
+
+class ConfirmCallback(CallbackData, prefix="ok"):
+    """Подтверждение показанного действия: ok"""
+
+
+class CancelCallback(CallbackData, prefix="x"):
+    """Отмена: x"""
@@ -1,107 +1,264 @@
+from functools import lru_cache
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
+from .callbacks import (
+    UserAction, GroupAction, AdminAction, InboxAction, ReportKind, GradePeriod,
+    UserCallback, GroupCallback, AdminCallback, InboxCallback, ReportCallback, GradesCallback, ConfirmCallback,
+    CancelCallback
+)
+from .registry import MarkupCache
 
+# Статические клавиатуры строятся один раз (lru_cache), динамические
+# кэшируются по содержимому. Выданную разметку изменять нельзя.
+dynamic_markups = MarkupCache()
 
+CANCEL_DATA = CancelCallback().pack()
+
+CONFIRM_DATA = ConfirmCallback().pack()
+
+CANCEL_TEXT = "❌ Отмена"
+
+INBOX_TEXT = "📬 Сообщения"
+
+REPORTS_TEXT = "📄 Отчёты"
+
+GRADE_PERIODS = {
+    GradePeriod.WEEK: "Неделя",
+    GradePeriod.MONTH: "Месяц",
+    GradePeriod.TERM: "Семестр",
+    GradePeriod.ALL: "Все",
+}
+
+# Кнопки главного меню по ролям. По этой же таблице регистрируются
+# обработчики меню (handlers/menu.py).
+MAIN_MENU = {
+    "admin": (
+        "👥 Управление учителями",
+        "👨‍🎓 Управление студентами",
+        "📚 Управление группами",
+        "📢 Рассылка",
+        "👤 Добавить администратора",
+        "📈 Аналитика",
+        REPORTS_TEXT,
+    ),
+    "teacher": (
+        "📝 Поставить отметку",
+        "📅 Добавить расписание",
+        "📨 Отправить сообщение студенту",
+        "📊 Посмотреть расписание",
+        INBOX_TEXT,
+        REPORTS_TEXT,
+    ),
+    "student": (
+        "📅 Расписание",
+        "📊 Мои отметки",
+        "📨 Написать учителю",
+        "🔔 Напоминания",
+        INBOX_TEXT,
+    ),
+}
+
+
+@lru_cache(maxsize=None)
 def get_main_menu(role: str) -> ReplyKeyboardMarkup:
     """Главное меню в зависимости от роли"""
     builder = ReplyKeyboardBuilder()
-
-    if role == "admin":
-        builder.add(KeyboardButton(text="👥 Управление учителями"))
-        builder.add(KeyboardButton(text="👨‍🎓 Управление студентами"))
-        builder.add(KeyboardButton(text="📚 Управление группами"))
-        builder.add(KeyboardButton(text="📢 Рассылка"))
-        builder.add(KeyboardButton(text="👤 Добавить администратора"))
-    elif role == "teacher":
-        builder.add(KeyboardButton(text="📝 Поставить отметку"))
-        builder.add(KeyboardButton(text="📅 Добавить расписание"))
-        builder.add(KeyboardButton(text="📨 Отправить сообщение студенту"))
-        builder.add(KeyboardButton(text="📊 Посмотреть расписание"))
-    elif role == "student":
-        builder.add(KeyboardButton(text="📅 Расписание"))
-        builder.add(KeyboardButton(text="📊 Мои отметки"))
-        builder.add(KeyboardButton(text="📨 Написать учителю"))
-
+    for text in MAIN_MENU.get(role, ()):
+        builder.add(KeyboardButton(text=text))
     builder.adjust(2)
     return builder.as_markup(resize_keyboard=True)
 
 
+@lru_cache(maxsize=None)
 def get_cancel_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура с кнопкой отмены"""
     builder = ReplyKeyboardBuilder()
-    builder.add(KeyboardButton(text="❌ Отмена"))
+    builder.add(KeyboardButton(text=CANCEL_TEXT))
     return builder.as_markup(resize_keyboard=True)
 
 
-def get_groups_keyboard(groups: list, prefix: str = "group") -> InlineKeyboardMarkup:
+def get_groups_keyboard(groups: list, action: GroupAction) -> InlineKeyboardMarkup:
     """Клавиатура с группами"""
+    buttons = tuple((group.group_name, group.group_id) for group in groups)
+
+    def build() -> InlineKeyboardMarkup:
+        builder = InlineKeyboardBuilder()
+        for name, group_id in buttons:
+            builder.add(InlineKeyboardButton(
+                text=name,
+                callback_data=GroupCallback(action=action, group_id=group_id).pack()
+            ))
+        builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data=CANCEL_DATA))
+        builder.adjust(1)
+        return builder.as_markup()
+
+    return dynamic_markups.get_or_build(("groups", action, buttons), build)
+
+
+def get_users_keyboard(users: list, action: UserAction) -> InlineKeyboardMarkup:
+    """Клавиатура с пользователями"""
+    buttons = tuple(
+        (user.full_name or f"@{user.username or 'Unknown'}", user.user_id)
+        for user in users
+    )
+
+    def build() -> InlineKeyboardMarkup:
+        builder = InlineKeyboardBuilder()
+        for name, user_id in buttons:
+            builder.add(InlineKeyboardButton(
+                text=name,
+                callback_data=UserCallback(action=action, user_id=user_id).pack()
+            ))
+        builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data=CANCEL_DATA))
+        builder.adjust(1)
+        return builder.as_markup()
+
+    return dynamic_markups.get_or_build(("users", action, buttons), build)
+
+
+def get_inbox_keyboard(threads: list) -> InlineKeyboardMarkup:
+    """Клавиатура со списком диалогов"""
+    buttons = tuple(
+        (
+            thread.counterpart_name or f"@{thread.counterpart_username or thread.counterpart_id}",
+            thread.unread,
+            thread.counterpart_id,
+        )
+        for thread in threads
+    )
+
+    def build() -> InlineKeyboardMarkup:
+        builder = InlineKeyboardBuilder()
+        for name, unread, user_id in buttons:
+            builder.add(InlineKeyboardButton(
+                text=f"{name} • {unread}" if unread else name,
+                callback_data=InboxCallback(action=InboxAction.OPEN, user_id=user_id).pack()
+            ))
+        builder.adjust(1)
+        return builder.as_markup()
+
+    return dynamic_markups.get_or_build(("inbox", buttons), build)
+
+
+@lru_cache(maxsize=1024)
+def get_conversation_keyboard(user_id: int, older_id: int = 0) -> InlineKeyboardMarkup:
+    """Клавиатура диалога; older_id — с какого сообщения показывать более ранние"""
     builder = InlineKeyboardBuilder()
-    for group in groups:
+    if older_id:
         builder.add(InlineKeyboardButton(
-            text=group['group_name'],
-            callback_data=f"{prefix}_{group['group_id']}"
+            text="⬆️ Ранее",
+            callback_data=InboxCallback(action=InboxAction.OLDER, user_id=user_id, before_id=older_id).pack()
         ))
-    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data="cancel"))
+    builder.add(InlineKeyboardButton(
+        text="✉️ Ответить",
+        callback_data=InboxCallback(action=InboxAction.REPLY, user_id=user_id).pack()
+    ))
+    builder.add(InlineKeyboardButton(
+        text="⬅️ К диалогам",
+        callback_data=InboxCallback(action=InboxAction.LIST).pack()
+    ))
     builder.adjust(1)
     return builder.as_markup()
 
 
-def get_users_keyboard(users: list, action: str) -> InlineKeyboardMarkup:
-    """Клавиатура с пользователями"""
+@lru_cache(maxsize=None)
+def get_grade_periods_keyboard(current: GradePeriod) -> InlineKeyboardMarkup:
+    """Переключатель периода отметок; текущий период отмечен"""
     builder = InlineKeyboardBuilder()
-    for user in users:
-        name = user.get('full_name', f"@{user.get('username', 'Unknown')}")
+    for period, text in GRADE_PERIODS.items():
         builder.add(InlineKeyboardButton(
-            text=name,
-            callback_data=f"{action}_{user['user_id']}"
+            text=f"• {text} •" if period == current else text,
+            callback_data=GradesCallback(period=period).pack()
         ))
-    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data="cancel"))
+    builder.adjust(4)
+    return builder.as_markup()
+
+
+@lru_cache(maxsize=1024)
+def get_report_kinds_keyboard(group_id: int) -> InlineKeyboardMarkup:
+    """Выбор отчёта по группе"""
+    builder = InlineKeyboardBuilder()
+    builder.add(InlineKeyboardButton(
+        text="📊 Журнал отметок (XLSX)",
+        callback_data=ReportCallback(kind=ReportKind.GRADEBOOK, group_id=group_id).pack()
+    ))
+    builder.add(InlineKeyboardButton(
+        text="📅 Расписание (XLSX)",
+        callback_data=ReportCallback(kind=ReportKind.SCHEDULE, group_id=group_id).pack()
+    ))
+    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data=CANCEL_DATA))
     builder.adjust(1)
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
+def get_confirm_keyboard() -> InlineKeyboardMarkup:
+    """Выполнить показанное действие или отменить"""
+    builder = InlineKeyboardBuilder()
+    builder.add(InlineKeyboardButton(text="✅ Выполнить", callback_data=CONFIRM_DATA))
+    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data=CANCEL_DATA))
+    builder.adjust(2)
+    return builder.as_markup()
+
+
+@lru_cache(maxsize=None)
 def get_days_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура с днями недели"""
     builder = ReplyKeyboardBuilder()
     days = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота"]
     for day in days:
         builder.add(KeyboardButton(text=day))
-    builder.add(KeyboardButton(text="❌ Отмена"))
+    builder.add(KeyboardButton(text=CANCEL_TEXT))
     builder.adjust(2)
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def get_lesson_numbers_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура с номерами уроков"""
     builder = ReplyKeyboardBuilder()
     for i in range(1, 9):
         builder.add(KeyboardButton(text=str(i)))
-    builder.add(KeyboardButton(text="❌ Отмена"))
+    builder.add(KeyboardButton(text=CANCEL_TEXT))
     builder.adjust(4)
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def get_grades_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура с оценками"""
     builder = ReplyKeyboardBuilder()
     grades = ["2", "3", "4", "5"]
     for grade in grades:
         builder.add(KeyboardButton(text=grade))
-    builder.add(KeyboardButton(text="❌ Отмена"))
+    builder.add(KeyboardButton(text=CANCEL_TEXT))
     builder.adjust(2)
     return builder.as_markup()
 
 
+@lru_cache(maxsize=None)
 def get_action_keyboard(is_teacher: bool = False) -> InlineKeyboardMarkup:
     """Клавиатура действий для администратора"""
     builder = InlineKeyboardBuilder()
-    builder.add(InlineKeyboardButton(text="➕ Добавить в группу", callback_data="add_to_group"))
-    builder.add(InlineKeyboardButton(text="➖ Удалить из группы", callback_data="remove_from_group"))
+    builder.add(InlineKeyboardButton(
+        text="➕ Добавить в группу",
+        callback_data=AdminCallback(action=AdminAction.ADD_TO_GROUP).pack()
+    ))
+    builder.add(InlineKeyboardButton(
+        text="➖ Удалить из группы",
+        callback_data=AdminCallback(action=AdminAction.REMOVE_FROM_GROUP).pack()
+    ))
     if not is_teacher:
-        builder.add(InlineKeyboardButton(text="👨‍🏫 Назначить учителем", callback_data="set_teacher_role"))
+        builder.add(InlineKeyboardButton(
+            text="👨‍🏫 Назначить учителем",
+            callback_data=AdminCallback(action=AdminAction.SET_TEACHER).pack()
+        ))
     else:
-        builder.add(InlineKeyboardButton(text="👨‍🎓 Назначить студентом", callback_data="set_student_role"))
-    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data="cancel"))
+        builder.add(InlineKeyboardButton(
+            text="👨‍🎓 Назначить студентом",
+            callback_data=AdminCallback(action=AdminAction.SET_STUDENT).pack()
+        ))
+    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data=CANCEL_DATA))
     builder.adjust(1)
     return builder.as_markup()
 
@@ -0,0 +1,44 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, TypeVar
+
+Markup = TypeVar("Markup")
+
+
+class MarkupCache:
+    """Ограниченный LRU-кэш готовых клавиатур по ключу содержимого.
+
+    Ключ — кортеж из всего, что попадает в клавиатуру (тексты кнопок и
+    callback-данные), поэтому одинаковые списки групп или пользователей
+    используют один и тот же объект разметки. Разметку после выдачи
+    изменять нельзя.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Hashable, Markup]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Markup]) -> Markup:
+        markup = self._items.get(key)
+        if markup is not None:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return markup
+
+        self.misses += 1
+        markup = build()
+        self._items[key] = markup
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.evictions += 1
+        return markup
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            'size': len(self._items),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -1,11 +1,21 @@
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+from aiogram import Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
 from config import config
-from database import Database
-from middleware import DatabaseMiddleware
-from handlers import common_router, admin_router, teacher_router, student_router
+from fsm import CompactMemoryStorage
+from middleware import (
+    DatabaseMiddleware, TenantMiddleware, ThrottlingMiddleware, Limit, parse_limits,
+    TracingMiddleware, DispatchTracingMiddleware, HandlerTracingMiddleware
+)
+from handlers import (
+    common_router, menu_router, admin_router, teacher_router, student_router, inbox_router, reports_router,
+    inline_router
+)
+from tenants import Tenant, TenantSettings, load_manifest
+from tracing import Tracer, TraceExporter, RequestTracing
 
 # Настройка логирования
 logging.basicConfig(
@@ -15,40 +25,146 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    """Основная функция запуска бота"""
-    
-    # Проверка токена
-    if not config.BOT_TOKEN:
-        logger.error("BOT_TOKEN не установлен! Установите переменную окружения BOT_TOKEN.")
-        return
-    
-    # Инициализация базы данных
-    db = Database()
-    await db.init_db()
-    logger.info("База данных инициализирована")
-    
-    # Инициализация бота и диспетчера
-    bot = Bot(token=config.BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
-    
-    # Добавление middleware для базы данных
-    dp.message.middleware(DatabaseMiddleware(db))
-    dp.callback_query.middleware(DatabaseMiddleware(db))
-    
+def load_tenants() -> List[TenantSettings]:
+    """Колледжи из TENANTS_FILE или один колледж из переменных окружения"""
+    if config.TENANTS_FILE:
+        return load_manifest(config.TENANTS_FILE, config)
+    return [TenantSettings("default", config)]
+
+
+def create_tracer() -> Optional[Tracer]:
+    """Трассировка апдейтов, если TRACE_SAMPLE_RATE больше нуля"""
+    if config.TRACE_SAMPLE_RATE <= 0:
+        return None
+    exporter = TraceExporter(
+        config.TRACE_FILE, max_bytes=int(config.TRACE_MAX_MB * 1024 * 1024), backups=config.TRACE_BACKUPS
+    )
+    return Tracer(exporter, min(config.TRACE_SAMPLE_RATE, 1.0))
+
+
+def install_tracing(dp: Dispatcher, tenants: List[Tenant], tracer: Tracer):
+    """Спаны апдейта, фильтров, обработчика, вызовов Database и запросов к Bot API"""
+    dp.update.outer_middleware(TracingMiddleware(tracer))
+    for observer in (dp.message, dp.callback_query, dp.inline_query):
+        observer.outer_middleware(DispatchTracingMiddleware(tracer))
+        observer.middleware(HandlerTracingMiddleware(tracer))
+    # Сессия бывает общей у нескольких колледжей: middleware ставится на неё один раз
+    sessions = {id(tenant.bot.session): tenant.bot.session for tenant in tenants}
+    for session in sessions.values():
+        session.middleware(RequestTracing(tracer))
+    for tenant in tenants:
+        tracer.instrument(tenant.db, "db")
+
+
+def create_dispatcher(tenants: List[Tenant], tracer: Optional[Tracer] = None) -> Dispatcher:
+    """Общий диспетчер: роутеры одни на все боты, данные — колледжа апдейта"""
+    # Брошенные сценарии (начатое и не законченное добавление урока и т. п.) вытесняются по TTL и LRU
+    dp = Dispatcher(storage=CompactMemoryStorage(
+        ttl=config.FSM_TTL_HOURS * 3600, max_entries=config.FSM_MAX_ENTRIES
+    ))
+    # Трасса начинается раньше выбора колледжа, спан обработчика — раньше ограничения частоты
+    if tracer is not None:
+        install_tracing(dp, tenants, tracer)
+
+    # Колледж выбирается по боту; частые запросы отбрасываются до обращения к базе
+    throttling = ThrottlingMiddleware(
+        Limit(config.THROTTLE_RATE, config.THROTTLE_BURST), parse_limits(config.THROTTLE_LIMITS),
+        # Лимиты из манифеста у каждого колледжа свои
+        bots={
+            tenant.bot_id: (
+                Limit(tenant.config.THROTTLE_RATE, tenant.config.THROTTLE_BURST),
+                parse_limits(tenant.config.THROTTLE_LIMITS)
+            )
+            for tenant in tenants
+        }
+    )
+    dp["throttling"] = throttling
+    dp.update.outer_middleware(TenantMiddleware(tenants))
+    dp.message.middleware(throttling)
+    dp.callback_query.middleware(throttling)
+    dp.message.middleware(DatabaseMiddleware())
+    dp.callback_query.middleware(DatabaseMiddleware())
+
     # Регистрация роутеров
     dp.include_router(common_router)
+    dp.include_router(menu_router)
     dp.include_router(admin_router)
     dp.include_router(teacher_router)
     dp.include_router(student_router)
-    
-    logger.info("Бот запущен")
-    
-    # Запуск поллинга
+    dp.include_router(inbox_router)
+    dp.include_router(reports_router)
+    dp.include_router(inline_router)
+    return dp
+
+
+async def main():
+    """Основная функция запуска бота"""
+
+    # Проверка токена
+    if not config.TENANTS_FILE and not config.BOT_TOKEN:
+        logger.error("BOT_TOKEN не установлен! Установите переменную окружения BOT_TOKEN.")
+        return
+    settings = load_tenants()
+
+    # Один HTTP-сеанс и один пул процессов для отчётов XLSX на все боты процесса
+    session = AiohttpSession()
+    report_executor = ProcessPoolExecutor(max_workers=config.REPORT_WORKERS)
+    tracer = create_tracer()
+    trace_writer: Optional[asyncio.Task] = None
+    # Очистка ограничителя частоты и брошенных сценариев FSM
+    sweepers: List[asyncio.Task] = []
+    tenants: List[Tenant] = []
     try:
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        for item in settings:
+            tenant = Tenant(item, session, report_executor)
+            try:
+                await tenant.start()
+            except Exception:
+                # Ошибка одного колледжа не мешает запуску остальных
+                logger.exception("Колледж %s не запущен", item.name)
+                await tenant.close()
+                continue
+            tenants.append(tenant)
+
+        if not tenants:
+            logger.error("Не удалось запустить ни одного колледжа")
+            return
+
+        dp = create_dispatcher(tenants, tracer)
+        sweepers.append(asyncio.create_task(dp["throttling"].run_forever()))
+        sweepers.append(asyncio.create_task(dp.storage.run_forever()))
+        if tracer is not None:
+            trace_writer = asyncio.create_task(tracer.exporter.run_forever())
+            logger.info("Трассировка: доля апдейтов %.3f, файл %s", tracer.sample_rate, config.TRACE_FILE)
+        logger.info("Бот запущен, колледжей: %d", len(tenants))
+
+        # Запуск поллинга всех ботов в одном цикле событий
+        await dp.start_polling(
+            *(tenant.bot for tenant in tenants),
+            allowed_updates=dp.resolve_used_update_types(),
+            close_bot_session=False
+        )
+        logger.info("Ограничение частоты: %s", dp["throttling"].metrics())
+        logger.info("Состояния FSM: %s", dp.storage.metrics())
     finally:
-        await bot.session.close()
+        # Останавливаются и при ошибке или отмене поллинга
+        for task in sweepers:
+            task.cancel()
+        for tenant in tenants:
+            logger.info("Колледж %s: %s", tenant.name, tenant.metrics())
+        # Колледжи закрываются параллельно: каждый дожидается своих фоновых задач
+        results = await asyncio.gather(*(tenant.close() for tenant in tenants), return_exceptions=True)
+        for tenant, result in zip(tenants, results):
+            if isinstance(result, Exception):
+                logger.error("Колледж %s закрыт с ошибкой: %r", tenant.name, result)
+        # Спаны фоновых задач колледжей дописываются после их завершения
+        if tracer is not None:
+            if trace_writer is not None:
+                trace_writer.cancel()
+            await tracer.exporter.close()
+            logger.info("Трассировка: %s", tracer.metrics())
+        report_executor.shutdown(wait=False, cancel_futures=True)
+        await session.close()
 
 
 if __name__ == "__main__":
@@ -56,4 +172,3 @@ if __name__ == "__main__":
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
-
@@ -1,4 +1,9 @@
 from .db_middleware import DatabaseMiddleware
+from .tenant_middleware import TenantMiddleware
+from .throttling import ThrottlingMiddleware, Limit, parse_limits
+from .tracing import TracingMiddleware, DispatchTracingMiddleware, HandlerTracingMiddleware
 
-__all__ = ['DatabaseMiddleware']
-
+__all__ = [
+    'DatabaseMiddleware', 'TenantMiddleware', 'ThrottlingMiddleware', 'Limit', 'parse_limits',
+    'TracingMiddleware', 'DispatchTracingMiddleware', 'HandlerTracingMiddleware'
+]
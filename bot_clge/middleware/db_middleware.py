@@ -1,11 +1,17 @@
-from typing import Callable, Dict, Any, Awaitable
+from typing import Callable, Dict, Any, Awaitable, Optional
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
-from database import Database
+from database import Database, UserLoader
 
 
 class DatabaseMiddleware(BaseMiddleware):
-    def __init__(self, db: Database):
+    """Хранилище и загрузчик пользователей для обработчиков.
+
+    Без db используется хранилище колледжа, которое TenantMiddleware
+    уже положил в data['db'].
+    """
+
+    def __init__(self, db: Optional[Database] = None):
         self.db = db
 
     async def __call__(
@@ -14,6 +20,7 @@ class DatabaseMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        data['db'] = self.db
+        db = data['db'] = self.db if self.db is not None else data['db']
+        # Новый загрузчик на каждый апдейт: кэш не переживает обработку
+        data['user_loader'] = UserLoader(db)
         return await handler(event, data)
-
@@ -0,0 +1,40 @@
+import logging
+import time
+from typing import Callable, Dict, Any, Awaitable, Iterable
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from tenants import Tenant
+
+logger = logging.getLogger(__name__)
+
+
+class TenantMiddleware(BaseMiddleware):
+    """Выбор колледжа по боту, получившему апдейт.
+
+    Ставится внешним middleware на dp.update: данные колледжа (db, sender,
+    tasks, ...) попадают в data до фильтров и обработчиков, а время
+    обработки апдейта учитывается в метриках колледжа.
+    """
+
+    def __init__(self, tenants: Iterable[Tenant]):
+        self.tenants: Dict[int, Tenant] = {tenant.bot_id: tenant for tenant in tenants}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        tenant = self.tenants.get(data['bot'].id)
+        if tenant is None:
+            logger.warning("Апдейт от неизвестного бота %s пропущен", data['bot'].id)
+            return None
+        data.update(tenant.data)
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await handler(event, data)
+            failed = False
+            return result
+        finally:
+            tenant.record(time.perf_counter() - started, failed)
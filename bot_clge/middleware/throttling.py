@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+logger = logging.getLogger(__name__)
+
+# Маршрут обработчиков без флага throttling
+DEFAULT_ROUTE = "default"
+
+THROTTLED_TEXT = "⏳ Слишком много запросов. Подождите немного."
+
+
+@dataclass(frozen=True)
+class Limit:
+    """Ведро токенов: burst запросов подряд, затем rate в секунду"""
+    rate: float
+    burst: int
+
+    @property
+    def refill_time(self) -> float:
+        """За сколько секунд пустое ведро наполняется целиком"""
+        return self.burst / self.rate
+
+
+def parse_limits(spec: str) -> Dict[str, Limit]:
+    """Разобрать лимиты маршрутов "grades=0.5/4,reports=0.2/3" (в секунду/подряд)"""
+    limits = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        route, value = part.split("=", 1)
+        rate, burst = value.split("/", 1)
+        limit = Limit(float(rate), int(burst))
+        if limit.rate <= 0 or limit.burst < 1:
+            raise ValueError(f"Неверный лимит маршрута {route.strip()}: {value}")
+        limits[route.strip()] = limit
+    return limits
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Ограничение частоты апдейтов от одного пользователя.
+
+    Ставится на message и callback_query раньше DatabaseMiddleware, поэтому
+    лишний апдейт отбрасывается до любого обращения к базе. Маршрут берётся
+    из флага обработчика: flags={"throttling": "grades"} или функция от
+    события (так кнопки главного меню получают маршрут по тексту). Для
+    каждого маршрута и пользователя хранится ведро токенов — два числа,
+    обновление за O(1). Ведра лежат в порядке последнего обращения, и
+    sweep() снимает с начала те, что давно не трогали: такое ведро уже
+    наполнилось бы и ничем не отличается от нового.
+
+    Лимиты колледжа задаются в bots: id бота -> (лимит по умолчанию, лимиты
+    маршрутов); для ботов не из bots действуют default и limits.
+
+    На отброшенное нажатие кнопки отвечается всплывающей подсказкой
+    (иначе кнопка «крутится»), на сообщение — одним предупреждением за
+    серию отброшенных.
+    """
+
+    def __init__(self, default: Limit, limits: Optional[Dict[str, Limit]] = None,
+                 bots: Optional[Dict[int, Tuple[Limit, Dict[str, Limit]]]] = None):
+        self.default = default
+        self.limits = dict(limits or {})
+        self.bots = dict(bots or {})
+        # (маршрут, бот) -> (бот, пользователь) -> [токены, время обновления, предупреждён]
+        self._buckets: Dict[Tuple[str, int], "OrderedDict[Tuple[int, int], List[Any]]"] = {}
+        self.allowed = 0
+        self.dropped = 0
+        self.evicted = 0
+
+    def limit_for(self, route: str, bot_id: Optional[int] = None) -> Limit:
+        default, limits = self.bots.get(bot_id, (self.default, self.limits))
+        return limits.get(route, default)
+
+    def hit(self, route: str, key: Tuple[int, int], now: float) -> Optional[bool]:
+        """Списать токен: True — пропустить, False — отбросить впервые, None — отбросить снова"""
+        buckets = self._buckets.get((route, key[0]))
+        if buckets is None:
+            buckets = self._buckets[route, key[0]] = OrderedDict()
+        limit = self.limit_for(route, key[0])
+        bucket = buckets.get(key)
+        if bucket is None:
+            buckets[key] = [limit.burst - 1.0, now, False]
+            return True
+        buckets.move_to_end(key)
+        tokens = min(float(limit.burst), bucket[0] + (now - bucket[1]) * limit.rate)
+        bucket[1] = now
+        if tokens >= 1.0:
+            bucket[0] = tokens - 1.0
+            bucket[2] = False
+            return True
+        bucket[0] = tokens
+        if bucket[2]:
+            return None
+        bucket[2] = True
+        return False
+
+    def sweep(self, now: float) -> int:
+        """Удалить ведра, которые успели наполниться; сколько удалено"""
+        removed = 0
+        # У ведер одного маршрута и бота один лимит, поэтому проверка останавливается на первом свежем
+        for (route, bot_id), buckets in self._buckets.items():
+            idle = self.limit_for(route, bot_id).refill_time
+            while buckets:
+                key, bucket = next(iter(buckets.items()))
+                if now - bucket[1] < idle:
+                    break
+                del buckets[key]
+                removed += 1
+        self.evicted += removed
+        return removed
+
+    async def run_forever(self, interval: float = 60.0):
+        """Периодически убирать неактивных пользователей"""
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep(time.monotonic())
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        if user is None:
+            return await handler(event, data)
+
+        route = get_flag(data, "throttling")
+        if callable(route):
+            route = route(event)
+        verdict = self.hit(route or DEFAULT_ROUTE, (data['bot'].id, user.id), time.monotonic())
+        if verdict:
+            self.allowed += 1
+            return await handler(event, data)
+
+        self.dropped += 1
+        tenant = data.get('tenant')
+        if tenant is not None:
+            tenant.throttled += 1
+        if isinstance(event, CallbackQuery):
+            await event.answer(THROTTLED_TEXT)
+        elif verdict is False and isinstance(event, Message):
+            await event.answer(THROTTLED_TEXT)
+        return None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'allowed': self.allowed,
+            'dropped': self.dropped,
+            'evicted': self.evicted,
+            'tracked': sum(len(buckets) for buckets in self._buckets.values()),
+        }
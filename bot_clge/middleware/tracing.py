@@ -0,0 +1,75 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from tracing import Tracer, current_span
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Трасса апдейта: самый внешний middleware dp.update.
+
+    Стоит раньше TenantMiddleware, поэтому в трассу попадает вся обработка
+    апдейта; время самих внешних middleware видно как собственное время
+    корневого спана до спана dispatch.
+    """
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        with self.tracer.trace(f"update {event.event_type}", "update",
+                               update_id=event.update_id, bot_id=data['bot'].id):
+            return await handler(event, data)
+
+
+class DispatchTracingMiddleware(BaseMiddleware):
+    """Спан dispatch: внешний middleware событий (message, callback_query, ...).
+
+    Охватывает проверку фильтров всех роутеров, внутренние middleware и
+    обработчик.
+    """
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        tenant = data.get('tenant')
+        with self.tracer.span("dispatch", "dispatch", tenant=tenant.name if tenant else None):
+            return await handler(event, data)
+
+
+class HandlerTracingMiddleware(BaseMiddleware):
+    """Первый внутренний middleware: фильтры пройдены, дальше — обработчик.
+
+    Время от начала dispatch до этого момента записывается спаном filters,
+    а остальная работа — спаном с именем функции обработчика (вместе с
+    внутренними middleware, которые стоят после этого).
+    """
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        dispatch = current_span()
+        if dispatch is None:
+            return await handler(event, data)
+        self.tracer.record("filters", "dispatch", dispatch.start, time.perf_counter())
+        callback = data['handler'].callback
+        name = getattr(callback, '__qualname__', type(callback).__name__)
+        with self.tracer.span(name, "handler"):
+            return await handler(event, data)
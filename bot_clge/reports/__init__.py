@@ -0,0 +1,4 @@
+from .manager import ReportManager, ReportJob
+from .xlsx import render_xlsx
+
+__all__ = ['ReportManager', 'ReportJob', 'render_xlsx']
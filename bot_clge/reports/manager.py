@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import aclosing
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile
+from database import Database
+from database.periods import utc_offset
+from utils import get_day_name
+from .xlsx import FIRST_DATA_ROW, assemble_xlsx, render_rows, render_xlsx
+
+logger = logging.getLogger(__name__)
+
+GRADEBOOK_HEADER = ("Студент", "Предмет", "Отметка", "Дата", "Учитель")
+# Столбец "Дата": секунды Unix из базы
+GRADEBOOK_DATE_COLUMNS = (3,)
+SCHEDULE_HEADER = ("День", "Урок", "Предмет", "Учитель")
+
+
+@dataclass
+class ReportJob:
+    """Формирование одного отчёта; его ждут все, кто запросил тот же отчёт"""
+    key: Hashable
+    title: str
+    stage: str = "queued"
+    rows: int = 0
+    listeners: List[Callable[["ReportJob"], Awaitable[None]]] = field(default_factory=list)
+    task: Optional[asyncio.Task] = None
+
+    STAGES = {
+        'queued': "⏳ В очереди",
+        'reading': "📥 Выгрузка строк",
+        'rendering': "🛠 Формирование файла",
+        'uploading': "📤 Отправка файла",
+    }
+
+    def describe(self) -> str:
+        text = f"{self.STAGES[self.stage]}: {self.title}"
+        if self.rows:
+            text += f"\nСтрок: {self.rows}"
+        return text
+
+
+class ReportManager:
+    """Отчёты XLSX (журнал отметок, расписание группы) с отправкой через бота.
+
+    Файл собирается в пуле процессов, чтобы не останавливать цикл
+    событий. Журнал отметок не собирается в память целиком: курсор базы
+    читается порциями по chunk_rows строк, каждая порция превращается в
+    XML листа в пуле (пока читается следующая) и дописывается во
+    временный файл, из которого пул затем упаковывает книгу. Одновременно формируется не
+    больше max_jobs отчётов; одинаковые запросы ждут одно и то же
+    формирование. После отправки file_id запоминается по ключу с версией
+    данных, и неизменившийся отчёт пересылается без повторной сборки и
+    загрузки.
+    """
+
+    def __init__(self, db: Database, executor: Executor, max_jobs: int = 2, cache_size: int = 256,
+                 progress_every: int = 5000, chunk_rows: int = 2000):
+        self.db = db
+        self.executor = executor
+        self.max_jobs = max_jobs
+        self.cache_size = cache_size
+        self.progress_every = progress_every
+        self.chunk_rows = chunk_rows
+        self._slots = asyncio.Semaphore(max_jobs)
+        self._jobs: Dict[Hashable, ReportJob] = {}
+        self._file_ids: "OrderedDict[Hashable, str]" = OrderedDict()
+        self.active = 0
+        self.built = 0
+        self.cache_hits = 0
+
+    # Ключи: содержимое отчёта меняется только вместе с этими версиями
+
+    def gradebook_key(self, group_id: int) -> Tuple:
+        return ('gradebook', group_id, self.db.grades_version, self.db.snapshot.version)
+
+    def schedule_key(self, group_id: int) -> Tuple:
+        return ('schedule', group_id, self.db.snapshot.version)
+
+    async def send_gradebook(self, bot: Bot, chat_id: int, group_id: int, group_name: str,
+                             on_progress: Optional[Callable[[ReportJob], Awaitable[None]]] = None) -> bool:
+        """Отправить журнал отметок группы; True, если файл взят из кэша"""
+        async def produce(job: ReportJob) -> bytes:
+            return await self._render_chunks(
+                job, f"Журнал отметок: {group_name}", GRADEBOOK_HEADER,
+                self.db.iter_group_grades(group_id), GRADEBOOK_DATE_COLUMNS
+            )
+
+        return await self._deliver(
+            bot, chat_id, self.gradebook_key(group_id), f"Журнал отметок {group_name}",
+            f"grades_{group_name}.xlsx", produce, on_progress
+        )
+
+    async def send_schedule(self, bot: Bot, chat_id: int, group_id: int, group_name: str,
+                            on_progress: Optional[Callable[[ReportJob], Awaitable[None]]] = None) -> bool:
+        """Отправить расписание группы; True, если файл взят из кэша"""
+        async def produce(job: ReportJob) -> bytes:
+            rows = [
+                (get_day_name(item.day_of_week), item.lesson_number, item.subject, item.teacher_name)
+                for item in self.db.snapshot.get_schedule(group_id)
+            ]
+            job.rows = len(rows)
+            return await self._render(job, f"Расписание: {group_name}", SCHEDULE_HEADER, rows)
+
+        return await self._deliver(
+            bot, chat_id, self.schedule_key(group_id), f"Расписание {group_name}",
+            f"schedule_{group_name}.xlsx", produce, on_progress
+        )
+
+    async def _deliver(self, bot: Bot, chat_id: int, key: Hashable, title: str, filename: str,
+                       produce: Callable[[ReportJob], Awaitable[bytes]],
+                       on_progress: Optional[Callable[[ReportJob], Awaitable[None]]]) -> bool:
+        file_id = self._file_ids.get(key)
+        if file_id is not None:
+            self._file_ids.move_to_end(key)
+            try:
+                await bot.send_document(chat_id, file_id, caption=title)
+                self.cache_hits += 1
+                return True
+            except TelegramBadRequest:
+                # file_id больше не принимается — собираем заново
+                self._file_ids.pop(key, None)
+
+        job = self._jobs.get(key)
+        if job is None:
+            job = ReportJob(key, title)
+            self._jobs[key] = job
+            job.task = asyncio.create_task(self._run(job, bot, chat_id, filename, produce))
+            first = True
+        else:
+            first = False
+        if on_progress is not None:
+            job.listeners.append(on_progress)
+            await on_progress(job)
+
+        file_id = await asyncio.shield(job.task)
+        if not first:
+            await bot.send_document(chat_id, file_id, caption=title)
+        return False
+
+    async def _run(self, job: ReportJob, bot: Bot, chat_id: int, filename: str,
+                   produce: Callable[[ReportJob], Awaitable[bytes]]) -> str:
+        try:
+            async with self._slots:
+                self.active += 1
+                try:
+                    started = time.perf_counter()
+                    await self._set_stage(job, 'reading')
+                    data = await produce(job)
+                    await self._set_stage(job, 'uploading')
+                    message = await bot.send_document(
+                        chat_id, BufferedInputFile(data, filename=filename), caption=job.title
+                    )
+                finally:
+                    self.active -= 1
+            file_id = message.document.file_id
+            self._remember(job.key, file_id)
+            self.built += 1
+            logger.info(
+                "Отчёт %s: %d строк, %.1f КБ за %.2f с",
+                job.title, job.rows, len(data) / 1024, time.perf_counter() - started
+            )
+            return file_id
+        finally:
+            self._jobs.pop(job.key, None)
+
+    async def _render(self, job: ReportJob, title: str, header: Tuple[str, ...], rows: list,
+                      date_columns: Tuple[int, ...] = ()) -> bytes:
+        await self._set_stage(job, 'rendering')
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, render_xlsx, title, header, rows, "Отчёт", date_columns, utc_offset()
+        )
+
+    async def _render_chunks(self, job: ReportJob, title: str, header: Tuple[str, ...],
+                             rows: AsyncIterator[Sequence], date_columns: Tuple[int, ...] = ()) -> bytes:
+        """Собрать книгу из потока строк: в памяти и в пуле одновременно не больше двух порций"""
+        loop = asyncio.get_running_loop()
+        offset = utc_offset()
+        widths = [0] * len(header)
+        start = FIRST_DATA_ROW
+        rendering: Optional[asyncio.Future] = None
+        fd, body_path = tempfile.mkstemp(prefix="report_", suffix=".xml")
+        try:
+            with os.fdopen(fd, "wb") as body:
+                async def write_rendered():
+                    xml, chunk_widths = await rendering
+                    widths[:] = map(max, widths, chunk_widths)
+                    await asyncio.to_thread(body.write, xml)
+
+                chunk = []
+                # aclosing: при ошибке соединение курсора возвращается сразу
+                async with aclosing(rows):
+                    async for row in rows:
+                        chunk.append(row)
+                        job.rows += 1
+                        if job.rows % self.progress_every == 0:
+                            await self._notify(job)
+                        if len(chunk) < self.chunk_rows:
+                            continue
+                        # Предыдущая порция рендерилась, пока читалась эта
+                        if rendering is not None:
+                            await write_rendered()
+                        rendering = loop.run_in_executor(
+                            self.executor, render_rows, chunk, start, len(header), date_columns, offset
+                        )
+                        start += len(chunk)
+                        chunk = []
+                if rendering is not None:
+                    await write_rendered()
+                if chunk:
+                    rendering = loop.run_in_executor(
+                        self.executor, render_rows, chunk, start, len(header), date_columns, offset
+                    )
+                    await write_rendered()
+            await self._set_stage(job, 'rendering')
+            return await loop.run_in_executor(
+                self.executor, assemble_xlsx, title, header, widths, job.rows, date_columns, "Отчёт", b"", body_path
+            )
+        finally:
+            if rendering is not None and not rendering.done():
+                rendering.cancel()
+            os.remove(body_path)
+
+    async def _set_stage(self, job: ReportJob, stage: str):
+        job.stage = stage
+        await self._notify(job)
+
+    async def _notify(self, job: ReportJob):
+        for listener in list(job.listeners):
+            try:
+                await listener(job)
+            except Exception:
+                logger.debug("Не удалось показать ход отчёта %s", job.title, exc_info=True)
+
+    def _remember(self, key: Hashable, file_id: str):
+        self._file_ids[key] = file_id
+        self._file_ids.move_to_end(key)
+        while len(self._file_ids) > self.cache_size:
+            self._file_ids.popitem(last=False)
+
+    def status(self) -> Dict[str, int]:
+        """Сколько отчётов формируется и ждёт очереди"""
+        return {
+            'active': self.active,
+            'waiting': len(self._jobs) - self.active,
+            'max_jobs': self.max_jobs,
+            'cached': len(self._file_ids),
+            'built': self.built,
+            'cache_hits': self.cache_hits,
+        }
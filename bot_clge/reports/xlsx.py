@@ -0,0 +1,174 @@
+"""Минимальная запись XLSX без сторонних библиотек.
+
+Функции этого модуля выполняются в дочерних процессах пула
+(ProcessPoolExecutor), поэтому принимают и возвращают только простые
+значения: заголовки, список кортежей и готовые байты файла. Большой
+лист собирается по частям: render_rows превращает порцию строк в XML,
+порции дописываются в файл, а assemble_xlsx упаковывает его в книгу.
+"""
+import io
+import re
+import shutil
+import zipfile
+from typing import Iterable, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+# Управляющие символы, недопустимые в XML
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+# Символы, запрещённые в имени листа Excel
+_INVALID_SHEET = re.compile(r"[\[\]:*?/\\]")
+
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+</Types>"""
+
+ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+
+# Стили ячеек: 0 — обычный, 1 — полужирный для заголовков, 2 — дата и время
+STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<numFmts count="1"><numFmt numFmtId="164" formatCode="dd.mm.yyyy hh:mm"/></numFmts>
+<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/><xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/><xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>"""
+
+
+def column_letter(index: int) -> str:
+    """Буквенное имя столбца по номеру с нуля: 0 → A, 26 → AA"""
+    letters = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(ord("A") + rest) + letters
+    return letters
+
+
+# Дата Excel — дни от 1899-12-30; 25569 — 1970-01-01
+EXCEL_EPOCH_DAYS = 25569
+DATE_STYLE = 2
+DATE_WIDTH = 16
+
+
+def _cell(ref: str, value, style: int = 0) -> str:
+    attrs = f' r="{ref}"' + (f' s="{style}"' if style else "")
+    if value is None:
+        return f"<c{attrs}/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c{attrs}><v>{value}</v></c>"
+    text = escape(_INVALID_XML.sub("", str(value)))
+    return f'<c{attrs} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+# Первая строка — название отчёта, вторая — заголовки столбцов, данные с третьей
+FIRST_DATA_ROW = 3
+
+
+def render_rows(rows: Iterable[Sequence], start: int, columns: int, date_columns: Sequence[int] = (),
+                utc_offset: int = 0) -> Tuple[bytes, List[int]]:
+    """XML строк листа с номерами от start и наибольшая ширина значений по столбцам.
+
+    Значения столбцов date_columns — секунды Unix; они записываются датой
+    Excel в местном времени со смещением utc_offset.
+    """
+    letters = [column_letter(i) for i in range(columns)]
+    widths = [0] * columns
+    dates = frozenset(date_columns)
+    body = []
+    for number, row in enumerate(rows, start=start):
+        cells = []
+        for i, (col, value) in enumerate(zip(letters, row)):
+            if i in dates and value is not None:
+                # Секунды Unix в дату Excel по местному времени: только арифметика
+                cells.append(_cell(f"{col}{number}", (value + utc_offset) / 86400 + EXCEL_EPOCH_DAYS, DATE_STYLE))
+                continue
+            cells.append(_cell(f"{col}{number}", value))
+            if value is not None:
+                widths[i] = max(widths[i], len(str(value)))
+        body.append(f'<row r="{number}">' + "".join(cells) + "</row>")
+    return "".join(body).encode("utf-8"), widths
+
+
+def _sheet_parts(title: str, header: Sequence[str], widths: Sequence[int], date_columns: Sequence[int],
+                 rows: int) -> Tuple[str, str]:
+    """Начало листа до первой строки данных и конец после последней"""
+    columns = [column_letter(i) for i in range(len(header))]
+    widths = [max(width, len(name)) for width, name in zip(widths, header)]
+    for i in date_columns:
+        widths[i] = max(widths[i], DATE_WIDTH)
+    cols = "".join(
+        f'<col min="{i + 1}" max="{i + 1}" width="{min(width, 60) + 2}" customWidth="1"/>'
+        for i, width in enumerate(widths)
+    )
+    last = f"{columns[-1]}{FIRST_DATA_ROW - 1 + rows}" if columns else "A1"
+    head = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<sheetViews><sheetView workbookViewId="0">'
+        '<pane ySplit="2" topLeftCell="A3" activePane="bottomLeft" state="frozen"/>'
+        '</sheetView></sheetViews>'
+        f"<cols>{cols}</cols>"
+        "<sheetData>"
+        f'<row r="1">{_cell("A1", title, 1)}</row>'
+        '<row r="2">' + "".join(_cell(f"{col}2", name, 1) for col, name in zip(columns, header)) + "</row>"
+    )
+    tail = f'</sheetData><autoFilter ref="A2:{last}"/></worksheet>'
+    return head, tail
+
+
+def render_xlsx(title: str, header: Sequence[str], rows: Iterable[Sequence], sheet_name: str = "Отчёт",
+                date_columns: Sequence[int] = (), utc_offset: int = 0) -> bytes:
+    """Книга из одного листа: название, заголовки и строки; возвращает содержимое файла"""
+    rows = list(rows)
+    body, widths = render_rows(rows, FIRST_DATA_ROW, len(header), date_columns, utc_offset)
+    return assemble_xlsx(title, header, widths, len(rows), date_columns, sheet_name, body=body)
+
+
+def assemble_xlsx(title: str, header: Sequence[str], widths: Sequence[int], rows: int,
+                  date_columns: Sequence[int] = (), sheet_name: str = "Отчёт", body: bytes = b"",
+                  body_path: Optional[str] = None) -> bytes:
+    """Упаковать книгу из готового XML строк: body или файл body_path (читается потоком).
+
+    widths — наибольшая ширина значений по столбцам (см. render_rows), rows — число строк данных.
+    """
+    head, tail = _sheet_parts(title, header, widths, date_columns, rows)
+    sheet_name = escape(_INVALID_SHEET.sub("", sheet_name)[:31] or "Отчёт", {'"': "&quot;"})
+    workbook = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>"
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", CONTENT_TYPES)
+        archive.writestr("_rels/.rels", ROOT_RELS)
+        archive.writestr("xl/workbook.xml", workbook)
+        archive.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELS)
+        archive.writestr("xl/styles.xml", STYLES)
+        with archive.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write(head.encode("utf-8"))
+            if body_path is not None:
+                with open(body_path, "rb") as part:
+                    shutil.copyfileobj(part, sheet)
+            sheet.write(body)
+            sheet.write(tail.encode("utf-8"))
+    return buffer.getvalue()
@@ -0,0 +1,9 @@
+from .sender import BatchSender, SendResult
+from .background import BackgroundTasks
+from .morning import MorningPush, parse_push_times
+from .reminders import LessonReminders, parse_bell_times
+
+__all__ = [
+    'BatchSender', 'SendResult', 'BackgroundTasks', 'MorningPush', 'parse_push_times',
+    'LessonReminders', 'parse_bell_times'
+]
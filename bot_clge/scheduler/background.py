@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from typing import Any, Coroutine, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundTasks:
+    """Фоновые побочные действия обработчиков: уведомления, рассылки.
+
+    Обработчик сначала отвечает пользователю, а вторичную работу отдаёт
+    сюда через spawn(). Одновременно выполняется не больше limit задач,
+    остальные ждут своей очереди; если ожидающих и выполняющихся больше
+    max_pending, новая задача отклоняется и учитывается в rejected.
+    Ошибки задач не теряются: они пишутся в лог и считаются в failed.
+    При остановке бота close() дожидается оставшихся задач не дольше
+    timeout и отменяет незавершённые.
+    """
+
+    def __init__(self, limit: int = 32, max_pending: int = 10_000):
+        self.limit = limit
+        self.max_pending = max_pending
+        self._slots = asyncio.Semaphore(limit)
+        self._tasks: Set[asyncio.Task] = set()
+        self._closed = False
+        self.running = 0
+        self.done = 0
+        self.failed = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+
+    def spawn(self, coro: Coroutine[Any, Any, Any], name: str = "task") -> bool:
+        """Запустить корутину в фоне; False, если группа закрыта или переполнена"""
+        if self._closed or len(self._tasks) >= self.max_pending:
+            coro.close()
+            self.rejected += 1
+            logger.warning("Фоновая задача %s отклонена: в очереди %d", name, len(self._tasks))
+            return False
+        task = asyncio.create_task(self._run(coro), name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._finished)
+        return True
+
+    async def _run(self, coro: Coroutine[Any, Any, Any]):
+        try:
+            async with self._slots:
+                self.running += 1
+                try:
+                    return await coro
+                finally:
+                    self.running -= 1
+        finally:
+            # Если задачу отменили до получения слота, корутина не запускалась
+            coro.close()
+
+    def _finished(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is None:
+            self.done += 1
+            return
+        self.failed += 1
+        self.last_error = f"{task.get_name()}: {error!r}"
+        logger.warning("Фоновая задача %s завершилась ошибкой: %r", task.get_name(), error)
+
+    async def close(self, timeout: float = 10.0):
+        """Перестать принимать задачи и дождаться оставшихся"""
+        self._closed = True
+        if not self._tasks:
+            return
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+        logger.info("Фоновые задачи: завершено %d, отменено %d", len(done), len(pending))
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'pending': len(self._tasks),
+            'running': self.running,
+            'limit': self.limit,
+            'done': self.done,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, time as dtime
+from typing import Dict, Optional, Any
+from database import Database
+from utils import format_schedule
+from .sender import BatchSender, SendResult
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "morning_push"
+
+
+def parse_push_times(spec: str) -> Dict[int, dtime]:
+    """Разобрать расписание рассылки.
+
+    Формат: "07:30" (все учебные дни) или "1-5=07:30,6=09:00",
+    где 1 — понедельник, 7 — воскресенье. Пустая строка отключает рассылку.
+    """
+    times: Dict[int, dtime] = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        days, _, at = part.rpartition("=")
+        hour, minute = (int(x) for x in at.split(":"))
+        if not days:
+            day_numbers = range(1, 7)
+        elif "-" in days:
+            first, last = (int(x) for x in days.split("-"))
+            day_numbers = range(first, last + 1)
+        else:
+            day_numbers = [int(days)]
+        for day in day_numbers:
+            if not 1 <= day <= 7:
+                raise ValueError(f"Неверный номер дня недели: {day}")
+            times[day] = dtime(hour, minute)
+    return times
+
+
+class MorningPush:
+    """Утренняя рассылка расписания на сегодня всем студентам группы.
+
+    Стоимость пропорциональна числу групп, а не студентов: на каждую группу
+    один запрос состава и один рендер текста, который затем рассылается
+    через общий BatchSender. Уроки берутся из снимка расписания.
+    Факт запуска сохраняется в БД до начала рассылки, поэтому после
+    перезапуска бота в тот же день повторной отправки не будет.
+    """
+
+    def __init__(self, db: Database, sender: BatchSender, times: Dict[int, dtime],
+                 catch_up: timedelta = timedelta(hours=1)):
+        self.db = db
+        self.sender = sender
+        self.times = times
+        self.catch_up = catch_up
+        self.running = False
+
+    def next_run(self, now: datetime) -> Optional[datetime]:
+        """Ближайший момент рассылки не раньше now - catch_up"""
+        if not self.times:
+            return None
+        for offset in range(8):
+            day = (now + timedelta(days=offset)).date()
+            at = self.times.get(day.isoweekday())
+            if at is None:
+                continue
+            moment = datetime.combine(day, at)
+            if moment >= now - self.catch_up:
+                return moment
+        return None
+
+    async def run_forever(self):
+        """Основной цикл: ждать ближайшего времени и запускать рассылку"""
+        while True:
+            now = datetime.now()
+            moment = self.next_run(now)
+            if moment is None:
+                return
+            if moment > now:
+                await asyncio.sleep((moment - now).total_seconds())
+
+            last = await self.db.get_scheduler_run(JOB_NAME)
+            if last and last['last_run'][:10] == moment.date().isoformat():
+                # Уже отправлено (например, до перезапуска): ждём следующего дня рассылки
+                await asyncio.sleep(max(1.0, (moment + self.catch_up - datetime.now()).total_seconds() + 1))
+                continue
+
+            try:
+                await self.run_once(moment)
+            except Exception:
+                logger.exception("Ошибка утренней рассылки расписания")
+            await asyncio.sleep(1)
+
+    async def run_once(self, moment: Optional[datetime] = None) -> SendResult:
+        """Разослать расписание на день moment (по умолчанию — сегодня)"""
+        moment = moment or datetime.now()
+        day = moment.isoweekday()
+        started = time.perf_counter()
+        result = SendResult()
+        groups = 0
+
+        self.running = True
+        await self.db.save_scheduler_run(JOB_NAME, moment.strftime("%Y-%m-%d %H:%M:%S"))
+        try:
+            snapshot = self.db.snapshot
+            for group in snapshot.groups:
+                lessons = [item for item in snapshot.get_schedule(group.group_id) if item.day_of_week == day]
+                if not lessons:
+                    continue
+
+                text = f"☀️ Доброе утро! Расписание на сегодня:\n\n{format_schedule(lessons)}"
+                recipients = [
+                    user.user_id async for user in self.db.iter_users_by_group(group.group_id)
+                    if user.role == 'student'
+                ]
+                result += await self.sender.send(recipients, text)
+                groups += 1
+        finally:
+            self.running = False
+            duration = time.perf_counter() - started
+            await self.db.save_scheduler_run(
+                JOB_NAME, moment.strftime("%Y-%m-%d %H:%M:%S"), duration, result.sent, result.failed
+            )
+
+        logger.info(
+            "Утренняя рассылка: групп %d, отправлено %d, ошибок %d, %.1f с",
+            groups, result.sent, result.failed, duration
+        )
+        return result
+
+    async def status(self) -> Dict[str, Any]:
+        """Состояние рассылки для администратора"""
+        last = await self.db.get_scheduler_run(JOB_NAME)
+        next_run = self.next_run(datetime.now())
+        return {
+            'running': self.running,
+            'last_run': last['last_run'] if last else None,
+            'duration': last['duration'] if last else None,
+            'sent': last['sent'] if last else 0,
+            'failed': last['failed'] if last else 0,
+            'next_run': next_run.strftime("%Y-%m-%d %H:%M") if next_run else None,
+        }
@@ -0,0 +1,151 @@
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta, time as dtime
+from typing import Dict, List, Optional, Tuple, Any
+from database import Database
+from .sender import BatchSender
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "lesson_reminders"
+
+# Событие очереди: (момент срабатывания, группа, день недели, номер урока)
+Event = Tuple[float, int, int, int]
+
+
+def parse_bell_times(spec: str) -> Dict[int, dtime]:
+    """Разобрать расписание звонков "1=08:30,2=10:10,..." -> {номер урока: начало}"""
+    bells: Dict[int, dtime] = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        lesson, _, at = part.partition("=")
+        hour, minute = (int(x) for x in at.split(":"))
+        bells[int(lesson)] = dtime(hour, minute)
+    return bells
+
+
+class LessonReminders:
+    """Напоминания о начале урока для студентов, включивших их.
+
+    Вместо задачи на каждого студента хранится одна куча событий уровня
+    группы: (группа, день, урок) -> ближайший момент напоминания. Цикл спит
+    до вершины кучи, разом рассылает напоминание подписчикам группы и
+    перекладывает событие на неделю вперёд. Кучу перестраивает смена
+    версии снимка расписания. Момент последнего сработавшего события
+    сохраняется в БД: после перезапуска уже отправленные напоминания не
+    повторяются, а пропущенные досылаются, пока урок ещё не начался.
+    """
+
+    def __init__(self, db: Database, sender: BatchSender, bells: Dict[int, dtime],
+                 minutes_before: int = 10, idle_check: float = 60.0):
+        self.db = db
+        self.sender = sender
+        self.bells = bells
+        self.lead = timedelta(minutes=minutes_before)
+        self.idle_check = idle_check
+        self._heap: List[Event] = []
+        self._snapshot_version: Optional[int] = None
+        # Момент последнего сработавшего события и уже обработанные в нём слоты
+        # (None — обработаны все, так бывает после загрузки позиции из БД)
+        self._position = 0.0
+        self._fired_slots: Optional[set] = set()
+        self.fired = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def _next_occurrence(self, day: int, lesson_number: int, after: float) -> Optional[float]:
+        bell = self.bells.get(lesson_number)
+        if bell is None:
+            return None
+        base = datetime.fromtimestamp(after)
+        monday = base.date() - timedelta(days=base.isoweekday() - 1)
+        moment = datetime.combine(monday + timedelta(days=day - 1), bell) - self.lead
+        while moment.timestamp() <= after:
+            moment += timedelta(days=7)
+        return moment.timestamp()
+
+    def rebuild(self):
+        """Перестроить кучу событий по текущему снимку расписания"""
+        snapshot = self.db.snapshot
+        # Напоминание ещё полезно, пока урок не начался
+        start = max(self._position, time.time() - self.lead.total_seconds())
+        slots = {
+            (group_id, item.day_of_week, item.lesson_number)
+            for group_id, items in snapshot.schedule_by_group.items() for item in items
+        }
+        heap = []
+        for slot in slots:
+            group_id, day, lesson_number = slot
+            # Строго после start, кроме ещё не обработанных слотов того же момента
+            fire_at = self._next_occurrence(day, lesson_number, start - 1e-6)
+            if fire_at == self._position and (self._fired_slots is None or slot in self._fired_slots):
+                fire_at = self._next_occurrence(day, lesson_number, fire_at)
+            if fire_at is not None:
+                heap.append((fire_at, group_id, day, lesson_number))
+        heapq.heapify(heap)
+        self._heap = heap
+        self._snapshot_version = snapshot.version
+
+    async def run_forever(self):
+        """Основной цикл: спать до ближайшего события и рассылать напоминания"""
+        last = await self.db.get_scheduler_run(JOB_NAME)
+        if last:
+            self._position = datetime.strptime(last['last_run'], "%Y-%m-%d %H:%M:%S").timestamp()
+            self._fired_slots = None
+
+        while True:
+            if self.db.snapshot.version != self._snapshot_version:
+                self.rebuild()
+
+            now = time.time()
+            if not self._heap or self._heap[0][0] > now:
+                delay = self._heap[0][0] - now if self._heap else self.idle_check
+                await asyncio.sleep(min(delay, self.idle_check))
+                continue
+
+            fire_at, group_id, day, lesson_number = heapq.heappop(self._heap)
+            try:
+                await self._fire(fire_at, group_id, day, lesson_number)
+            except Exception:
+                logger.exception("Ошибка рассылки напоминаний группе %s", group_id)
+
+            next_at = self._next_occurrence(day, lesson_number, fire_at)
+            heapq.heappush(self._heap, (next_at, group_id, day, lesson_number))
+
+            # Позиция сохраняется, когда обработаны все события этого момента; задержка
+            # срабатывания — не длительность задачи и видна в metrics()
+            if self._heap[0][0] > fire_at:
+                await self.db.save_scheduler_run(
+                    JOB_NAME, datetime.fromtimestamp(fire_at).strftime("%Y-%m-%d %H:%M:%S")
+                )
+
+    async def _fire(self, fire_at: float, group_id: int, day: int, lesson_number: int):
+        lessons = [
+            item for item in self.db.snapshot.get_schedule(group_id)
+            if item.day_of_week == day and item.lesson_number == lesson_number
+        ]
+        if lessons:
+            minutes = int(self.lead.total_seconds() // 60)
+            subjects = ", ".join(f"{item.subject} - {item.teacher_name or 'Неизвестно'}" for item in lessons)
+            text = f"🔔 Через {minutes} мин. начнётся урок {lesson_number}: {subjects}"
+            recipients = await self.db.get_reminder_subscribers(group_id)
+            await self.sender.send(recipients, text)
+
+        self.last_lag = max(0.0, time.time() - fire_at)
+        self.max_lag = max(self.max_lag, self.last_lag)
+        self.fired += 1
+        if fire_at != self._position:
+            self._position = fire_at
+            self._fired_slots = set()
+        self._fired_slots.add((group_id, day, lesson_number))
+
+    def metrics(self) -> Dict[str, Any]:
+        """Размер очереди, задержка срабатывания и число событий"""
+        return {
+            'queue_size': len(self._heap),
+            'next_at': datetime.fromtimestamp(self._heap[0][0]).strftime("%Y-%m-%d %H:%M") if self._heap else None,
+            'fired': self.fired,
+            'last_lag': round(self.last_lag, 3),
+            'max_lag': round(self.max_lag, 3),
+        }
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Iterable
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SendResult:
+    sent: int = 0
+    failed: int = 0
+
+    def __iadd__(self, other: "SendResult") -> "SendResult":
+        self.sent += other.sent
+        self.failed += other.failed
+        return self
+
+
+class BatchSender:
+    """Рассылка одного текста многим получателям с ограничением скорости.
+
+    Telegram допускает около 30 сообщений в секунду на бота; отправки
+    выравниваются по интервалу 1 / rate, а TelegramRetryAfter выдерживается
+    и отправка повторяется. Один BatchSender делится между всеми рассылками
+    бота, поэтому общий лимит соблюдается.
+    """
+
+    def __init__(self, bot: Bot, rate: float = 25.0, max_retries: int = 3):
+        self.bot = bot
+        self.interval = 1.0 / rate
+        self.max_retries = max_retries
+        self._lock = asyncio.Lock()
+        self._next_slot = 0.0
+        # Всего доставлено и не доставлено этим ботом
+        self.sent = 0
+        self.failed = 0
+
+    async def _wait_slot(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def send_one(self, chat_id: int, text: str) -> bool:
+        """Отправить одно сообщение; False, если доставить не удалось"""
+        for _ in range(self.max_retries):
+            await self._wait_slot()
+            try:
+                await self.bot.send_message(chat_id, text)
+                self.sent += 1
+                return True
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except TelegramAPIError as e:
+                logger.debug("Не удалось отправить сообщение %s: %s", chat_id, e)
+                break
+        self.failed += 1
+        return False
+
+    async def send(self, chat_ids: Iterable[int], text: str) -> SendResult:
+        """Отправить один и тот же текст всем получателям"""
+        result = SendResult()
+        for chat_id in chat_ids:
+            if await self.send_one(chat_id, text):
+                result.sent += 1
+            else:
+                result.failed += 1
+        return result
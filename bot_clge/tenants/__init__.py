@@ -0,0 +1,4 @@
+from .manifest import TenantSettings, parse_manifest, load_manifest
+from .tenant import Tenant
+
+__all__ = ['Tenant', 'TenantSettings', 'parse_manifest', 'load_manifest']
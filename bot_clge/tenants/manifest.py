@@ -0,0 +1,61 @@
+import json
+from dataclasses import dataclass, fields, replace
+from typing import Any, Dict, List
+from aiogram.utils.token import TokenValidationError, validate_token
+from config import Config
+
+# Общие для всего процесса настройки: задаются только окружением
+SHARED_SETTINGS = frozenset({
+    "TENANTS_FILE", "REPORT_WORKERS", "TRACE_SAMPLE_RATE", "TRACE_FILE", "TRACE_MAX_MB", "TRACE_BACKUPS",
+    "FSM_TTL_HOURS", "FSM_MAX_ENTRIES"
+})
+
+
+@dataclass(frozen=True)
+class TenantSettings:
+    """Колледж из манифеста: имя и его настройки"""
+    name: str
+    config: Config
+
+
+def parse_manifest(entries: Any, defaults: Config) -> List[TenantSettings]:
+    """Разобрать список колледжей.
+
+    Каждый элемент — {"name": "...", "BOT_TOKEN": "...", "DATABASE_URL": "..."}
+    и, при необходимости, другие поля Config (SEND_RATE, MORNING_PUSH_TIMES, ...);
+    не указанные поля берутся из defaults.
+    """
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("Манифест должен быть непустым списком колледжей")
+
+    types: Dict[str, type] = {item.name: item.type for item in fields(Config) if item.name not in SHARED_SETTINGS}
+    tenants = []
+    seen: Dict[str, set] = {"name": set(), "BOT_TOKEN": set(), "DATABASE_URL": set()}
+    for number, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"Колледж №{number}: ожидается объект")
+        entry = dict(entry)
+        name = str(entry.pop("name", "")).strip()
+        if not name:
+            raise ValueError(f"Колледж №{number}: не задано имя (name)")
+        unknown = set(entry) - set(types)
+        if unknown:
+            raise ValueError(f"Колледж {name}: неизвестные настройки {', '.join(sorted(unknown))}")
+        config = replace(defaults, **{key: types[key](value) for key, value in entry.items()})
+        try:
+            validate_token(config.BOT_TOKEN)
+        except TokenValidationError:
+            raise ValueError(f"Колледж {name}: неверный BOT_TOKEN") from None
+        # Один бот или одна база на два колледжа смешали бы их данные
+        for key, value in (("name", name), ("BOT_TOKEN", config.BOT_TOKEN), ("DATABASE_URL", config.DATABASE_URL)):
+            if value in seen[key]:
+                raise ValueError(f"Колледж {name}: {key} совпадает с другим колледжем")
+            seen[key].add(value)
+        tenants.append(TenantSettings(name, config))
+    return tenants
+
+
+def load_manifest(path: str, defaults: Config) -> List[TenantSettings]:
+    """Прочитать манифест колледжей из JSON-файла"""
+    with open(path, encoding="utf-8") as f:
+        return parse_manifest(json.load(f), defaults)
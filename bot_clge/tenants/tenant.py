@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from database import Database, SQLiteDatabase, Archiver, AuditLog, create_database, parse_term_starts
+from database.backup import BackupManager
+from reports import ReportManager
+from scheduler import BackgroundTasks, BatchSender, MorningPush, parse_push_times, LessonReminders, parse_bell_times
+from utils import ScheduleSearch
+from .manifest import TenantSettings
+
+logger = logging.getLogger(__name__)
+
+
+class Tenant:
+    """Один колледж в общем процессе: свой бот, база, кэши и лимиты.
+
+    Диспетчер и роутеры у всех колледжей общие; TenantMiddleware по боту,
+    получившему апдейт, подставляет в обработчики data этого колледжа
+    (db, sender, tasks, reports, ...). Снимок справочников, кэш сводок и
+    объединение запросов живут в его Database, ограничение скорости
+    рассылок — в его BatchSender, поэтому колледжи не делят ни данные,
+    ни лимиты Telegram. Общими остаются HTTP-сеанс и пул процессов отчётов.
+    """
+
+    def __init__(self, settings: TenantSettings, session: Optional[BaseSession] = None,
+                 report_executor: Optional[Executor] = None):
+        self.name = settings.name
+        self.config = settings.config
+        self.bot = Bot(token=self.config.BOT_TOKEN, session=session)
+        self.report_executor = report_executor
+        self.db: Optional[Database] = None
+        # Данные для обработчиков этого колледжа
+        self.data: Dict[str, Any] = {}
+        self._background: List[asyncio.Task] = []
+        self.started_at: Optional[float] = None
+        self.updates = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self.max_time = 0.0
+        # Апдейты, отброшенные ThrottlingMiddleware
+        self.throttled = 0
+
+    @property
+    def bot_id(self) -> int:
+        return self.bot.id
+
+    async def start(self):
+        """Открыть базу, построить снимок и запустить фоновые рассылки"""
+        config = self.config
+        self.db = db = create_database(config.DATABASE_URL)
+        await db.init_db()
+
+        started = time.perf_counter()
+        snapshot = await db.load_snapshot()
+        logger.info(
+            "[%s] Снимок справочников построен за %.1f мс: групп %d, учителей %d",
+            self.name, (time.perf_counter() - started) * 1000, len(snapshot.groups), len(snapshot.teachers)
+        )
+
+        sender = BatchSender(self.bot, rate=config.SEND_RATE)
+        term_starts = parse_term_starts(config.TERM_STARTS)
+        morning_push = MorningPush(db, sender, parse_push_times(config.MORNING_PUSH_TIMES))
+        lesson_reminders = LessonReminders(
+            db, sender, parse_bell_times(config.BELL_TIMES), minutes_before=config.REMINDER_MINUTES
+        )
+        # Архив семестров и резервные копии работают с файлом SQLite
+        archiver = backups = None
+        if isinstance(db, SQLiteDatabase):
+            archiver = Archiver(db, term_starts)
+            backups = BackupManager(db, keep=config.BACKUP_KEEP)
+        # Журнал действий администраторов пишется пакетами в фоне
+        audit = AuditLog(db)
+        # Инлайн-поиск расписания отвечает из памяти, индекс строится сразу
+        schedule_search = ScheduleSearch(db, cache_time=config.INLINE_CACHE_TIME)
+        schedule_search.rebuild()
+        self.data = {
+            "db": db,
+            "audit": audit,
+            "sender": sender,
+            "tasks": BackgroundTasks(limit=config.BACKGROUND_TASKS),
+            "morning_push": morning_push,
+            "lesson_reminders": lesson_reminders,
+            "term_starts": term_starts,
+            "archiver": archiver,
+            "backups": backups,
+            "reports": ReportManager(db, self.report_executor, max_jobs=config.REPORT_WORKERS),
+            "schedule_search": schedule_search,
+            "tenant": self,
+        }
+
+        self._background = [
+            asyncio.create_task(morning_push.run_forever()),
+            asyncio.create_task(lesson_reminders.run_forever()),
+            asyncio.create_task(audit.run_forever()),
+        ]
+        if backups is not None and config.BACKUP_INTERVAL_HOURS > 0:
+            self._background.append(
+                asyncio.create_task(backups.run_forever(timedelta(hours=config.BACKUP_INTERVAL_HOURS)))
+            )
+        self.started_at = time.monotonic()
+
+    async def close(self):
+        """Остановить фоновые рассылки, дождаться задач и закрыть базу"""
+        for task in self._background:
+            task.cancel()
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        self._background = []
+
+        tasks: Optional[BackgroundTasks] = self.data.get("tasks")
+        if tasks is not None:
+            # Уведомления дожидаются, пока сессия бота и база ещё открыты
+            await tasks.close()
+            logger.info("[%s] Фоновые задачи: %s", self.name, tasks.metrics())
+        audit: Optional[AuditLog] = self.data.get("audit")
+        if audit is not None:
+            await audit.close()
+            logger.info("[%s] Журнал действий: %s", self.name, audit.metrics())
+        if self.db is not None:
+            logger.info("[%s] Объединение запросов к БД: %s", self.name, self.db.flights.metrics())
+            await self.db.close()
+            self.db = None
+
+    def record(self, elapsed: float, failed: bool = False):
+        """Учесть обработанный апдейт"""
+        self.updates += 1
+        self.errors += failed
+        self.busy_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Нагрузка и ресурсы колледжа"""
+        db = self.db
+        sender: Optional[BatchSender] = self.data.get("sender")
+        tasks: Optional[BackgroundTasks] = self.data.get("tasks")
+        reports: Optional[ReportManager] = self.data.get("reports")
+        schedule_search: Optional[ScheduleSearch] = self.data.get("schedule_search")
+        uptime = time.monotonic() - self.started_at if self.started_at is not None else 0.0
+        return {
+            'name': self.name,
+            'bot_id': self.bot_id,
+            'uptime': uptime,
+            'updates': self.updates,
+            'errors': self.errors,
+            'throttled': self.throttled,
+            'busy_ms': self.busy_time * 1000,
+            'avg_ms': self.busy_time * 1000 / self.updates if self.updates else 0.0,
+            'max_ms': self.max_time * 1000,
+            'snapshot_kb': db.snapshot.memory_size() / 1024 if db is not None and db.snapshot else 0.0,
+            'grade_stats': db.grade_stats.metrics() if db is not None else {},
+            'sent': sender.sent if sender else 0,
+            'send_failed': sender.failed if sender else 0,
+            'tasks': tasks.metrics() if tasks else {},
+            'reports': reports.status() if reports else {},
+            'schedule_search': schedule_search.metrics() if schedule_search else {},
+        }
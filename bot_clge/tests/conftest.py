@@ -0,0 +1,69 @@
+"""Общие фикстуры тестов.
+
+Тесты запускаются из каталога bot_clge: python -m pytest -q. Каждый тест
+хранилища проходит на SQLite и на PostgreSQL; для PostgreSQL нужен DSN
+сервера в TEST_POSTGRES_DSN (база, из которой можно создавать другие,
+например postgresql://postgres@localhost/postgres), без него эти тесты
+пропускаются. Под каждый тест создаётся и затем удаляется отдельная база.
+"""
+import asyncio
+import os
+import sys
+import uuid
+from typing import Awaitable, Callable
+from urllib.parse import urlsplit, urlunsplit
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, create_database  # noqa: E402
+
+POSTGRES_DSN = os.getenv("TEST_POSTGRES_DSN", "")
+
+
+class Backend:
+    """Открывает чистую базу движка на время сценария"""
+
+    def __init__(self, name: str, tmp_path):
+        self.name = name
+        self.tmp_path = tmp_path
+        # Адрес базы текущего сценария (для второго подключения к ней)
+        self.url = ""
+
+    def run(self, scenario: Callable[[Database], Awaitable]):
+        """Выполнить сценарий над новой базой в отдельном цикле событий"""
+        return asyncio.run(self._run(scenario))
+
+    async def _run(self, scenario):
+        if self.name == "sqlite":
+            return await self._with_database(str(self.tmp_path / "bot.db"), scenario)
+        import asyncpg
+        name = f"bot_test_{uuid.uuid4().hex[:12]}"
+        server = await asyncpg.connect(POSTGRES_DSN)
+        try:
+            await server.execute(f'CREATE DATABASE "{name}"')
+            try:
+                parts = urlsplit(POSTGRES_DSN)
+                return await self._with_database(urlunsplit(parts._replace(path="/" + name)), scenario)
+            finally:
+                await server.execute(f'DROP DATABASE IF EXISTS "{name}"')
+        finally:
+            await server.close()
+
+    async def _with_database(self, url: str, scenario):
+        self.url = url
+        db = create_database(url)
+        await db.init_db()
+        await db.load_snapshot()
+        try:
+            return await scenario(db)
+        finally:
+            await db.close()
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def backend(request, tmp_path) -> Backend:
+    if request.param == "postgres" and not POSTGRES_DSN:
+        pytest.skip("TEST_POSTGRES_DSN не задан")
+    return Backend(request.param, tmp_path)
@@ -0,0 +1,60 @@
+"""Архивация закрытых семестров (только SQLite)"""
+import asyncio
+import sqlite3
+from datetime import date
+
+from database import Archiver, SQLiteDatabase
+
+from test_database import seed
+
+# 2025-10-01 и 2026-10-01 10:00 UTC: прошлый осенний семестр и текущий
+OLD = 1759312800
+NEW = 1790848800
+TODAY = date(2026, 10, 19)
+
+
+def test_old_database_switched_to_incremental_vacuum_on_init(tmp_path):
+    path = str(tmp_path / "old.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE groups (group_id INTEGER PRIMARY KEY AUTOINCREMENT, group_name TEXT NOT NULL UNIQUE)")
+        conn.execute("INSERT INTO groups (group_name) VALUES ('ИС-21')")
+
+    async def scenario():
+        db = SQLiteDatabase(path)
+        await db.init_db()
+        try:
+            async with db._read() as conn:
+                async with conn.execute("PRAGMA auto_vacuum") as cursor:
+                    mode = (await cursor.fetchone())[0]
+            return mode, [group.group_name for group in await db.get_all_groups()]
+        finally:
+            await db.close()
+
+    assert asyncio.run(scenario()) == (2, ["ИС-21"])
+
+
+def test_archived_messages_leave_no_dangling_threads(tmp_path):
+    async def scenario():
+        db = SQLiteDatabase(str(tmp_path / "bot.db"))
+        await db.init_db()
+        await db.load_snapshot()
+        try:
+            await seed(db)
+            await db.add_message(10, 1, "давно", OLD)
+            await db.add_message(1, 10, "недавно", NEW)
+            await db.add_message(10, 2, "только старое", OLD)
+            moved = await Archiver(db, [(9, 1), (2, 1)], batch_size=1, pause=0).archive_closed_terms(TODAY)
+            async with db._read() as conn:
+                async with conn.execute("""
+                    SELECT COUNT(*) FROM message_threads
+                    WHERE last_message_id IS NOT NULL AND last_message_id NOT IN (SELECT message_id FROM messages)
+                """) as cursor:
+                    dangling = (await cursor.fetchone())[0]
+            return moved, dangling, {thread.counterpart_id: thread.last_text for thread in await db.get_threads(10)}
+        finally:
+            await db.close()
+
+    moved, dangling, threads = asyncio.run(scenario())
+    assert moved == {"messages:2025-09": 2}
+    assert dangling == 0
+    assert threads == {1: "недавно", 2: None}
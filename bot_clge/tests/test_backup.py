@@ -0,0 +1,39 @@
+"""Резервные копии из командной строки (только SQLite)"""
+import asyncio
+import os
+import sqlite3
+
+from database.backup import _main
+
+
+def schema(path: str):
+    with sqlite3.connect(path) as conn:
+        tables = conn.execute("SELECT name, sql FROM sqlite_master ORDER BY name").fetchall()
+        return tables, conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+
+def test_list_and_create_leave_database_unchanged(tmp_path, capsys):
+    # База старой версии: init_db добавил бы таблицы и перевёл её на auto_vacuum
+    path = str(tmp_path / "bot.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE groups (group_id INTEGER PRIMARY KEY AUTOINCREMENT, group_name TEXT NOT NULL UNIQUE)")
+        conn.execute("INSERT INTO groups (group_name) VALUES ('ИС-21')")
+    before = schema(path)
+    assert before[1] == 0
+
+    assert asyncio.run(_main(["--db", path, "list"])) == 0
+    assert capsys.readouterr().out == ""
+    assert asyncio.run(_main(["--db", path, "create"])) == 0
+
+    assert schema(path) == before
+    backups = os.listdir(tmp_path / "backups")
+    assert len(backups) == 1 and backups[0] in capsys.readouterr().out
+    with sqlite3.connect(str(tmp_path / "backups" / backups[0])) as conn:
+        assert conn.execute("SELECT group_name FROM groups").fetchall() == [("ИС-21",)]
+
+
+def test_create_without_database(tmp_path, capsys):
+    path = str(tmp_path / "missing.db")
+    assert asyncio.run(_main(["--db", path, "create"])) == 1
+    assert "Копия не снята" in capsys.readouterr().out
+    assert not os.path.exists(path)
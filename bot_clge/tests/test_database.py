@@ -0,0 +1,407 @@
+"""Контракт Database: одинаковое поведение SQLiteDatabase и PostgresDatabase.
+
+Каждый публичный метод Database вызывается хотя бы в одном сценарии
+(проверяет test_every_method_covered), сценарии идут на обоих движках.
+"""
+import asyncio
+import inspect
+import json
+from contextlib import aclosing
+
+from database import Database, Grade, User, create_database
+from database.groups import GroupPlan, GroupSplit
+from database.schedule import GROUP_SLOT, TEACHER_SLOT, lesson
+
+# 2026-10-01 10:00 и 2026-10-02 10:00 UTC
+DAY1 = 1790848800
+DAY2 = 1790935200
+
+
+async def seed(db: Database):
+    """Две группы, учитель, администратор и три студента"""
+    g1 = await db.create_group("ИС-21")
+    g2 = await db.create_group("ПО-22")
+    await db.add_user(10, "t", "Teacher", role="teacher")
+    await db.add_user(99, "adm", "Admin", role="admin")
+    await db.add_user(1, "a", "Anna", group_id=g1)
+    await db.add_user(2, "b", "Boris", group_id=g1)
+    await db.add_user(3, "c", "Clara", group_id=g2)
+    return g1, g2
+
+
+def test_init_db_is_idempotent(backend):
+    async def scenario(db):
+        g1, _ = await seed(db)
+        await db.init_db()
+        return [group.group_name for group in await db.get_all_groups()], await db.get_user(1)
+
+    groups, user = backend.run(scenario)
+    assert groups == ["ИС-21", "ПО-22"]
+    assert user.full_name == "Anna"
+
+
+def test_close_twice(backend):
+    async def scenario(db):
+        await db.close()
+        await db.close()
+
+    backend.run(scenario)
+
+
+def test_users(backend):
+    async def scenario(db):
+        g1, g2 = await seed(db)
+        await db.add_user(1, "a2", "Anna B", group_id=g1)
+        await db.update_user_role(3, "teacher")
+        await db.update_user_group(2, g2)
+        await db.delete_user_from_group(3)
+        return {
+            'user': await db.get_user(1),
+            'missing': await db.get_user(404),
+            'by_ids': await db.get_users_by_ids([3, 1, 1, 404]),
+            'no_ids': await db.get_users_by_ids([]),
+            'teachers': sorted(user.user_id for user in await db.get_users_by_role("teacher")),
+            'students': sorted(user.user_id for user in await db.get_users_by_role("student")),
+            'iter_students': sorted([user.user_id async for user in db.iter_users_by_role("student")]),
+            'group': sorted(user.user_id for user in await db.get_users_by_group(g2)),
+            'iter_group': sorted([user.user_id async for user in db.iter_users_by_group(g2)]),
+            'clara': await db.get_user(3),
+        }
+
+    result = backend.run(scenario)
+    assert type(result['user']) is User
+    assert result['user'].username == "a2" and result['user'].full_name == "Anna B"
+    assert result['missing'] is None
+    assert sorted(result['by_ids']) == [1, 3]
+    assert result['no_ids'] == {}
+    assert result['teachers'] == [3, 10]
+    assert result['students'] == result['iter_students'] == [1, 2]
+    assert result['group'] == result['iter_group'] == [2]
+    assert result['clara'].role == "teacher" and result['clara'].group_id is None
+
+
+def test_iterator_closed_early_returns_connection(backend):
+    async def scenario(db):
+        await seed(db)
+        async with aclosing(db.iter_users_by_role("student")) as users:
+            async for _ in users:
+                break
+        return len(await db.get_users_by_role("student"))
+
+    assert backend.run(scenario) == 3
+
+
+def test_close_waits_for_reads_in_flight(backend):
+    async def scenario(db):
+        await seed(db)
+        names = []
+        async with aclosing(db.iter_users_by_role("student")) as users:
+            async for user in users:
+                if not names:
+                    closing = asyncio.create_task(db.close())
+                    await asyncio.sleep(0.1)
+                    assert not closing.done()
+                names.append(user.full_name)
+        await closing
+        return names
+
+    assert backend.run(scenario) == ["Anna", "Boris", "Clara"]
+
+
+def test_close_does_not_hang_on_abandoned_iterator(backend):
+    async def scenario(db):
+        await seed(db)
+        db.CLOSE_TIMEOUT = 0.2
+        # Перебор брошен без aclose() и держит соединение
+        users = db.iter_users_by_role("student")
+        first = await users.__anext__()
+        await asyncio.wait_for(db.close(), 5)
+        return first.full_name, users
+
+    name, _ = backend.run(scenario)
+    assert name == "Anna"
+
+
+def test_groups_and_snapshot(backend):
+    async def scenario(db):
+        g1, g2 = await seed(db)
+        before = db.snapshot
+        found = await db.get_group_by_name("ПО-22")
+        result = {
+            'by_name': found.group_id == g2,
+            'by_name_missing': await db.get_group_by_name("нет"),
+            'by_id': (await db.get_group_by_id(g1)).group_name,
+            'snapshot_groups': [group.group_name for group in db.snapshot.groups],
+            'snapshot_teachers': [teacher.full_name for teacher in db.snapshot.teachers],
+            'snapshot_changed': db.snapshot.version > before.version or before.groups != db.snapshot.groups,
+        }
+        await db.delete_group(g2)
+        result['after_delete'] = [group.group_name for group in await db.get_all_groups()]
+        result['snapshot_after_delete'] = [group.group_name for group in db.snapshot.groups]
+        result['detached'] = (await db.get_user(3)).group_id
+        reloaded = await db.load_snapshot()
+        result['reloaded'] = [group.group_name for group in reloaded.groups]
+        return result
+
+    result = backend.run(scenario)
+    assert result['by_name'] and result['by_name_missing'] is None
+    assert result['by_id'] == "ИС-21"
+    assert result['snapshot_groups'] == ["ИС-21", "ПО-22"]
+    assert result['snapshot_teachers'] == ["Teacher"]
+    assert result['after_delete'] == result['snapshot_after_delete'] == result['reloaded'] == ["ИС-21"]
+    assert result['detached'] is None
+
+
+def test_apply_group_plan(backend):
+    async def scenario(db):
+        g1, g2 = await seed(db)
+        g3 = await db.create_group("ОП-41")
+        await db.add_user(4, "d", "Dmitry", group_id=g3)
+        await db.add_schedule(g3, 1, 1, "Math", 10)
+        await db.add_schedule(g1, 1, 2, "Math", 10)
+        plan = GroupPlan(renames={g2: "ПО-32"}, archive=(g3,), splits=(GroupSplit(g1, "ИС-22", (2,)),))
+        dry = await db.apply_group_plan(plan, dry_run=True)
+        untouched = [group.group_name for group in await db.get_all_groups()]
+        report = await db.apply_group_plan(plan)
+        new_group = await db.get_group_by_name("ИС-22")
+        return {
+            'dry': dry.counts(),
+            'untouched': untouched,
+            'report': report.counts(),
+            'renamed': report.renamed,
+            'groups': sorted(group.group_name for group in await db.get_all_groups()),
+            'split': (await db.get_user(2)).group_id == new_group.group_id,
+            'archived_student': (await db.get_user(4)).group_id,
+            'archived_schedule': await db.get_schedule_by_group(g3),
+        }
+
+    result = backend.run(scenario)
+    assert result['dry'] == result['report']
+    assert result['untouched'] == ["ИС-21", "ПО-22", "ОП-41"]
+    assert result['report']['groups_created'] == 1
+    assert result['report']['groups_renamed'] == 1
+    assert result['report']['groups_archived'] == 1
+    assert result['report']['schedule_deleted'] == 1
+    assert result['report']['schedule_to_assign'] == 1
+    assert result['renamed'] == (("ПО-22", "ПО-32"),)
+    assert result['groups'] == ["ИС-21", "ИС-22", "ПО-32"]
+    assert result['split']
+    assert result['archived_student'] is None
+    assert result['archived_schedule'] == []
+
+
+def test_schedule(backend):
+    async def scenario(db):
+        g1, g2 = await seed(db)
+        await db.add_user(11, "t2", "Second", role="teacher")
+        result = {
+            'added': await db.add_schedule(g1, 1, 1, "Math", 10),
+            'same_again': await db.add_schedule(g1, 1, 1, "Math", 10),
+            'busy_teacher': await db.add_schedule(g2, 1, 1, "Phys", 10),
+            'busy_slot': await db.add_schedule(g1, 1, 1, "Chem", 11),
+        }
+        result['replaced'] = await db.add_schedule(g1, 1, 1, "Chem", 11, replace=True)
+        result['batch_clash'] = await db.set_schedule([lesson(g2, 2, 1, "Math", 10), lesson(g2, 2, 1, "Art", 11)])
+        result['batch'] = await db.set_schedule([lesson(g2, 2, 1, "Math", 10), lesson(g2, 2, 2, "Art", 11)])
+        result['g1'] = [(s.day_of_week, s.lesson_number, s.subject, s.teacher_name)
+                        for s in await db.get_schedule_by_group(g1)]
+        result['g2'] = [(s.day_of_week, s.lesson_number, s.subject) for s in await db.get_schedule_by_group(g2)]
+        result['snapshot'] = [s.subject for s in db.snapshot.get_schedule(g2)]
+        result['students_10'] = sorted(user.user_id for user in await db.get_students_by_teacher(10))
+        result['students_11'] = sorted(user.user_id for user in await db.get_students_by_teacher(11))
+        return result
+
+    result = backend.run(scenario)
+    assert result['added'] == [] and result['same_again'] == []
+    assert [c.kind for c in result['busy_teacher']] == [TEACHER_SLOT]
+    assert [c.kind for c in result['busy_slot']] == [GROUP_SLOT]
+    assert result['busy_slot'][0].existing.subject == "Math"
+    assert result['replaced'] == []
+    assert [c.kind for c in result['batch_clash']] == [GROUP_SLOT]
+    assert result['batch'] == []
+    assert result['g1'] == [(1, 1, "Chem", "Second")]
+    assert result['g2'] == [(2, 1, "Math"), (2, 2, "Art")]
+    assert result['snapshot'] == ["Math", "Art"]
+    assert result['students_10'] == [3]
+    assert result['students_11'] == [1, 2, 3]
+
+
+def test_grades(backend):
+    async def scenario(db):
+        g1, _ = await seed(db)
+        await db.add_grade(1, 10, "Math", 5, DAY1)
+        await db.add_grade(1, 10, "Phys", 4, DAY2)
+        await db.add_grade(2, 10, "Math", 2, DAY2)
+        stats = await db.get_group_grade_stats(g1)
+        return {
+            'grades': await db.get_grades_by_student(1),
+            'iter': [grade async for grade in db.iter_grades_by_student(1)],
+            'between': [g.subject for g in await db.get_grades_between(1, DAY1, DAY2)],
+            'between_shifted': [g.subject for g in await db.get_grades_between(1, DAY1 + 1, DAY2 + 1)],
+            'subject': sorted((g.student_id, g.date) for g in await db.get_subject_grades_between("Math", 0, 2 ** 40)),
+            'group_rows': [row async for row in db.iter_group_grades(g1)],
+            'stats': stats,
+        }
+
+    result = backend.run(scenario)
+    assert all(type(grade) is Grade for grade in result['grades'])
+    assert sorted(result['grades']) == sorted(result['iter'])
+    assert sorted((g.subject, g.grade, g.date, g.teacher_name) for g in result['grades']) == [
+        ("Math", 5, DAY1, "Teacher"), ("Phys", 4, DAY2, "Teacher")
+    ]
+    assert result['between'] == ["Math"]
+    assert result['between_shifted'] == ["Phys"]
+    assert result['subject'] == [(1, DAY1), (2, DAY2)]
+    assert result['group_rows'] == [
+        ("Anna", "Math", 5, DAY1, "Teacher"), ("Anna", "Phys", 4, DAY2, "Teacher"),
+        ("Boris", "Math", 2, DAY2, "Teacher"),
+    ]
+    stats = result['stats']
+    assert stats.total.count == 3
+    assert {s.subject: s.count for s in stats.subjects} == {"Math": 2, "Phys": 1}
+    assert [student.user_id for student in stats.failing] == [2]
+    assert stats.student_ids == frozenset({1, 2})
+
+
+def test_messages(backend):
+    async def scenario(db):
+        await seed(db)
+        ids = [await db.add_message(10, 1, f"m{i}", DAY1 + i) for i in range(5)]
+        reply = await db.add_message(1, 10, "ответ", DAY1 + 10)
+        result = {
+            'ids': ids + [reply],
+            'page1': [m.message_text for m in await db.get_conversation(1, 10, limit=3)],
+            'unread': await db.get_unread_count(1),
+            'threads': await db.get_threads(1),
+            'teacher_threads': await db.get_threads(10),
+        }
+        page1 = await db.get_conversation(1, 10, limit=3)
+        result['page2'] = [m.message_text for m in await db.get_conversation(1, 10, before_id=page1[-1].message_id,
+                                                                             limit=3)]
+        await db.mark_thread_read(1, 10)
+        result['unread_after'] = await db.get_unread_count(1)
+        result['no_threads'] = await db.get_threads(2)
+        return result
+
+    result = backend.run(scenario)
+    assert len(set(result['ids'])) == 6
+    assert result['page1'] == ["ответ", "m4", "m3"]
+    assert result['page2'] == ["m2", "m1", "m0"]
+    assert result['unread'] == 5
+    thread = result['threads'][0]
+    assert (thread.counterpart_id, thread.unread, thread.last_text, thread.last_from_user_id) == (10, 5, "ответ", 1)
+    assert thread.counterpart_name == "Teacher" and thread.last_timestamp == DAY1 + 10
+    assert result['teacher_threads'][0].unread == 1
+    assert result['unread_after'] == 0
+    assert result['no_threads'] == []
+
+
+def test_reminders_and_scheduler_runs(backend):
+    async def scenario(db):
+        g1, _ = await seed(db)
+        await db.set_reminders(1, True)
+        await db.set_reminders(1, True)
+        await db.set_reminders(2, True)
+        await db.set_reminders(2, False)
+        await db.save_scheduler_run("digest", "2026-10-01 07:30:00")
+        await db.save_scheduler_run("digest", "2026-10-02 07:30:00", 1.5, 3, 1)
+        return {
+            'enabled': (await db.get_reminders_enabled(1), await db.get_reminders_enabled(2),
+                        await db.get_reminders_enabled(404)),
+            'subscribers': await db.get_reminder_subscribers(g1),
+            'run': await db.get_scheduler_run("digest"),
+            'no_run': await db.get_scheduler_run("нет"),
+        }
+
+    result = backend.run(scenario)
+    assert result['enabled'] == (True, False, False)
+    assert result['subscribers'] == [1]
+    run = result['run']
+    assert (run['last_run'], run['duration'], run['sent'], run['failed']) == ("2026-10-02 07:30:00", 1.5, 3, 1)
+    assert result['no_run'] is None
+
+
+def test_audit_log(backend):
+    async def scenario(db):
+        await db.add_audit_entries([
+            (DAY1 + i, 99 if i % 2 else 10, "grade.add", i, json.dumps({'n': i})) for i in range(6)
+        ])
+        await db.add_audit_entries([])
+        page1 = await db.get_audit_log(limit=4)
+        return {
+            'page1': [entry.target_id for entry in page1],
+            'page2': [entry.target_id for entry in await db.get_audit_log(before_id=page1[-1].audit_id, limit=4)],
+            'actor': [entry.target_id for entry in await db.get_audit_log(actor_id=99)],
+            'target': [entry.actor_id for entry in await db.get_audit_log(target_id=2)],
+            'period': [entry.target_id for entry in await db.get_audit_log(start=DAY1 + 1, end=DAY1 + 3)],
+            'iter': [entry.target_id async for entry in db.iter_audit_log(start=DAY1 + 4)],
+            'details': json.loads((await db.get_audit_log(limit=1))[0].details),
+        }
+
+    result = backend.run(scenario)
+    assert result['page1'] == [5, 4, 3, 2]
+    assert result['page2'] == [1, 0]
+    assert result['actor'] == [5, 3, 1]
+    assert result['target'] == [10]
+    assert result['period'] == [2, 1]
+    assert result['iter'] == [4, 5]
+    assert result['details'] == {'n': 5}
+
+
+def test_every_method_covered():
+    """Новый публичный метод Database должен попасть в один из сценариев"""
+    source = inspect.getsource(inspect.getmodule(test_every_method_covered))
+    methods = [
+        name for name, member in inspect.getmembers(Database)
+        if not name.startswith("_") and callable(member) and name != "transaction"
+    ]
+    missing = [name for name in methods if f"db.{name}(" not in source]
+    assert not missing, f"Не покрыты тестами: {', '.join(missing)}"
+
+
+def test_schedule_slot_migration_keeps_removed_rows(backend):
+    async def scenario(db):
+        g1, g2 = await seed(db)
+        await db.add_user(11, "t2", "Second", role="teacher")
+        async with db.transaction() as conn:
+            # Схема до уникальных слотов: повторы в слоте группы и учителя
+            for index in ("idx_schedule_slot", "idx_schedule_teacher_slot"):
+                await conn.execute(f"DROP INDEX {index}")
+            for group_id, subject, teacher_id in ((g1, "Math", 10), (g1, "Phys", 11), (g2, "Chem", 11)):
+                await conn.execute(
+                    "INSERT INTO schedule (group_id, day_of_week, lesson_number, subject, teacher_id) "
+                    f"VALUES ({group_id}, 1, 1, '{subject}', {teacher_id})"
+                )
+        await db.init_db()
+        await db.load_snapshot()
+        removed = await db._fetch_all(tuple, "SELECT subject, reason FROM schedule_removed ORDER BY schedule_id")
+        return (
+            removed,
+            [s.subject for group_id in (g1, g2) for s in await db.get_schedule_by_group(group_id)],
+        )
+
+    removed, kept = backend.run(scenario)
+    assert removed == [("Math", GROUP_SLOT), ("Phys", TEACHER_SLOT)]
+    assert kept == ["Chem"]
+
+
+def test_open_readonly(backend):
+    async def scenario(db):
+        await seed(db)
+        await db.add_audit_entries([(DAY1, 99, "group.create", None, None)])
+        readonly_db = create_database(backend.url)
+        await readonly_db.open_readonly()
+        try:
+            rows = ([group.group_name for group in await readonly_db.get_all_groups()],
+                    [entry.action async for entry in readonly_db.iter_audit_log()])
+            try:
+                await readonly_db.add_user(5, "e", "Eva")
+            except Exception:
+                return rows, True
+            return rows, False
+        finally:
+            await readonly_db.close()
+
+    rows, refused = backend.run(scenario)
+    assert rows == (["ИС-21", "ПО-22"], ["group.create"])
+    assert refused
@@ -0,0 +1,39 @@
+"""Хранилище FSM: диспетчер использует именно его и вытесняет брошенные сценарии"""
+import asyncio
+
+from aiogram import Dispatcher
+from aiogram.fsm.storage.base import StorageKey
+
+from fsm import CompactMemoryStorage
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_dispatcher_keeps_empty_storage():
+    storage = CompactMemoryStorage()
+    dp = Dispatcher(storage=storage)
+    assert dp.storage is storage
+
+
+def test_expired_and_evicted():
+    clock = Clock()
+    storage = CompactMemoryStorage(ttl=10, max_entries=2, clock=clock)
+
+    async def scenario():
+        keys = [StorageKey(bot_id=1, chat_id=user, user_id=user) for user in (1, 2, 3)]
+        for key in keys:
+            await storage.set_state(key, "Form:name")
+        assert len(storage) == 2 and storage.evicted == 1
+        assert await storage.get_state(keys[0]) is None
+        await storage.set_state(keys[1], None)
+        assert len(storage) == 1
+        clock.now = 10
+        assert storage.sweep() == 1 and len(storage) == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,66 @@
+"""Отчёты XLSX: журнал отметок собирается порциями в пуле процессов"""
+import io
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+from database.periods import utc_offset
+from reports import ReportManager, render_xlsx
+from reports.manager import GRADEBOOK_DATE_COLUMNS, GRADEBOOK_HEADER
+from reports.xlsx import render_rows
+
+from test_database import DAY1, seed
+
+
+class RecordingExecutor(ProcessPoolExecutor):
+    """Пул процессов, запоминающий размер порций, переданных в render_rows"""
+
+    def __init__(self):
+        super().__init__(max_workers=1)
+        self.chunks = []
+
+    def submit(self, fn, *args, **kwargs):
+        if fn is render_rows:
+            self.chunks.append(len(args[0]))
+        return super().submit(fn, *args, **kwargs)
+
+
+class FakeBot:
+    def __init__(self):
+        self.files = []
+
+    async def send_document(self, chat_id, document, caption=None):
+        self.files.append(document.data)
+        return SimpleNamespace(document=SimpleNamespace(file_id=f"file{len(self.files)}"))
+
+
+def sheet(data: bytes) -> bytes:
+    return zipfile.ZipFile(io.BytesIO(data)).read("xl/worksheets/sheet1.xml")
+
+
+def test_gradebook_is_rendered_in_chunks(backend):
+    async def scenario(db):
+        g1, _ = await seed(db)
+        async with db.transaction() as conn:
+            for i in range(2500):
+                student = (1, 2)[i % 2]
+                await conn.execute(
+                    "INSERT INTO grades (student_id, teacher_id, subject, grade, date) "
+                    f"VALUES ({student}, 10, 'Предмет {i % 7}', {2 + i % 4}, {DAY1 + i * 60})"
+                )
+        rows = [row async for row in db.iter_group_grades(g1)]
+        executor = RecordingExecutor()
+        try:
+            bot = FakeBot()
+            manager = ReportManager(db, executor, chunk_rows=700)
+            await manager.send_gradebook(bot, 1, g1, "ИС-21")
+        finally:
+            executor.shutdown()
+        expected = render_xlsx("Журнал отметок: ИС-21", GRADEBOOK_HEADER, rows, "Отчёт",
+                               GRADEBOOK_DATE_COLUMNS, utc_offset())
+        return executor.chunks, bot.files, expected
+
+    chunks, files, expected = backend.run(scenario)
+    assert chunks == [700, 700, 700, 400]
+    assert len(files) == 1
+    assert sheet(files[0]) == sheet(expected)
@@ -0,0 +1,82 @@
+"""Объединение одинаковых запросов (@single_flight) и порядок с записью"""
+import asyncio
+
+from database.singleflight import SingleFlight
+
+from test_database import DAY1, DAY2, seed
+
+
+def hold_after_query(db, method: str):
+    """Задержать ответ метода движка после выполнения запроса.
+
+    Возвращает (выполнен, отпустить): первое событие ставится, когда
+    запрос уже прочитал строки, второе нужно поставить, чтобы вызов вернулся.
+    """
+    fetched, release = asyncio.Event(), asyncio.Event()
+    original = getattr(db, method)
+
+    async def held(*args, **kwargs):
+        result = await original(*args, **kwargs)
+        fetched.set()
+        await release.wait()
+        return result
+
+    setattr(db, method, held)
+    return fetched, release
+
+
+def test_same_calls_share_one_query():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+
+        async def query():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        results = await asyncio.gather(*(flights.do("query", (), query) for _ in range(5)))
+        return calls, results
+
+    calls, results = asyncio.run(scenario())
+    assert calls == 1
+    assert results == [1] * 5
+
+
+def test_read_after_write_does_not_join_earlier_read(backend):
+    async def scenario(db):
+        await seed(db)
+        await db.add_grade(1, 10, "Math", 5, DAY1)
+        fetched, release = hold_after_query(db, "_fetch_all")
+        before = asyncio.create_task(db.get_grades_by_student(1))
+        await fetched.wait()
+        await db.add_grade(1, 10, "Phys", 4, DAY2)
+        after = asyncio.create_task(db.get_grades_by_student(1))
+        await asyncio.sleep(0)
+        release.set()
+        return await before, await after
+
+    before, after = backend.run(scenario)
+    assert [grade.subject for grade in before] == ["Math"]
+    assert sorted(grade.subject for grade in after) == ["Math", "Phys"]
+
+
+def test_grade_stats_after_grade_is_recomputed(backend):
+    async def scenario(db):
+        g1, _ = await seed(db)
+        await db.add_grade(1, 10, "Math", 5, DAY1)
+        fetched, release = hold_after_query(db, "_fetch_group_grade_stats")
+        before = asyncio.create_task(db.get_group_grade_stats(g1))
+        await fetched.wait()
+        await db.add_grade(2, 10, "Math", 2, DAY2)
+        after = asyncio.create_task(db.get_group_grade_stats(g1))
+        await asyncio.sleep(0)
+        release.set()
+        before, after = await before, await after
+        return before, after, await db.get_group_grade_stats(g1)
+
+    before, after, cached = backend.run(scenario)
+    assert before.total.count == 1
+    assert after.total.count == 2 and [student.user_id for student in after.failing] == [2]
+    assert cached.total.count == 2
@@ -0,0 +1,85 @@
+"""Выставление отметки учителем"""
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+
+from database import SQLiteDatabase
+from fsm import CompactMemoryStorage
+from handlers.teacher import TeacherStates, add_grade, select_student_for_grade
+from keyboards import UserAction, UserCallback, get_users_keyboard
+
+from test_database import seed
+
+TEACHER_ID = 10
+
+
+class CountingDatabase(SQLiteDatabase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user_lookups = 0
+
+    async def get_user(self, user_id):
+        self.user_lookups += 1
+        return await super().get_user(user_id)
+
+
+class Chat:
+    """Сообщения и правки, отправленные обработчиком"""
+
+    def __init__(self, text: str = "", reply_markup=None):
+        self.text = text
+        self.reply_markup = reply_markup
+        self.from_user = SimpleNamespace(id=TEACHER_ID)
+        self.sent = []
+        self.bot = SimpleNamespace(send_message=self.send_message)
+
+    async def answer(self, text: str = "", **kwargs):
+        self.sent.append(text)
+
+    edit_text = answer
+
+    async def send_message(self, chat_id: int, text: str):
+        self.sent.append((chat_id, text))
+
+
+class Tasks:
+    def __init__(self):
+        self.spawned = []
+
+    def spawn(self, coro, name=None):
+        self.spawned.append(coro)
+
+
+def test_grade_reply_uses_name_from_student_list(tmp_path):
+    async def scenario():
+        db = CountingDatabase(str(tmp_path / "bot.db"))
+        await db.init_db()
+        await db.load_snapshot()
+        try:
+            await seed(db)
+            state = FSMContext(CompactMemoryStorage(), StorageKey(bot_id=1, chat_id=TEACHER_ID, user_id=TEACHER_ID))
+            students = await db.get_users_by_role("student")
+            keyboard = Chat(reply_markup=get_users_keyboard(students, UserAction.GRADE))
+            callback = SimpleNamespace(
+                data=UserCallback(action=UserAction.GRADE, user_id=2).pack(), message=keyboard, answer=keyboard.answer
+            )
+            await select_student_for_grade(callback, UserCallback.unpack(callback.data), state)
+            await state.update_data(subject="Математика")
+            await state.set_state(TeacherStates.waiting_for_grade)
+
+            message, tasks = Chat("5"), Tasks()
+            lookups = db.user_lookups
+            await add_grade(message, state, db, tasks)
+            assert db.user_lookups == lookups
+            for coro in tasks.spawned:
+                await coro
+            return message.sent, [grade.grade for grade in await db.get_grades_by_student(2)]
+        finally:
+            await db.close()
+
+    sent, grades = asyncio.run(scenario())
+    assert sent[0] == "✅ Оценка 5 по предмету 'Математика' поставлена студенту Boris!"
+    assert sent[1] == (2, "📊 Вам поставлена оценка 5 по предмету 'Математика'.")
+    assert grades == [5]
@@ -0,0 +1,36 @@
+"""Ограничение частоты: лимиты колледжа из манифеста"""
+from config import config
+from main import create_dispatcher
+from middleware import Limit
+from tenants import Tenant
+from tenants.manifest import parse_manifest
+
+
+def make_tenants():
+    settings = parse_manifest([
+        {"name": "А", "BOT_TOKEN": "111:AAA", "DATABASE_URL": "a.db",
+         "THROTTLE_RATE": 2, "THROTTLE_BURST": 2, "THROTTLE_LIMITS": "grades=0.1/1"},
+        {"name": "Б", "BOT_TOKEN": "222:BBB", "DATABASE_URL": "b.db"},
+    ], config)
+    return [Tenant(item) for item in settings]
+
+
+def test_limits_per_tenant():
+    first, second = make_tenants()
+    throttling = create_dispatcher([first, second])["throttling"]
+
+    assert throttling.limit_for("default", first.bot_id) == Limit(2.0, 2)
+    assert throttling.limit_for("grades", first.bot_id) == Limit(0.1, 1)
+    assert throttling.limit_for("default", second.bot_id) == Limit(config.THROTTLE_RATE, config.THROTTLE_BURST)
+
+    # Один пользователь в двух ботах: ведра и лимиты раздельные
+    assert throttling.hit("grades", (first.bot_id, 5), 0.0) is True
+    assert throttling.hit("grades", (first.bot_id, 5), 0.0) is False
+    assert throttling.hit("grades", (second.bot_id, 5), 0.0) is True
+    assert throttling.hit("grades", (second.bot_id, 5), 0.0) is True
+
+    # Ведро первого бота наполняется за 10 с, второго — раньше
+    refill = throttling.limit_for("grades", second.bot_id).refill_time
+    assert refill < 10
+    assert throttling.sweep(refill) == 1
+    assert throttling.sweep(10.0) == 1
@@ -0,0 +1,110 @@
+"""Трассировка: спаны методов, переборов и фоновых задач"""
+import asyncio
+
+from tracing import TraceExporter, Tracer
+
+
+class Store:
+    """Объект с корутиной, асинхронным генератором и функцией, возвращающей итератор"""
+
+    def __init__(self):
+        self.closed = []
+
+    async def get(self):
+        return 1
+
+    async def iter_rows(self, count: int):
+        try:
+            for i in range(count):
+                await asyncio.sleep(0)
+                yield i
+        finally:
+            self.closed.append("iter_rows")
+
+    def iter_plain(self, count: int):
+        return self.iter_rows(count)
+
+
+def make_tracer(tmp_path) -> Tracer:
+    return Tracer(TraceExporter(str(tmp_path / "trace.jsonl")), sample_rate=1.0)
+
+
+def events(tracer: Tracer) -> dict:
+    """События по имени; при повторе имени — список"""
+    by_name = {}
+    for event in tracer.exporter._pending:
+        by_name.setdefault(event['name'], []).append(event)
+    return {name: found[0] if len(found) == 1 else found for name, found in by_name.items()}
+
+
+def test_iterators_are_traced(tmp_path):
+    tracer = make_tracer(tmp_path)
+    store = Store()
+    tracer.instrument(store, "db")
+
+    async def scenario():
+        with tracer.trace("update", "update") as root:
+            await store.get()
+            rows = [row async for row in store.iter_rows(3)]
+            plain = store.iter_plain(5)
+            async for _ in plain:
+                # Спан потребителя не вкладывается в спан перебора
+                with tracer.span("consumer", "handler"):
+                    pass
+                break
+            await plain.aclose()
+        return root, rows
+
+    root, rows = asyncio.run(scenario())
+    assert rows == [0, 1, 2]
+    by_name = events(tracer)
+    assert by_name['get']['args']['parent_id'] == root.span_id
+    # iter_plain перебирает обёрнутый iter_rows: его спан вложен в спан iter_plain
+    full, nested = by_name['iter_rows']
+    assert full['args']['rows'] == 3 and full['args']['parent_id'] == root.span_id
+    assert by_name['iter_plain']['args']['rows'] == 1
+    assert nested['args']['rows'] == 1 and nested['args']['parent_id'] == by_name['iter_plain']['args']['span_id']
+    assert by_name['consumer']['args']['parent_id'] == root.span_id
+    # Досрочно закрытый перебор закрыл и исходный генератор
+    assert store.closed == ["iter_rows", "iter_rows"]
+
+
+def test_background_span_does_not_share_reused_lane(tmp_path):
+    tracer = make_tracer(tmp_path)
+
+    async def background():
+        await asyncio.sleep(0.02)
+        with tracer.span("late", "db"):
+            await asyncio.sleep(0.02)
+
+    async def scenario():
+        with tracer.trace("first", "update"):
+            task = asyncio.create_task(background())
+        await asyncio.sleep(0.03)
+        # Вторая трасса начинается, пока открыт фоновый спан первой
+        with tracer.trace("second", "update"):
+            await asyncio.sleep(0.02)
+        await task
+
+    asyncio.run(scenario())
+    by_name = events(tracer)
+    assert by_name['late']['tid'] != by_name['second']['tid']
+    assert by_name['late']['args']['trace_id'] == by_name['first']['args']['trace_id']
+    assert by_name['late']['args']['parent_id'] == by_name['first']['args']['span_id']
+    assert tracer._lane_use == {}
+
+
+def test_child_spans_share_lane_of_open_trace(tmp_path):
+    tracer = make_tracer(tmp_path)
+
+    async def scenario():
+        with tracer.trace("update", "update"):
+            with tracer.span("handler", "handler"):
+                await asyncio.gather(*(asyncio.create_task(query()) for _ in range(3)))
+
+    async def query():
+        with tracer.span("query", "db"):
+            await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert {event['tid'] for event in tracer.exporter._pending} == {1}
@@ -0,0 +1,4 @@
+from .exporter import TraceExporter
+from .tracer import Tracer, Span, RequestTracing, current_span
+
+__all__ = ['TraceExporter', 'Tracer', 'Span', 'RequestTracing', 'current_span']
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Начало файла в формате Chrome Trace (JSON Array Format): закрывающая «]»
+# необязательна, поэтому события можно дописывать, не переписывая файл
+FILE_HEADER = b"[\n"
+
+
+class TraceExporter:
+    """Запись событий трассировки в файл с ротацией.
+
+    Каждое событие — отдельная строка «{...},» после строки «[», так что
+    файл открывают Perfetto (ui.perfetto.dev) и chrome://tracing, а для
+    построчной обработки достаточно отрезать первую строку и запятые.
+    События копятся в памяти и пишутся пакетом не реже чем раз в interval
+    секунд в отдельном потоке, не задерживая цикл событий. Файл больше
+    max_bytes переименовывается в path.1 (старые копии сдвигаются до
+    path.<backups>), новый снова начинается с «[». Очередь ограничена
+    max_pending событиями, лишние отбрасываются и считаются в dropped.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 20 * 1024 * 1024, backups: int = 5,
+                 interval: float = 1.0, max_pending: int = 100_000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self.failed_batches = 0
+
+    def emit(self, event: Dict[str, Any]):
+        """Поставить событие в очередь записи"""
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append(event)
+
+    async def flush(self) -> int:
+        """Записать накопившиеся события; сколько записано"""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception:
+                self.failed_batches += 1
+                logger.exception("Не удалось записать трассировку (%d событий)", len(batch))
+                return 0
+            self.written += len(batch)
+            return len(batch)
+
+    async def run_forever(self):
+        """Записывать очередь пакетами до отмены"""
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.shield(self.flush())
+
+    async def close(self):
+        """Записать остаток очереди (после отмены run_forever)"""
+        await self.flush()
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        data = "".join(json.dumps(event, ensure_ascii=False) + ",\n" for event in batch).encode("utf-8")
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if size and size + len(data) > self.max_bytes:
+            self._rotate()
+            size = 0
+        with open(self.path, "ab") as f:
+            if not size:
+                f.write(FILE_HEADER)
+            f.write(data)
+
+    def _rotate(self):
+        if self.backups > 0:
+            for number in range(self.backups - 1, 0, -1):
+                older = f"{self.path}.{number}"
+                if os.path.exists(older):
+                    os.replace(older, f"{self.path}.{number + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            'pending': len(self._pending),
+            'written': self.written,
+            'dropped': self.dropped,
+            'rotations': self.rotations,
+            'failed_batches': self.failed_batches,
+        }
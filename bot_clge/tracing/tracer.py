@@ -0,0 +1,249 @@
+import functools
+import heapq
+import inspect
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from .exporter import TraceExporter
+
+# Сдвиг perf_counter относительно времени Unix: метки событий — микросекунды от эпохи
+EPOCH_OFFSET = time.time() - time.perf_counter()
+
+
+class Span:
+    """Участок работы внутри трассы апдейта"""
+    __slots__ = ("trace_id", "span_id", "parent_id", "lane", "name", "category", "args", "start")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], lane: int, name: str, category: str,
+                 args: Dict[str, Any], start: Optional[float] = None):
+        self.trace_id = trace_id
+        self.span_id = new_id()
+        self.parent_id = parent_id
+        self.lane = lane
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = time.perf_counter() if start is None else start
+
+
+# Открытый спан текущей задачи; задачи, созданные из обработчика, наследуют его
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+
+def new_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+def current_span() -> Optional[Span]:
+    """Спан текущего апдейта или None, если апдейт не попал в выборку"""
+    return _current.get()
+
+
+class Tracer:
+    """Трассировка апдейтов: вложенные спаны через contextvars.
+
+    Трассу начинает trace() в самом внешнем middleware; в выборку попадает
+    доля sample_rate апдейтов. Вложенные span() — middleware, обработчик,
+    вызовы Database и запросы к Bot API — находят родителя в contextvar, а
+    вне выбранного апдейта ничего не записывают: обёртка стоит одного
+    чтения contextvar. Завершённый спан сразу уходит в экспортёр событием
+    «X» формата Chrome Trace. Одновременные трассы раскладываются по
+    дорожкам (tid): дорожка занята, пока на ней открыт хотя бы один спан
+    её трассы, а затем достаётся следующей трассе, поэтому дорожек не
+    больше, чем одновременно открытых трасс. Спан фоновой задачи, которая
+    пережила свой апдейт, не встаёт на чужую дорожку, а занимает свободную
+    (связь с трассой остаётся в trace_id и parent_id).
+    """
+
+    def __init__(self, exporter: TraceExporter, sample_rate: float):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.pid = os.getpid()
+        self._free_lanes: List[int] = []
+        self._lanes = 0
+        # дорожка -> [trace_id, число открытых на ней спанов]
+        self._lane_use: Dict[int, List[Any]] = {}
+        self.traces = 0
+        self.spans = 0
+
+    def _hold_lane(self, trace_id: str, lane: Optional[int]) -> int:
+        """Дорожка для нового спана: дорожка родителя, если её ещё держит та же трасса, иначе свободная"""
+        use = self._lane_use.get(lane)
+        if use is None or use[0] != trace_id:
+            if self._free_lanes:
+                lane = heapq.heappop(self._free_lanes)
+            else:
+                self._lanes += 1
+                lane = self._lanes
+            use = self._lane_use[lane] = [trace_id, 0]
+        use[1] += 1
+        return lane
+
+    def _release_lane(self, lane: int):
+        use = self._lane_use[lane]
+        use[1] -= 1
+        if not use[1]:
+            del self._lane_use[lane]
+            heapq.heappush(self._free_lanes, lane)
+
+    def _child(self, parent: Span, name: str, category: str, args: Dict[str, Any],
+               start: Optional[float] = None) -> Span:
+        lane = self._hold_lane(parent.trace_id, parent.lane)
+        return Span(parent.trace_id, parent.span_id, lane, name, category, args, start)
+
+    @contextmanager
+    def trace(self, name: str, category: str, **args: Any) -> Iterator[Optional[Span]]:
+        """Начать трассу с вероятностью sample_rate; None — апдейт не в выборке"""
+        if random.random() >= self.sample_rate:
+            yield None
+            return
+        self.traces += 1
+        trace_id = new_id()
+        with self._open(Span(trace_id, None, self._hold_lane(trace_id, None), name, category, args)) as span:
+            yield span
+
+    @contextmanager
+    def span(self, name: str, category: str, **args: Any) -> Iterator[Optional[Span]]:
+        """Вложенный спан текущей трассы (вне трассы ничего не делает)"""
+        parent = _current.get()
+        if parent is None:
+            yield None
+            return
+        with self._open(self._child(parent, name, category, args)) as span:
+            yield span
+
+    def record(self, name: str, category: str, start: float, end: float, **args: Any):
+        """Записать уже завершившийся участок (start и end — perf_counter) в текущую трассу"""
+        parent = _current.get()
+        if parent is not None:
+            span = self._child(parent, name, category, args, start)
+            self._finish(span, end)
+            self._release_lane(span.lane)
+
+    @contextmanager
+    def _open(self, span: Span) -> Iterator[Span]:
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.args['error'] = type(e).__name__
+            raise
+        finally:
+            _current.reset(token)
+            self._finish(span, time.perf_counter())
+            self._release_lane(span.lane)
+
+    def _finish(self, span: Span, end: float):
+        self.spans += 1
+        args = dict(span.args, trace_id=span.trace_id, span_id=span.span_id)
+        if span.parent_id is not None:
+            args['parent_id'] = span.parent_id
+        self.exporter.emit({
+            'name': span.name,
+            'cat': span.category,
+            'ph': 'X',
+            'ts': round((EPOCH_OFFSET + span.start) * 1e6, 1),
+            'dur': round((end - span.start) * 1e6, 1),
+            'pid': self.pid,
+            'tid': span.lane,
+            'args': args,
+        })
+
+    def instrument(self, obj: Any, category: str):
+        """Обернуть спанами публичные методы объекта (методы Database и т. п.).
+
+        Корутина получает спан на время вызова, а метод, возвращающий
+        асинхронный итератор (iter_users_by_role и т. п.), — спан на время
+        перебора с числом строк в args.
+        """
+        for name in dir(type(obj)):
+            if name.startswith("_") or name in vars(obj):
+                continue
+            attr = inspect.getattr_static(obj, name)
+            if inspect.iscoroutinefunction(attr):
+                setattr(obj, name, self._wrap(getattr(obj, name), name, category))
+            elif inspect.isfunction(attr):
+                setattr(obj, name, self._wrap_iterator(getattr(obj, name), name, category))
+
+    def _wrap(self, method, name: str, category: str):
+        @functools.wraps(method)
+        async def traced(*args, **kwargs):
+            if _current.get() is None:
+                return await method(*args, **kwargs)
+            with self.span(name, category):
+                return await method(*args, **kwargs)
+        return traced
+
+    def _wrap_iterator(self, method, name: str, category: str):
+        @functools.wraps(method)
+        def traced(*args, **kwargs):
+            result = method(*args, **kwargs)
+            parent = _current.get()
+            # Прочие функции (например, transaction()) возвращают результат как есть
+            if parent is None or not hasattr(result, "__anext__"):
+                return result
+            return self._iterate(result, parent, name, category)
+        return traced
+
+    async def _iterate(self, iterator: AsyncIterator, parent: Span, name: str, category: str) -> AsyncIterator:
+        """Перебор с открытым спаном: от первого запроса строки до исчерпания или закрытия.
+
+        Спан текущий только пока работает сам итератор, а не код, который
+        обрабатывает его строки, поэтому спаны потребителя не вкладываются в него.
+        Спан открывается при первом запросе строки: итератор, который так и не
+        начали перебирать, дорожку не занимает, а родителем становится спан,
+        текущий в этот момент (например, спан внешнего перебора).
+        """
+        span = self._child(_current.get() or parent, name, category, {})
+        rows = 0
+        try:
+            while True:
+                token = _current.set(span)
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    _current.reset(token)
+                rows += 1
+                yield item
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            span.args['error'] = type(e).__name__
+            raise
+        finally:
+            # Досрочно закрытый перебор закрывает и итератор движка, возвращая соединение
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            span.args['rows'] = rows
+            self._finish(span, time.perf_counter())
+            self._release_lane(span.lane)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'sample_rate': self.sample_rate,
+            'traces': self.traces,
+            'spans': self.spans,
+            **self.exporter.metrics(),
+        }
+
+
+class RequestTracing(BaseRequestMiddleware):
+    """Спан на каждый запрос к Bot API; ставится на сессию бота"""
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        if _current.get() is None:
+            return await make_request(bot, method)
+        with self.tracer.span(type(method).__name__, "bot", bot_id=bot.id):
+            return await make_request(bot, method)
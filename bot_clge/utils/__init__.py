@@ -1,4 +1,11 @@
-from .helpers import get_day_number, get_day_name, format_schedule, format_grades
-
-__all__ = ['get_day_number', 'get_day_name', 'format_schedule', 'format_grades']
+from .helpers import (
+    get_day_number, get_day_name, format_schedule, format_grades, format_grade_stats, format_conversation,
+    format_audit_log, format_group_report, format_schedule_conflicts, format_group_schedule
+)
+from .schedule_search import ScheduleSearch, ScheduleCard
 
+__all__ = [
+    'get_day_number', 'get_day_name', 'format_schedule', 'format_grades', 'format_grade_stats',
+    'format_conversation', 'format_audit_log', 'format_group_report',
+    'format_schedule_conflicts', 'format_group_schedule', 'ScheduleSearch', 'ScheduleCard'
+]
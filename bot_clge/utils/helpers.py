@@ -1,4 +1,7 @@
+from datetime import datetime
+import json
 from typing import Dict, Any
+from database.schedule import TEACHER_SLOT
 
 
 def get_day_number(day_name: str) -> int:
@@ -36,7 +39,7 @@ def format_schedule(schedule: list) -> str:
     current_day = None
     
     for item in schedule:
-        day = get_day_name(item['day_of_week'])
+        day = get_day_name(item.day_of_week)
         if day != current_day:
             if current_day is not None:
                 result.append("")
@@ -44,34 +47,177 @@ def format_schedule(schedule: list) -> str:
             current_day = day
         
         result.append(
-            f"{item['lesson_number']}. {item['subject']} - {item.get('teacher_name', 'Неизвестно')}"
+            f"{item.lesson_number}. {item.subject} - {item.teacher_name or 'Неизвестно'}"
         )
     
     return "\n".join(result)
 
 
-def format_grades(grades: list) -> str:
+def format_group_schedule(group_name: str, schedule: list) -> str:
+    """Расписание с названием группы в заголовке"""
+    return f"📅 Расписание группы {group_name}:\n\n{format_schedule(schedule)}"
+
+
+def format_schedule_conflicts(conflicts: list, group_names: Dict[int, str]) -> str:
+    """Форматировать накладки в расписании: что уже занимает слот"""
+    result = []
+    for item in conflicts:
+        existing = item.existing
+        slot = f"{get_day_name(existing.day_of_week)}, {existing.lesson_number}-й урок"
+        group_name = group_names.get(existing.group_id, existing.group_id)
+        teacher = existing.teacher_name or 'Неизвестно'
+        if item.kind == TEACHER_SLOT:
+            result.append(f"• {slot}: {teacher} ведёт {existing.subject} у группы {group_name}")
+        else:
+            result.append(f"• {slot}: у группы {group_name} уже стоит {existing.subject} - {teacher}")
+    
+    return "\n".join(result)
+
+
+def format_grades(grades: list, empty: str = "У вас пока нет отметок.") -> str:
     """Форматировать отметки для вывода"""
     if not grades:
-        return "У вас пока нет отметок."
+        return empty
     
     result = ["📊 Ваши отметки:\n"]
     
     # Группируем по предметам
     subjects = {}
     for grade in grades:
-        subject = grade['subject']
+        subject = grade.subject
         if subject not in subjects:
             subjects[subject] = []
         subjects[subject].append(grade)
     
     for subject, subject_grades in subjects.items():
         result.append(f"📚 {subject}:")
-        grades_list = [str(g['grade']) for g in subject_grades]
-        avg = sum([g['grade'] for g in subject_grades]) / len(subject_grades)
+        grades_list = [str(g.grade) for g in subject_grades]
+        avg = sum([g.grade for g in subject_grades]) / len(subject_grades)
         result.append(f"   Оценки: {', '.join(grades_list)}")
         result.append(f"   Средний балл: {avg:.2f}")
         result.append("")
     
     return "\n".join(result)
 
+
+def format_grade_stats(stats, group_name: str) -> str:
+    """Форматировать сводку отметок группы (GroupGradeStats)"""
+    if not stats.total.count:
+        return f"📈 {group_name}\n\nОтметок пока нет."
+    
+    def distribution(item) -> str:
+        return " ".join(f"{grade}×{count}" for grade, count in zip((2, 3, 4, 5), item.distribution))
+    
+    result = [
+        f"📈 {group_name}\n",
+        f"Всего отметок: {stats.total.count}, средний балл: {stats.total.mean:.2f}",
+        f"Распределение: {distribution(stats.total)}\n",
+    ]
+    for item in stats.subjects:
+        result.append(f"📚 {item.subject}: {item.mean:.2f} ({item.count})")
+        result.append(f"   {distribution(item)}")
+    
+    if stats.failing:
+        result.append("\n⚠️ Неуспевающие:")
+        for item in stats.failing:
+            result.append(f"• {item.full_name} — {item.subject}: {item.mean:.2f} ({item.count})")
+    
+    if stats.trend:
+        result.append("\n📅 По месяцам:")
+        for item in stats.trend:
+            result.append(f"• {item.month}: {item.mean:.2f} ({item.count})")
+    
+    return "\n".join(result)
+
+
+def format_conversation(messages: list, user_id: int, counterpart_name: str, limit: int = 300) -> str:
+    """Форматировать страницу переписки (messages — новые первыми)"""
+    if not messages:
+        return f"💬 {counterpart_name}\n\nСообщений пока нет."
+    
+    result = [f"💬 {counterpart_name}\n"]
+    for item in reversed(messages):
+        author = "Вы" if item.from_user_id == user_id else counterpart_name
+        text = item.message_text
+        if len(text) > limit:
+            text = text[:limit] + "…"
+        sent_at = datetime.fromtimestamp(item.timestamp).strftime("%Y-%m-%d %H:%M")
+        result.append(f"[{sent_at}] {author}:\n{text}\n")
+    
+    return "\n".join(result)
+
+
+AUDIT_ACTIONS = {
+    "set_teacher": "назначил учителем",
+    "set_student": "назначил студентом",
+    "add_admin": "назначил администратором",
+    "create_group": "создал группу",
+    "add_to_group": "добавил в группу",
+    "remove_from_group": "убрал из группы",
+    "broadcast": "сделал рассылку",
+    "promote_groups": "перевёл группы на следующий курс",
+    "rename_group": "переименовал группу",
+    "merge_groups": "объединил группы",
+    "split_group": "разделил группу",
+    "archive_group": "архивировал группы",
+    "delete_group": "удалил группы",
+}
+
+
+def format_audit_log(entries: list, names: Dict[int, str], title: str, limit: int = 100) -> str:
+    """Форматировать записи журнала действий (новые первыми)"""
+    if not entries:
+        return f"{title}\n\nЗаписей нет."
+    
+    result = [f"{title}\n"]
+    for item in entries:
+        created = datetime.fromtimestamp(item.created_at).strftime("%Y-%m-%d %H:%M")
+        action = AUDIT_ACTIONS.get(item.action, item.action)
+        line = f"[{created}] {names.get(item.actor_id, item.actor_id)} {action}"
+        if item.target_id is not None:
+            line += f" {names.get(item.target_id, item.target_id)}"
+        details = json.loads(item.details) if item.details else {}
+        if details.get("group_name"):
+            line += f" ({details['group_name']})"
+        if details.get("args"):
+            line += f" {details['args']}"
+        if details.get("text"):
+            text = details["text"]
+            line += f": «{text[:limit] + '…' if len(text) > limit else text}»"
+        result.append(line)
+    
+    return "\n".join(result)
+
+
+GROUP_REPORT_FIELDS = {
+    "groups_created": "Групп создано",
+    "groups_renamed": "Групп переименовано",
+    "groups_archived": "Групп в архив",
+    "groups_deleted": "Групп удалено",
+    "users_moved": "Пользователей переведено",
+    "users_detached": "Пользователей без группы",
+    "schedule_deleted": "Уроков расписания удалено",
+    "schedule_to_assign": "Уроков новой группе назначить заново",
+}
+
+
+def format_group_report(report, limit: int = 30) -> str:
+    """Форматировать отчёт массовой операции над группами"""
+    if report.dry_run:
+        result = ["🧪 Пробный прогон, база не изменена. Будет затронуто:\n"]
+    else:
+        result = ["✅ Выполнено\n"]
+    
+    for old_name, new_name in report.renamed[:limit]:
+        result.append(f"• {old_name} → {new_name}")
+    if len(report.renamed) > limit:
+        result.append(f"• … и ещё {len(report.renamed) - limit}")
+    
+    counts = report.counts()
+    lines = [f"{title}: {counts[name]}" for name, title in GROUP_REPORT_FIELDS.items() if counts.get(name)]
+    if report.renamed:
+        result.append("")
+    result.extend(lines or ["Изменений нет"])
+    result.append(f"\nВремя: {report.elapsed_ms:.1f} мс")
+    
+    return "\n".join(result)
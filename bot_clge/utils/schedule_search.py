@@ -0,0 +1,98 @@
+"""Расписание групп для инлайн-режима: «@бот ИС-2» в любом чате.
+
+Ответ на инлайн-запрос собирается из памяти: отсортированные ключи
+названий групп (поиск по началу названия — двоичный поиск диапазона) и
+заранее отформатированные тексты расписаний. Индекс перестраивается при
+смене версии снимка справочников; текст группы форматируется заново,
+только если в новом снимке у неё другое расписание или название, —
+неизменённые части снимка переиспользуются как есть.
+"""
+import re
+from bisect import bisect_left
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from database import Database, Group, ScheduleEntry
+from .helpers import format_group_schedule
+
+# Telegram показывает в инлайн-ответе не больше 50 результатов за раз
+PAGE_SIZE = 50
+# Лимит Telegram на длину текста сообщения
+MESSAGE_LIMIT = 4096
+SEPARATORS = re.compile(r"[\s\-_.]+")
+
+
+def search_key(text: str) -> str:
+    """Ключ поиска без регистра и разделителей: «ис 21» находит «ИС-21»"""
+    return SEPARATORS.sub("", text.casefold()).replace("ё", "е")
+
+
+class ScheduleCard(NamedTuple):
+    """Готовый ответ по группе: группа, число уроков в неделю и текст"""
+    group: Group
+    lessons: int
+    text: str
+
+
+class ScheduleSearch:
+    """Поиск групп по началу названия с готовыми текстами расписаний"""
+
+    def __init__(self, db: Database, cache_time: int = 300):
+        self.db = db
+        # Сколько секунд Telegram отдаёт ответ на тот же запрос из своего кэша
+        self.cache_time = cache_time
+        self._version: Optional[int] = None
+        self._groups: Tuple[Group, ...] = ()
+        # Ключи названий по возрастанию и карточки в том же порядке
+        self._keys: List[str] = []
+        self._cards: List[ScheduleCard] = []
+        # group_id -> (расписание из снимка, карточка)
+        self._rendered: Dict[int, Tuple[Tuple[ScheduleEntry, ...], ScheduleCard]] = {}
+        self.queries = 0
+        self.rebuilds = 0
+        self.rendered = 0
+
+    def rebuild(self):
+        """Обновить индекс и тексты по текущему снимку"""
+        snapshot = self.db.snapshot
+        rendered = {}
+        for group in snapshot.groups:
+            schedule = snapshot.get_schedule(group.group_id)
+            cached = self._rendered.get(group.group_id)
+            if cached is None or cached[0] is not schedule or cached[1].group != group:
+                text = format_group_schedule(group.group_name, schedule)
+                if len(text) > MESSAGE_LIMIT:
+                    text = text[:MESSAGE_LIMIT - 1] + "…"
+                cached = (schedule, ScheduleCard(group, len(schedule), text))
+                self.rendered += 1
+            rendered[group.group_id] = cached
+        self._rendered = rendered
+
+        if snapshot.groups is not self._groups:
+            order = sorted(snapshot.groups, key=lambda group: (search_key(group.group_name), group.group_name))
+            self._keys = [search_key(group.group_name) for group in order]
+            self._groups = snapshot.groups
+        else:
+            order = [card.group for card in self._cards]
+        self._cards = [rendered[group.group_id][1] for group in order]
+        self._version = snapshot.version
+        self.rebuilds += 1
+
+    def search(self, query: str, offset: int = 0) -> Tuple[List[ScheduleCard], Optional[int]]:
+        """Группы, чьё название начинается с query, и смещение следующей страницы (None — последняя)"""
+        self.queries += 1
+        if self.db.snapshot.version != self._version:
+            self.rebuild()
+        key = search_key(query)
+        start = bisect_left(self._keys, key)
+        end = bisect_left(self._keys, key + "\U0010ffff") if key else len(self._keys)
+        first = start + offset
+        cards = self._cards[first:min(first + PAGE_SIZE, end)]
+        next_offset = offset + PAGE_SIZE if first + PAGE_SIZE < end else None
+        return cards, next_offset
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            'groups': len(self._cards),
+            'queries': self.queries,
+            'rebuilds': self.rebuilds,
+            'rendered': self.rendered,
+        }